@@ -0,0 +1,271 @@
+"""Asyncio HTTP/1.1 server for the REST API.
+
+All connections live on one event loop and are kept alive between requests,
+so idle and streaming clients cost no thread each. Ordinary routes are the
+Flask app's, called as WSGI on a bounded worker pool. Routes registered
+with stream() are coroutines that write to the connection themselves; the
+/events stream is served this way. Nothing here depends on an async web
+framework.
+"""
+import asyncio
+import io
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import unquote
+
+MAX_HEADER_BYTES = 16384
+
+
+class HttpError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "version", "headers", "body", "peer")
+
+    def __init__(self, method, path, query, version, headers, body, peer):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.version = version
+        self.headers = headers  # lower-cased names
+        self.body = body
+        self.peer = peer
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.1":
+            return "close" not in connection
+        return "keep-alive" in connection
+
+
+def response_head(request, status, headers, keep_alive):
+    lines = [f"{request.version} {status}"]
+    lines.extend(f"{name}: {value}" for name, value in headers)
+    lines.append("Date: " + formatdate(usegmt=True))
+    if keep_alive and request.version == "HTTP/1.0":
+        lines.append("Connection: keep-alive")
+    elif not keep_alive:
+        lines.append("Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+class StreamResponse:
+    """Response body written piecewise by a streaming route.
+
+    HTTP/1.1 clients get chunked transfer encoding; HTTP/1.0 clients get a
+    body delimited by closing the connection, which happens anyway when the
+    stream ends.
+    """
+
+    def __init__(self, request, writer):
+        self.request = request
+        self.writer = writer
+        self.chunked = request.version == "HTTP/1.1"
+
+    async def start(self, headers, status="200 OK"):
+        headers = list(headers)
+        if self.chunked:
+            headers.append(("Transfer-Encoding", "chunked"))
+        self.writer.write(response_head(self.request, status, headers, keep_alive=False))
+        await self.writer.drain()
+
+    async def send(self, text):
+        data = text.encode("utf-8")
+        if self.chunked:
+            data = b"%x\r\n%s\r\n" % (len(data), data)
+        self.writer.write(data)
+        await self.writer.drain()
+
+
+class AsyncApiServer:
+    """Serves a WSGI app, plus native streaming routes, from an event loop."""
+
+    def __init__(self, app, host, port, workers=64, keepalive=75, max_body=1 << 20):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.max_body = max_body
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix="api-worker")
+        self.routes = []  # (compiled path pattern, coroutine)
+        self.server = None
+
+    def stream(self, pattern):
+        """Register a coroutine for GET requests whose path matches pattern.
+
+        It is called as handler(request, response, **groups) and returns
+        False to leave the request to the WSGI app instead.
+        """
+        def decorator(handler):
+            self.routes.append((re.compile(pattern), handler))
+            return handler
+        return decorator
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.connection, self.host, self.port, limit=MAX_HEADER_BYTES)
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False)
+
+    async def connection(self, reader, writer):
+        peer = writer.get_extra_info("peername") or ("", 0)
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        self.read_request(reader, writer, peer), self.keepalive)
+                except HttpError as e:
+                    await self.send_error(writer, e.status)
+                    break
+                if request is None or not await self.dispatch(request, writer):
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader, writer, peer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HttpError(HTTPStatus.BAD_REQUEST)
+            return None  # closed between requests
+        except asyncio.LimitOverrunError:
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST)
+        if version not in ("HTTP/1.0", "HTTP/1.1"):
+            raise HttpError(HTTPStatus.HTTP_VERSION_NOT_SUPPORTED)
+        headers = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(":")
+            if not sep:
+                raise HttpError(HTTPStatus.BAD_REQUEST)
+            headers[name.strip().lower()] = value.strip()
+        path, _, query = target.partition("?")
+
+        chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        try:
+            length = 0 if chunked else int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST)
+        if length > self.max_body:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        if headers.get("expect", "").lower() == "100-continue":
+            writer.write(f"{version} 100 Continue\r\n\r\n".encode("latin-1"))
+        if chunked:
+            body = await self.read_chunked(reader)
+        else:
+            body = await reader.readexactly(length)
+        return Request(method, path, query, version, headers, body, peer)
+
+    async def read_chunked(self, reader):
+        body = bytearray()
+        while True:
+            try:
+                size = int((await reader.readline()).split(b";")[0], 16)
+            except ValueError:
+                raise HttpError(HTTPStatus.BAD_REQUEST)
+            if size == 0:
+                while (await reader.readline()).strip():
+                    pass  # trailers are ignored
+                return bytes(body)
+            if len(body) + size > self.max_body:
+                raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            body += (await reader.readexactly(size + 2))[:-2]
+
+    async def send_error(self, writer, status):
+        status = HTTPStatus(status)
+        body = status.phrase.encode()
+        writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                     f"Content-Type: text/plain\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, request, writer):
+        """Answer one request; returns whether the connection stays open."""
+        if request.method == "GET":
+            for pattern, handler in self.routes:
+                match = pattern.fullmatch(request.path)
+                if match and await handler(request, StreamResponse(request, writer),
+                                           **match.groupdict()) is not False:
+                    return False
+
+        loop = asyncio.get_running_loop()
+        status, headers, body = await loop.run_in_executor(
+            self.executor, self.call_app, self.environ(request))
+        keep_alive = request.keep_alive
+        if not any(name.lower() == "content-length" for name, _ in headers):
+            headers.append(("Content-Length", str(len(body))))
+        writer.write(response_head(request, status, headers, keep_alive) + body)
+        await writer.drain()
+        return keep_alive
+
+    def environ(self, request):
+        environ = {
+            "REQUEST_METHOD": request.method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(request.path, encoding="latin-1"),
+            "QUERY_STRING": request.query,
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": request.version,
+            "REMOTE_ADDR": str(request.peer[0]),
+            "REMOTE_PORT": str(request.peer[1]),
+            "CONTENT_LENGTH": str(len(request.body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(request.body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in request.headers.items():
+            if name == "content-type":
+                environ["CONTENT_TYPE"] = value
+            elif name not in ("content-length", "transfer-encoding"):
+                environ["HTTP_" + name.upper().replace("-", "_")] = value
+        return environ
+
+    def call_app(self, environ):
+        """Run the WSGI app on a worker thread; returns (status, headers, body)."""
+        response = {}
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"], response["headers"] = status, list(headers)
+            return chunks.append
+
+        try:
+            result = self.app(environ, start_response)
+            try:
+                chunks.extend(result)
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        except Exception as e:
+            print(f"Error handling {environ['PATH_INFO']}: {e}", file=sys.stderr)
+            return "500 INTERNAL SERVER ERROR", [("Content-Type", "text/plain")], \
+                b"Internal Server Error"
+        return response["status"], response["headers"], b"".join(chunks)
@@ -0,0 +1,242 @@
+"""End-to-end benchmark of the REST API against the firmware emulator.
+
+Runs the Flask API and a PanelEngine in-process against firmwareEmulator.py
+on a pseudo-terminal (Linux/macOS, no hardware needed) and reports:
+
+  latency     PUT /parameter/<name>?wait=1 round trips (HTTP -> serial ->
+              reply -> store), as percentiles
+  throughput  sustained fire-and-forget PUTs from several clients, and
+              pipelined POST /batch updates confirmed by the board
+  reader CPU  CPU time of the serial reader thread per received line
+
+    python benchmarks/bench_end_to_end.py --baud 9600 --requests 200
+    python benchmarks/bench_end_to_end.py --json > results.json   # for CI
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import writeCommand  # noqa: E402
+from firmwareEmulator import FirmwareEmulator  # noqa: E402
+from panelEngine import DeviceRegistry, PanelEngine  # noqa: E402
+
+PARAMS = [f"P{i}" for i in range(5)]
+
+
+def percentiles(samples):
+    data = sorted(samples)
+    if not data:
+        return {}
+
+    def pick(p):
+        return round(data[min(len(data) - 1, int(p / 100 * len(data)))] * 1000, 3)
+
+    return {"count": len(data), "mean_ms": round(sum(data) / len(data) * 1000, 3),
+            "p50_ms": pick(50), "p90_ms": pick(90), "p99_ms": pick(99),
+            "max_ms": round(data[-1] * 1000, 3)}
+
+
+class ThreadCpu:
+    """CPU seconds used by one thread, from /proc on Linux."""
+
+    def __init__(self, thread):
+        self.path = f"/proc/self/task/{thread.native_id}/stat"
+        self.tick = os.sysconf("SC_CLK_TCK")
+
+    def seconds(self):
+        try:
+            with open(self.path) as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+        # utime and stime are fields 14 and 15 of the stat line.
+        return (int(fields[11]) + int(fields[12])) / self.tick
+
+
+class Client:
+    def __init__(self, port):
+        self.port = port
+
+    def request(self, method, path, body=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            conn.request(method, path, json.dumps(body) if body is not None else None,
+                         headers)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read() or b"null")
+        finally:
+            conn.close()
+
+
+def bench_latency(client, engine, requests):
+    samples = []
+    for i in range(requests):
+        value = i % 1000
+        start = time.perf_counter()
+        status, body = client.request("PUT", "/parameter/P0?wait=1", {"new_value": value})
+        samples.append(time.perf_counter() - start)
+        if status != 200 or engine.parameters.get("P0")[1]["current"] != value:
+            raise RuntimeError(f"update {value} not confirmed: {status} {body}")
+    return percentiles(samples)
+
+
+def bench_sustained(client, engine, clients, duration):
+    """Fire-and-forget PUTs; measures accepted requests and store catch-up."""
+    stats_before = engine.update_throttler.stats()
+    last_values = {}
+    counts = [0] * clients
+    stop_at = time.perf_counter() + duration
+
+    def worker(n):
+        name = PARAMS[n % len(PARAMS)]
+        value = 0
+        while time.perf_counter() < stop_at:
+            value = (value + 1) % 1000
+            client.request("PUT", f"/parameter/{name}", {"new_value": value})
+            counts[n] += 1
+            last_values[name] = value
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    # The latest value of every parameter must reach the board and the store.
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        if all(engine.parameters.get(name)[1]["current"] == value
+               for name, value in last_values.items()):
+            break
+        time.sleep(0.005)
+    drain = time.perf_counter() - start - elapsed
+    stats = engine.update_throttler.stats()
+    sent = stats["sent"] - stats_before["sent"]
+    return {"requests": sum(counts), "requests_per_s": round(sum(counts) / elapsed, 1),
+            "serial_updates": sent, "serial_updates_per_s": round(sent / elapsed, 1),
+            "coalesced": stats["coalesced"] - stats_before["coalesced"],
+            "drain_ms": round(drain * 1000, 3)}
+
+
+def bench_batch(client, size, rounds):
+    """Pipelined POST /batch updates, each confirmed by the board."""
+    confirmed = 0
+    start = time.perf_counter()
+    for r in range(rounds):
+        operations = [{"op": "update", "name": PARAMS[i % len(PARAMS)],
+                       "new_value": (r * size + i) % 1000} for i in range(size)]
+        status, body = client.request("POST", "/batch", {"operations": operations})
+        if status != 200:
+            raise RuntimeError(f"batch failed: {status} {body}")
+        confirmed += sum(1 for result in body["results"] if result["status"] == "Confirmed")
+    elapsed = time.perf_counter() - start
+    return {"updates": size * rounds, "confirmed": confirmed,
+            "confirmed_per_s": round(confirmed / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baud", type=int, default=9600,
+                        help="emulated link speed (default: %(default)s)")
+    parser.add_argument("--delay-ms", type=float, default=0.0,
+                        help="emulated per-command processing time (default: %(default)s)")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="sequential requests for the latency run (default: %(default)s)")
+    parser.add_argument("--clients", type=int, default=4,
+                        help="concurrent clients for the sustained run (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="seconds of sustained load (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--batch-rounds", type=int, default=5)
+    parser.add_argument("--reader-mode", choices=("event", "poll"), default="event")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    # Keep the per-request access log and the API's console prints out of
+    # the report.
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    emulator = FirmwareEmulator(baud_rate=args.baud, command_delay=args.delay_ms / 1000)
+    engine = PanelEngine(emulator.start(), args.baud or 115200,
+                         reader_mode=args.reader_mode)
+    engine.start()
+    writeCommand.registry = DeviceRegistry()
+    writeCommand.registry.add("default", engine)
+    server = make_server("127.0.0.1", 0, writeCommand.app_api, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = Client(server.server_port)
+
+    with quiet:
+        try:
+            status, body = client.request("POST", "/batch", {"operations": [
+                {"op": "add", "name": name, "min": 0, "max": 1000, "current": 0}
+                for name in PARAMS]})
+            if status != 200:
+                sys.exit(f"could not add parameters: {status} {body}")
+
+            reader_cpu = ThreadCpu(engine.serial_reader)
+            cpu_before, lines_before = reader_cpu.seconds(), emulator.lines_sent
+            run_start = time.perf_counter()
+            results = {
+                "config": {"baud": args.baud, "delay_ms": args.delay_ms,
+                           "reader_mode": args.reader_mode},
+                "latency": bench_latency(client, engine, args.requests),
+                "sustained": bench_sustained(client, engine, args.clients, args.duration),
+                "batch": bench_batch(client, args.batch_size, args.batch_rounds),
+            }
+            wall = time.perf_counter() - run_start
+            cpu_after, lines = reader_cpu.seconds(), emulator.lines_sent - lines_before
+            if cpu_before is not None and cpu_after is not None:
+                cpu = cpu_after - cpu_before
+                results["reader_cpu"] = {
+                    "lines": lines, "cpu_s": round(cpu, 3),
+                    "cpu_percent": round(cpu / wall * 100, 2),
+                    "us_per_line": round(cpu / lines * 1e6, 1) if lines else None}
+            results["emulator"] = {"commands": emulator.commands,
+                                   "rx_overrun_bytes": emulator.rx_overruns}
+        finally:
+            server.shutdown()
+            engine.stop()
+            emulator.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"baud {args.baud}, reader {args.reader_mode}, "
+          f"{args.delay_ms:g} ms per command")
+    latency = results["latency"]
+    print(f"latency   : p50 {latency['p50_ms']:.1f} ms, p90 {latency['p90_ms']:.1f} ms, "
+          f"p99 {latency['p99_ms']:.1f} ms, max {latency['max_ms']:.1f} ms "
+          f"({latency['count']} requests)")
+    sustained = results["sustained"]
+    print(f"sustained : {sustained['requests_per_s']:.0f} req/s accepted, "
+          f"{sustained['serial_updates_per_s']:.1f} updates/s on the wire, "
+          f"{sustained['coalesced']} coalesced, drained in {sustained['drain_ms']:.0f} ms")
+    batch = results["batch"]
+    print(f"batch     : {batch['confirmed_per_s']:.1f} confirmed updates/s "
+          f"({batch['confirmed']}/{batch['updates']})")
+    if "reader_cpu" in results:
+        cpu = results["reader_cpu"]
+        print(f"reader CPU: {cpu['cpu_percent']:.2f}% ({cpu['us_per_line']} us/line "
+              f"over {cpu['lines']} lines)")
+    print(f"emulator  : {results['emulator']['commands']} commands, "
+          f"{results['emulator']['rx_overrun_bytes']} bytes lost to RX overruns")
+
+
+if __name__ == "__main__":
+    main()
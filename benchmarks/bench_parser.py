@@ -0,0 +1,71 @@
+"""Micro-benchmark for serialParser.
+
+Parses a synthetic mix of firmware lines (encoder U, walks, L, sweeps,
+pin readings, G, replies and the odd ERR,) one line at a time with
+parse_line and as one buffer with parse_buffer, and reports the time per
+line. No serial port or display is needed.
+
+    python benchmarks/bench_parser.py --lines 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from serialParser import Unrecognized, parse_buffer, parse_line  # noqa: E402
+
+
+def synthetic_lines(count, seed):
+    rng = random.Random(seed)
+    names = ["Setpoint", "Kp", "Ki", "42", "Motor speed"]
+    lines = []
+    while len(lines) < count:
+        r = rng.random()
+        name = rng.choice(names)
+        if r < 0.6:
+            lines.append(f"U,{name},{rng.randint(0, 1000)}")
+        elif r < 0.7:
+            lines.extend(f"L,{i},{n},0,1000,{rng.randint(0, 1000)}"
+                         for i, n in enumerate(names))
+        elif r < 0.8:
+            lines.append(f"A,{rng.randint(0, 5)},{rng.randint(0, 1023)}")
+        elif r < 0.9:
+            lines.append(f"D,{rng.randint(2, 13)},{rng.randint(0, 1)}")
+        elif r < 0.98:
+            lines.append(f"G,{name},{rng.randint(0, 1000)}")
+        else:
+            lines.append("ERR,Unknown command")
+    return lines[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    lines = synthetic_lines(args.lines, args.seed)
+    buffer = "".join(line + "\r\n" for line in lines).encode()
+
+    start = time.perf_counter()
+    messages = [parse_line(line) for line in lines]
+    per_line = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = parse_buffer(buffer)
+    buffered = time.perf_counter() - start
+
+    assert batch == messages
+    unrecognized = sum(isinstance(m, Unrecognized) for m in messages)
+    print(f"{len(lines)} lines ({len(buffer)} bytes), {unrecognized} unrecognized")
+    for label, seconds in (("parse_line", per_line), ("parse_buffer", buffered)):
+        print(f"{label:>12}: {seconds * 1000:8.1f} ms "
+              f"({seconds / len(lines) * 1e6:5.2f} us/line, "
+              f"{len(lines) / seconds:,.0f} lines/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Replay a serial capture through the engine and report throughput and latency.
+
+Feeds a file recorded with writeCommand.py --capture-dir into a PanelEngine
+that has no serial port. Received lines take the serial reader's path
+(parser, parameter store, event subscribers), so UI and API changes can be
+load-tested against real traffic without hardware. Commands in the capture
+are only counted; commands sent during the replay (from --api-port or
+--gui) are held, since there is no board to answer them.
+
+    python benchmarks/bench_replay.py captures/default-20261017-101500.cap.gz
+    python benchmarks/bench_replay.py CAPTURE --speed 1 --subscribers 100
+    python benchmarks/bench_replay.py CAPTURE --speed 20 --repeat 10 --api-port 5000
+    python benchmarks/bench_replay.py CAPTURE --speed 1 --gui
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from panelEngine import DeviceRegistry, PanelEngine  # noqa: E402
+from sessionCapture import ReplayDriver, load_capture, percentiles  # noqa: E402
+
+
+class Listener(threading.Thread):
+    """Drains one event subscription the way an /events client does."""
+
+    def __init__(self, broker):
+        super().__init__(daemon=True)
+        self.broker = broker
+        self.subscription = broker.subscribe()
+        self.delays = []
+        self.events = 0
+        self.dropped = 0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            events, dropped = self.subscription.get(0.2)
+            now = time.time()
+            self.events += len(events)
+            self.dropped += dropped
+            self.delays.extend(now - event["time"] for event in events)
+        self.broker.unsubscribe(self.subscription)
+
+
+def print_report(report):
+    print(f"{report['lines_in']} lines in, {report['lines_out']} out: "
+          f"{report['capture_s']:.1f} s of capture replayed in {report['wall_s']:.2f} s "
+          f"({report['speedup']}x, {report['lines_per_s']:,} lines/s)")
+    handle = report["handle_line"]
+    if handle["count"]:
+        print(f"handle_line: mean {handle['mean_us']:.1f} us, p50 {handle['p50_us']:.1f} us, "
+              f"p99 {handle['p99_us']:.1f} us, max {handle['max_us']:.1f} us")
+    lag = report.get("lag")
+    if lag and lag["count"]:
+        print(f"behind schedule: p50 {lag['p50_ms']:.2f} ms, p99 {lag['p99_ms']:.2f} ms, "
+              f"max {lag['max_ms']:.2f} ms")
+    events = report.get("subscribers")
+    if events:
+        delay = events["delay"]
+        print(f"{events['count']} subscribers: {events['events']} events delivered, "
+              f"{events['dropped']} dropped"
+              + (f", delay p50 {delay['p50_ms']:.2f} ms, p99 {delay['p99_ms']:.2f} ms"
+                 if delay["count"] else ""))
+    print(f"unrecognized lines: {report['unrecognized']}, "
+          f"firmware errors: {report['firmware_errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="capture file (.cap or .cap.gz)")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="1 replays in real time, 10 ten times faster; "
+                             "0 as fast as possible (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="play the capture this many times (default: %(default)s)")
+    parser.add_argument("--subscribers", type=int, default=0,
+                        help="event subscribers draining like /events clients "
+                             "(default: %(default)s)")
+    parser.add_argument("--api-port", type=int,
+                        help="serve the REST API on this port during the replay")
+    parser.add_argument("--gui", action="store_true",
+                        help="show the Tk GUI on top of the replayed traffic")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    try:
+        header, records = load_capture(args.capture)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Could not read {args.capture}: {e}")
+    engine = PanelEngine(f"replay:{os.path.basename(args.capture)}",
+                         header.get("baud") or 9600)
+    # There is no board: anything sent meanwhile waits as if the link were down.
+    engine.holding = True
+    engine.start_workers()
+    listeners = [Listener(engine.event_broker) for _ in range(args.subscribers)]
+    for listener in listeners:
+        listener.start()
+
+    if args.api_port is not None:
+        import writeCommand
+        writeCommand.registry = DeviceRegistry()
+        writeCommand.registry.add("default", engine)
+        try:
+            writeCommand.start_async_api("127.0.0.1", args.api_port)
+        except OSError as e:
+            sys.exit(f"Could not serve the API on port {args.api_port}: {e}")
+
+    driver = ReplayDriver(engine, records, speed=args.speed or None, repeat=args.repeat)
+    if args.gui:
+        from panelGui import ArduinoGUI
+        gui = ArduinoGUI(engine)
+        driver.start()
+
+        def check_done():
+            if driver.is_alive():
+                gui.after(200, check_done)
+
+        gui.after(200, check_done)
+        gui.mainloop()
+        driver.stop()
+    else:
+        driver.start()
+        try:
+            driver.join()
+        except KeyboardInterrupt:
+            driver.stop()
+            driver.join()
+
+    # Let subscribers take the last events before they are counted.
+    time.sleep(0.3)
+    engine.stop()
+    for listener in listeners:
+        listener.running = False
+    for listener in listeners:
+        listener.join()
+    report = driver.report()
+    report["capture"] = {"path": args.capture, **header}
+    if listeners:
+        report["subscribers"] = {
+            "count": len(listeners),
+            "events": sum(listener.events for listener in listeners),
+            "dropped": sum(listener.dropped for listener in listeners),
+            "delay": percentiles([d for listener in listeners for d in listener.delays],
+                                 1e3, "ms"),
+        }
+    if args.gui:
+        histogram = engine.metrics.ui_update_seconds
+        _, total, count = histogram.snapshot()
+        report["ui"] = {"tree_updates": count, "tree_update_s": round(total, 3),
+                        "events_dropped": engine.metrics.ui_dropped.value}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+        if "ui" in report:
+            ui = report["ui"]
+            print(f"GUI: {ui['tree_updates']} tree syncs taking {ui['tree_update_s']} s, "
+                  f"{ui['events_dropped']} events dropped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Micro-benchmark for the parameter Treeview refresh.
+
+Feeds synthetic U, and L, lines through ArduinoGUI.process_serial_line and
+reports the time spent in update_parameter_list, once with the original
+clear-and-reinsert refresh and once with the incremental diff.
+
+Needs a display (Tk); no serial port is opened.
+
+    python benchmarks/bench_tree_updates.py --lines 5000 --params 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from panelEngine import PanelEngine  # noqa: E402
+from panelGui import ArduinoGUI  # noqa: E402
+
+
+def make_gui():
+    # The engine is never started, so no serial port is opened.
+    gui = ArduinoGUI(PanelEngine("benchmark", 9600))
+    gui.withdraw()
+    return gui
+
+
+def full_rebuild(gui):
+    """The original update_parameter_list: delete every row and re-insert."""
+    for item in gui.tree.get_children():
+        gui.tree.delete(item)
+    for name, info in gui.engine.snapshot_parameters().items():
+        idx = info.get("index") if info.get("index") is not None else "-"
+        min_val = info.get("min") if info.get("min") is not None else "-"
+        max_val = info.get("max") if info.get("max") is not None else "-"
+        curr = info.get("current") if info.get("current") is not None else "-"
+        gui.tree.insert("", tk.END, values=(idx, name, min_val, max_val, curr))
+    num_rows = len(gui.tree.get_children())
+    gui.tree["height"] = num_rows if num_rows > 0 else 1
+
+
+def synthetic_lines(count, num_params, seed):
+    """Encoder-style U, walks mixed with periodic L, listing sweeps."""
+    rng = random.Random(seed)
+    names = [f"P{i}" for i in range(num_params)]
+    values = {name: 50 for name in names}
+    lines = [f"L,{i},{name},0,100,50" for i, name in enumerate(names)]
+    while len(lines) < count:
+        if rng.random() < 0.1:
+            # A get:AlladdedParams sweep; most rows come back unchanged.
+            lines.extend(f"L,{i},{name},0,100,{values[name]}"
+                         for i, name in enumerate(names))
+        else:
+            name = rng.choice(names)
+            values[name] = min(100, max(0, values[name] + rng.choice((-1, 0, 1))))
+            lines.append(f"U,{name},{values[name]}")
+    return lines[:count]
+
+
+def run(lines, legacy):
+    gui = make_gui()
+    refresh = (lambda: full_rebuild(gui)) if legacy else gui.update_parameter_list
+    spent = 0.0
+
+    def timed_refresh():
+        nonlocal spent
+        start = time.perf_counter()
+        refresh()
+        spent += time.perf_counter() - start
+
+    gui.update_parameter_list = timed_refresh
+    start = time.perf_counter()
+    for line in lines:
+        gui.process_serial_line(line)
+    total = time.perf_counter() - start
+    gui.destroy()
+    return spent, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--params", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    lines = synthetic_lines(args.lines, args.params, args.seed)
+    try:
+        results = {label: run(lines, legacy)
+                   for label, legacy in (("before", True), ("after", False))}
+    except tk.TclError as e:
+        sys.exit(f"Tk is not available: {e}")
+
+    print(f"{len(lines)} lines, {args.params} parameters")
+    for label, (spent, total) in results.items():
+        print(f"{label:>6}: tree updates {spent * 1000:9.1f} ms "
+              f"({spent / len(lines) * 1e6:7.1f} us/line), "
+              f"total {total * 1000:9.1f} ms")
+    before, after = results["before"][0], results["after"][0]
+    if after > 0:
+        print(f"speed-up in tree updates: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
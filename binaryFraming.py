@@ -0,0 +1,324 @@
+"""Compact binary framing for the serial link, negotiated with set:binary.
+
+Text CSV stays the default. After "set:binary,<baud>" is answered with
+"B,<baud>", both sides switch to that baud rate and exchange frames:
+
+    0xA5 | length | opcode | fields ... | CRC-8
+
+length counts the opcode and fields (1-48 bytes). The CRC-8 (polynomial
+0x07) covers the length byte, the opcode and the fields; a frame that fails
+it is dropped and the decoder hunts for the next 0xA5. Integers are zigzag
+varints, and parameters are addressed by their slot in the firmware's
+5-entry store once the host has learned it from an ADDED or LISTED frame.
+
+    host -> board                       board -> host
+    0x01 ADD    min max current name    0x81 ADDED     slot name
+    0x02 GET    slot                    0x82 VALUE     slot value
+    0x03 UPDATE slot value              0x83 UPDATED   slot value (also encoder)
+    0x04 LIST                           0x84 LISTED    slot min max current name
+    0x05 SOFTWARE name                  0x85 SOFTWARE  name
+    0x06 READ_DIGITAL pin               0x86 DIGITAL   pin value
+    0x07 READ_ANALOG index              0x87 ANALOG    index value
+    0x08 TEXT (back to CSV at 9600)     0x88 TEXT
+    0x09 GET_NAMED name                 0x89 SELECTED  slot value (button)
+    0x0A UPDATE_NAMED value name        0x8A NAMED     opcode slot value name
+                                        0x8C NO_NAME   opcode name
+                                        0x8D NOT_FOUND opcode slot
+                                        0x8E ERROR     message
+
+The engine keeps speaking CSV internally: BinaryCodec.encode turns a
+command line into a frame, and FrameDecoder turns frames back into the
+lines the text firmware would have sent, so command tracking, parsing
+and the API are unchanged. GET and UPDATE fall back to the _NAMED forms
+for a name the host has no slot for, and while an ADD is unanswered,
+since that ADD may take over any slot.
+"""
+import re
+import threading
+
+SYNC = 0xA5
+MAX_PAYLOAD = 48
+# Longest name sent in a frame; the firmware keeps 14 characters anyway.
+MAX_NAME_BYTES = 32
+# The baud rates the firmware accepts in set:binary.
+BAUD_RATES = (9600, 19200, 38400, 57600, 115200)
+
+OP_ADD = 0x01
+OP_GET = 0x02
+OP_UPDATE = 0x03
+OP_LIST = 0x04
+OP_SOFTWARE = 0x05
+OP_READ_DIGITAL = 0x06
+OP_READ_ANALOG = 0x07
+OP_TEXT = 0x08
+OP_GET_NAMED = 0x09
+OP_UPDATE_NAMED = 0x0A
+# Never assigned; the board answers it with ERROR "Unknown command".
+OP_UNKNOWN = 0x7F
+
+REPLY = 0x80
+OP_SELECTED = 0x89
+OP_NAMED = 0x8A
+OP_NO_NAME = 0x8C
+OP_NOT_FOUND = 0x8D
+OP_ERROR = 0x8E
+
+LEADING_INT = re.compile(r"\s*[-+]?\d*")
+
+
+def crc8_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = crc8_table()
+
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+def encode_varint(value):
+    """Zigzag LEB128: small magnitudes of either sign take one byte."""
+    raw = (value << 1) ^ -1 if value < 0 else value << 1
+    out = bytearray()
+    while True:
+        byte = raw & 0x7F
+        raw >>= 7
+        if raw:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(data, pos):
+    """Return (value, next position); raises ValueError if data ends first."""
+    raw = shift = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        raw |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return (raw >> 1) ^ -(raw & 1), pos
+        shift += 7
+    raise ValueError("truncated varint")
+
+
+def encode_frame(opcode, body=b""):
+    payload = bytes((opcode,)) + body
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"frame payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    head = bytes((len(payload),)) + payload
+    return bytes((SYNC,)) + head + bytes((crc8(head),))
+
+
+def to_int(text):
+    """Arduino String::toInt(): the leading integer, or 0."""
+    try:
+        return int(LEADING_INT.match(text).group().strip())
+    except ValueError:
+        return 0
+
+
+def name_bytes(name):
+    return name.encode("utf-8", errors="replace")[:MAX_NAME_BYTES]
+
+
+class SlotMap:
+    """Which firmware slot holds which parameter, learned from ADDED/LISTED frames."""
+
+    def __init__(self):
+        self.slots = {}  # name -> slot
+        self.names = {}  # slot -> name
+        self.adding = 0  # ADD frames sent and not yet answered
+        self.lock = threading.Lock()
+
+    def add_sent(self):
+        with self.lock:
+            self.adding += 1
+
+    def add_answered(self):
+        with self.lock:
+            self.adding = max(0, self.adding - 1)
+
+    def slot(self, name):
+        """name's slot, or None if unknown or possibly about to be reused."""
+        with self.lock:
+            return None if self.adding else self.slots.get(name)
+
+    def learn(self, slot, name):
+        with self.lock:
+            self.learn_locked(slot, name)
+
+    def learn_locked(self, slot, name):
+        old = self.names.get(slot)
+        if old is None or not old.startswith(name):
+            # The store is circular: a new parameter took over the slot.
+            for evicted in [n for n, s in self.slots.items() if s == slot]:
+                del self.slots[evicted]
+            self.names[slot] = name
+        # Otherwise name is the firmware's truncated form of the name the
+        # slot was added as; both address it.
+        self.slots[name] = slot
+
+
+class FrameDecoder:
+    """Turns a byte stream of board frames into the equivalent CSV lines.
+
+    Same interface as panelEngine.LineSplitter: feed() returns complete
+    lines as bytes. Frames that fail their CRC, or name a slot the host has
+    not learned, are dropped and counted.
+    """
+
+    def __init__(self, slot_map, crc_errors=None):
+        self.slot_map = slot_map
+        self.buffer = bytearray()
+        self.crc_errors = crc_errors  # optional panelMetrics.Counter
+        self.dropped = 0
+
+    def feed(self, data):
+        buf = self.buffer
+        buf += data
+        lines = []
+        pos = 0
+        while True:
+            start = buf.find(SYNC, pos)
+            if start < 0:
+                pos = len(buf)
+                break
+            if len(buf) - start < 2:
+                pos = start
+                break
+            length = buf[start + 1]
+            if not 0 < length <= MAX_PAYLOAD:
+                pos = start + 1
+                continue
+            end = start + 2 + length
+            if len(buf) <= end:
+                pos = start
+                break
+            if crc8(buf[start + 1:end]) != buf[end]:
+                if self.crc_errors is not None:
+                    self.crc_errors.inc()
+                pos = start + 1
+                continue
+            try:
+                line = self.frame_line(buf[start + 2], bytes(buf[start + 3:end]))
+            except (ValueError, IndexError):
+                line = None
+            if line is None:
+                self.dropped += 1
+            else:
+                lines.append(line.encode("utf-8"))
+            pos = end + 1
+        del buf[:pos]
+        return lines
+
+    def name(self, slot):
+        name = self.slot_map.names.get(slot)
+        if name is None:
+            raise ValueError(f"unknown slot {slot}")
+        return name
+
+    def frame_line(self, opcode, body):
+        """The CSV line the text firmware sends for one decoded frame."""
+        if opcode == REPLY | OP_ADD:
+            name = body[1:].decode("utf-8", errors="replace")
+            self.slot_map.learn(body[0], name)
+            self.slot_map.add_answered()
+            return f"A,{name}"
+        if opcode == REPLY | OP_LIST:
+            slot = body[0]
+            low, pos = decode_varint(body, 1)
+            high, pos = decode_varint(body, pos)
+            current, pos = decode_varint(body, pos)
+            name = body[pos:].decode("utf-8", errors="replace")
+            self.slot_map.learn(slot, name)
+            return f"L,{slot},{name},{low},{high},{current}"
+        if opcode in (REPLY | OP_GET, REPLY | OP_UPDATE):
+            value, _ = decode_varint(body, 1)
+            prefix = "G" if opcode == REPLY | OP_GET else "U"
+            return f"{prefix},{self.name(body[0])},{value}"
+        if opcode == OP_NAMED:
+            value, pos = decode_varint(body, 2)
+            name = body[pos:].decode("utf-8", errors="replace")
+            self.slot_map.learn(body[1], name)
+            prefix = "G" if body[0] == OP_GET_NAMED else "U"
+            return f"{prefix},{name},{value}"
+        if opcode == OP_NO_NAME:
+            prefix = "G" if body[0] == OP_GET_NAMED else "U"
+            return f"{prefix},{body[1:].decode('utf-8', errors='replace')},ERROR"
+        if opcode == OP_SELECTED:
+            value, _ = decode_varint(body, 1)
+            return f"S,{body[0]},{self.name(body[0])},{value}"
+        if opcode in (REPLY | OP_READ_DIGITAL, REPLY | OP_READ_ANALOG):
+            value, _ = decode_varint(body, 1)
+            prefix = "D" if opcode == REPLY | OP_READ_DIGITAL else "A"
+            return f"{prefix},{body[0]},{value}"
+        if opcode == REPLY | OP_SOFTWARE:
+            return body.decode("utf-8", errors="replace")
+        if opcode == REPLY | OP_TEXT:
+            return "T"
+        if opcode == OP_NOT_FOUND:
+            prefix = "G" if body[0] == OP_GET else "U"
+            return f"{prefix},{self.name(body[1])},ERROR"
+        if opcode == OP_ERROR:
+            # A mangled ADD is answered with ERROR instead of ADDED.
+            self.slot_map.add_answered()
+            return "ERR," + body.decode("utf-8", errors="replace")
+        return None
+
+
+class BinaryCodec:
+    """Host side of a binary-mode link: command encoder plus frame decoder."""
+
+    def __init__(self, crc_errors=None):
+        self.slot_map = SlotMap()
+        self.decoder = FrameDecoder(self.slot_map, crc_errors)
+
+    def encode(self, cmd):
+        """Frame to send for one CSV command line."""
+        frame = self.frame(cmd)
+        if frame[2] == OP_ADD:
+            self.slot_map.add_sent()
+        return frame
+
+    def frame(self, cmd):
+        """Frame for one CSV command line, without noting it as sent."""
+        verb, _, args = cmd.strip().partition(",")
+        if verb == "add:param":
+            fields = args.split(",", 3)
+            if len(fields) == 4:
+                body = b"".join(encode_varint(to_int(f)) for f in fields[1:])
+                return encode_frame(OP_ADD, body + name_bytes(fields[0]))
+        elif verb == "get:paramCurval":
+            return self.slot_frame(OP_GET, OP_GET_NAMED, args, b"")
+        elif verb == "update:paramsCurval":
+            name, _, value = args.rpartition(",")
+            return self.slot_frame(OP_UPDATE, OP_UPDATE_NAMED, name,
+                                   encode_varint(to_int(value)))
+        elif verb == "get:AlladdedParams":
+            return encode_frame(OP_LIST)
+        elif verb == "set:software" and args.strip():
+            return encode_frame(OP_SOFTWARE, name_bytes(args.strip()))
+        elif verb in ("read:digital", "read:analog"):
+            opcode = OP_READ_DIGITAL if verb == "read:digital" else OP_READ_ANALOG
+            return encode_frame(opcode, bytes((to_int(args) & 0xFF,)))
+        elif verb == "set:text":
+            return encode_frame(OP_TEXT)
+        return encode_frame(OP_UNKNOWN)
+
+    def slot_frame(self, opcode, named, name, body):
+        slot = self.slot_map.slot(name)
+        if slot is None:
+            return encode_frame(named, body + name_bytes(name))
+        return encode_frame(opcode, bytes((slot,)) + body)
@@ -0,0 +1,568 @@
+"""Pseudo-terminal emulator of the control panel firmware (src/main.cpp).
+
+Answers the same CSV protocol as the Uno: the 5-slot circular parameter
+store with its 14-character names, A/U/G/L/S/D replies and ERR lines, plus
+unsolicited encoder U, and button S, events, and the binary framing that
+set:binary negotiates (binaryFraming.py). The link is simulated at a
+given baud rate, including the 64-byte RX buffer that overflows when the
+host sends faster than the loop reads, so host code can be exercised and
+benchmarked without hardware:
+
+    python firmwareEmulator.py --baud 9600 --encoder-rate 5
+    python writeCommand.py --port /dev/pts/7 --headless
+
+or in-process:
+
+    emulator = FirmwareEmulator(baud_rate=9600)
+    engine = PanelEngine(emulator.start(), 9600)
+"""
+import argparse
+import math
+import os
+import pty
+import random
+import re
+import select
+import threading
+import time
+import tty
+from collections import deque
+
+from binaryFraming import (BAUD_RATES, MAX_PAYLOAD, OP_ADD, OP_ERROR, OP_GET, OP_GET_NAMED,
+                           OP_LIST, OP_NAMED, OP_NO_NAME, OP_NOT_FOUND, OP_READ_ANALOG,
+                           OP_READ_DIGITAL, OP_SELECTED, OP_SOFTWARE, OP_TEXT, OP_UPDATE,
+                           OP_UPDATE_NAMED, REPLY, SYNC, crc8, decode_varint, encode_frame,
+                           encode_varint)
+
+MAX_PARAMS = 5
+MAX_NAME_LENGTH = 15
+SOFTWARE_NAME_SIZE = 32
+RX_BUFFER = 64
+TX_BUFFER = 64
+BUTTON_PIN = 2
+# Stream::readStringUntil gives up after 1 s without a byte.
+READ_TIMEOUT = 1.0
+# A binary frame left incomplete this long is abandoned.
+FRAME_TIMEOUT = 0.05
+TEXT_BAUD = 9600
+DEBOUNCE_DELAY = 0.05
+LEADING_INT = re.compile(r"\s*[-+]?\d*")
+
+
+def to_int(text):
+    """Arduino String::toInt(): the leading integer, or 0."""
+    match = LEADING_INT.match(text).group().strip()
+    try:
+        return int(match)
+    except ValueError:
+        return 0
+
+
+def constrain(value, low, high):
+    return low if value < low else high if value > high else value
+
+
+class ParameterSlots:
+    """The firmware's circular ParameterStore (src/helpers.h)."""
+
+    def __init__(self):
+        self.params = [["", 0, 0, 0] for _ in range(MAX_PARAMS)]
+        self.head = 0
+        self.count = 0
+
+    def add(self, name, low, high, current):
+        """Store a parameter, overwriting the oldest when full; returns its slot."""
+        slot = self.head
+        self.params[slot] = [name[:MAX_NAME_LENGTH - 1], low, high,
+                             constrain(current, low, high)]
+        self.head = (self.head + 1) % MAX_PARAMS
+        self.count = min(self.count + 1, MAX_PARAMS)
+        return slot
+
+    def valid(self, index):
+        return 0 <= index < self.count
+
+    def find(self, name):
+        slot = self.slot(name)
+        return None if slot < 0 else self.params[slot]
+
+    def slot(self, name):
+        for i, param in enumerate(self.params):
+            if param[0] == name:
+                return i
+        return -1
+
+    def update(self, name, value):
+        param = self.find(name)
+        if param is None:
+            return False
+        param[3] = constrain(value, param[1], param[2])
+        return True
+
+    def current(self, name):
+        param = self.find(name)
+        return -1 if param is None else param[3]
+
+    def get(self, index):
+        if index < 0 or index >= self.count:
+            return ["", 0, 0, 0]
+        return self.params[index]
+
+
+class FirmwareEmulator:
+    """Runs the firmware's loop() against the master side of a pty.
+
+    baud_rate=None removes all link pacing. command_delay is added to every
+    handled command on top of the loop's own delay(2).
+    """
+
+    def __init__(self, baud_rate=9600, command_delay=0.0, loop_delay=0.002,
+                 encoder_rate=0.0, button_interval=0.0, seed=None):
+        self.byte_time = 10.0 / baud_rate if baud_rate else 0.0
+        self.paced = bool(baud_rate)
+        self.binary = False
+        self.command_delay = command_delay
+        self.loop_delay = loop_delay
+        self.encoder_rate = encoder_rate
+        self.button_interval = button_interval
+        self.random = random.Random(seed)
+
+        self.params = ParameterSlots()
+        self.selected = -1
+        self.software_name = "Unknown"
+        self.digital = {BUTTON_PIN: 1}  # INPUT_PULLUP, not pressed
+        self.encoder_delta = 0
+        self.button_presses = 0
+        self.input_lock = threading.Lock()
+
+        # Bytes on the wire towards the board and the board's RX buffer.
+        self.wire = bytearray()
+        self.wire_start = 0.0
+        self.rx = bytearray()
+        # Lines on their way to the host: (deliver_at, bytes).
+        self.tx = deque()
+        self.tx_free_at = 0.0
+        self.tx_cond = threading.Condition()
+
+        self.commands = 0
+        self.lines_sent = 0
+        self.rx_overruns = 0
+        self.crc_errors = 0
+        self.master = self.slave = None
+        self.port = None
+        self.running = False
+        self.threads = []
+
+    # ----- lifecycle -----
+
+    def start(self):
+        """Open the pty and start the firmware loop; returns the port path."""
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.running = True
+        self.started_at = time.monotonic()
+        self.next_encoder = self.next_button = self.started_at
+        self.threads = [threading.Thread(target=self.loop, daemon=True),
+                        threading.Thread(target=self.transmit, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        return self.port
+
+    def stop(self):
+        self.running = False
+        with self.tx_cond:
+            self.tx_cond.notify()
+        for thread in self.threads:
+            thread.join(timeout=2)
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+
+    # ----- physical inputs -----
+
+    def turn_encoder(self, delta):
+        with self.input_lock:
+            self.encoder_delta += delta
+
+    def press_button(self):
+        with self.input_lock:
+            self.button_presses += 1
+
+    def analog_value(self, index, now):
+        """Reading of A<index>: a slow sine wave, phase-shifted per pin."""
+        return int(511.5 + 511.5 * math.sin(now - self.started_at + index))
+
+    # ----- serial link -----
+
+    def receive(self, timeout):
+        """Move host bytes onto the simulated wire, then into the RX buffer."""
+        if self.running and select.select([self.master], [], [], timeout)[0]:
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                data = b""
+            if data:
+                if not self.wire:
+                    self.wire_start = time.monotonic()
+                self.wire += data
+        if not self.wire:
+            return
+        if self.byte_time:
+            arrived = int((time.monotonic() - self.wire_start) / self.byte_time)
+            arrived = min(arrived, len(self.wire))
+        else:
+            arrived = len(self.wire)
+        if not arrived:
+            return
+        data = self.wire[:arrived]
+        del self.wire[:arrived]
+        self.wire_start += arrived * self.byte_time
+        room = RX_BUFFER - len(self.rx)
+        if len(data) > room:
+            # The UART ISR drops bytes once the ring buffer is full.
+            self.rx_overruns += len(data) - room
+            data = data[:room]
+        self.rx += data
+
+    def next_wait(self):
+        """How long receive() may block before a wire byte is due."""
+        if self.wire and self.byte_time:
+            return max(0.0, self.wire_start + self.byte_time - time.monotonic())
+        return self.loop_delay
+
+    def read_line(self):
+        """Serial.readStringUntil('\\n'): consume bytes until newline or timeout."""
+        line = bytearray()
+        last_byte = time.monotonic()
+        while self.running:
+            newline = self.rx.find(b"\n")
+            if newline >= 0:
+                line += self.rx[:newline]
+                del self.rx[:newline + 1]
+                break
+            if self.rx:
+                line += self.rx
+                self.rx.clear()
+                last_byte = time.monotonic()
+            if time.monotonic() - last_byte >= READ_TIMEOUT:
+                break
+            self.receive(self.next_wait())
+        return line.decode("ascii", "replace")
+
+    def read_frame(self):
+        """The firmware's frame parser: (opcode, body) of the next good frame, or None.
+
+        Skips bytes until 0xA5, then waits for the rest of the frame. A frame
+        that stalls for FRAME_TIMEOUT, or fails its CRC, is abandoned.
+        """
+        last_byte = time.monotonic()
+        while self.running:
+            start = self.rx.find(SYNC)
+            if start < 0:
+                self.rx.clear()
+                return None
+            del self.rx[:start]
+            if len(self.rx) >= 2:
+                length = self.rx[1]
+                if not 0 < length <= MAX_PAYLOAD:
+                    del self.rx[:1]
+                    continue
+                if len(self.rx) >= length + 3:
+                    frame = bytes(self.rx[:length + 3])
+                    del self.rx[:length + 3]
+                    if crc8(frame[1:-1]) != frame[-1]:
+                        self.crc_errors += 1
+                        self.send_frame(OP_ERROR, b"CRC mismatch")
+                        return None
+                    return frame[2], frame[3:-1]
+            if time.monotonic() - last_byte >= FRAME_TIMEOUT:
+                del self.rx[:1]
+                return None
+            have = len(self.rx)
+            self.receive(min(self.next_wait(), FRAME_TIMEOUT))
+            if len(self.rx) > have:
+                last_byte = time.monotonic()
+        return None
+
+    def println(self, text):
+        """Serial.println(): queue text, blocking while the TX buffer is full."""
+        self.write((str(text) + "\r\n").encode("ascii", "replace"))
+
+    def send_frame(self, opcode, body=b""):
+        self.write(encode_frame(opcode, body))
+
+    def write(self, data):
+        now = time.monotonic()
+        if self.byte_time:
+            backlog = self.tx_free_at - now - TX_BUFFER * self.byte_time
+            if backlog > 0:
+                time.sleep(backlog)
+                now = time.monotonic()
+            self.tx_free_at = max(now, self.tx_free_at) + len(data) * self.byte_time
+        else:
+            self.tx_free_at = now
+        self.lines_sent += 1
+        with self.tx_cond:
+            self.tx.append((self.tx_free_at, data))
+            self.tx_cond.notify()
+
+    def transmit(self):
+        while True:
+            with self.tx_cond:
+                while self.running and not self.tx:
+                    self.tx_cond.wait()
+                if not self.running:
+                    return
+                deliver_at, data = self.tx.popleft()
+            delay = deliver_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                os.write(self.master, data)
+            except OSError:
+                return
+
+    # ----- firmware -----
+
+    def loop(self):
+        while self.running:
+            self.receive(self.next_wait() if not self.rx else 0)
+            if self.rx and self.binary:
+                frame = self.read_frame()
+                if frame is not None:
+                    self.commands += 1
+                    if self.command_delay:
+                        time.sleep(self.command_delay)
+                    self.handle_frame(*frame)
+            elif self.rx:
+                command = self.read_line().strip()
+                self.commands += 1
+                if self.command_delay:
+                    time.sleep(self.command_delay)
+                self.handle(command)
+            self.simulate_inputs()
+            self.poll_encoder()
+            self.poll_button()
+            time.sleep(self.loop_delay)
+
+    def handle(self, command):
+        """processSerialCommands() for one received line."""
+        if command.startswith("add:param"):
+            comma = command.find(",")
+            if comma == -1:
+                return
+            args = command[comma + 1:].split(",", 3)
+            if len(args) < 4:
+                self.println("ERR,Invalid add:param format")
+                return
+            name = args[0]
+            self.params.add(name, to_int(args[1]), to_int(args[2]), to_int(args[3]))
+            if self.params.count == 1:
+                self.selected = 0
+            self.println("A," + name)
+        elif command.startswith("get:paramCurval"):
+            comma = command.find(",")
+            if comma == -1:
+                self.println("ERR,Invalid get:paramCurval format")
+                return
+            name = command[comma + 1:]
+            value = self.params.current(name)
+            self.println(f"G,{name}," + ("ERROR" if value == -1 else str(value)))
+        elif command.startswith("update:paramsCurval"):
+            parts = command.split(",", 2)
+            if len(parts) < 3:
+                self.println("ERR,Invalid update:paramsCurval format")
+                return
+            name, value = parts[1], to_int(parts[2])
+            if self.params.update(name, value):
+                # The firmware echoes the requested value, not the clamped one.
+                self.println(f"U,{name},{value}")
+            else:
+                self.println(f"U,{name},ERROR")
+        elif command.startswith("get:AlladdedParams"):
+            for i in range(self.params.count):
+                name, low, high, current = self.params.get(i)
+                self.println(f"L,{i},{name},{low},{high},{current}")
+        elif command.startswith("set:software"):
+            comma = command.find(",")
+            if comma == -1:
+                self.println("ERR,Invalid set:software format")
+                return
+            self.software_name = command[comma + 1:].strip()[:SOFTWARE_NAME_SIZE - 1]
+            self.println(self.software_name)
+        elif command.startswith("read:digital"):
+            comma = command.find(",")
+            if comma == -1:
+                self.println("ERR,Invalid read:digital format")
+                return
+            pin = to_int(command[comma + 1:].strip())
+            self.println(f"D,{pin},{self.digital.get(pin, 0)}")
+        elif command.startswith("read:analog"):
+            comma = command.find(",")
+            if comma == -1:
+                self.println("ERR,Invalid read:analog format")
+                return
+            index = to_int(command[comma + 1:].strip())
+            self.println(f"A,{index},{self.analog_value(index, time.monotonic())}")
+        elif command.startswith("set:binary"):
+            comma = command.find(",")
+            baud = to_int(command[comma + 1:]) if comma != -1 else 0
+            if baud not in BAUD_RATES:
+                self.println("ERR,Invalid baud")
+                return
+            self.println(f"B,{baud}")
+            self.switch(True, baud)
+        else:
+            self.println("ERR,Unknown command")
+
+    def switch(self, binary, baud):
+        """Serial.flush() then Serial.begin(baud) with the other framing."""
+        delay = self.tx_free_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if self.paced:
+            self.byte_time = 10.0 / baud
+        self.binary = binary
+
+    def handle_frame(self, opcode, body):
+        """The firmware's binary command handler for one good frame."""
+        try:
+            if opcode == OP_ADD:
+                low, pos = decode_varint(body, 0)
+                high, pos = decode_varint(body, pos)
+                current, pos = decode_varint(body, pos)
+                name = body[pos:].decode("ascii", "replace")
+                slot = self.params.add(name, low, high, current)
+                if self.params.count == 1:
+                    self.selected = 0
+                self.send_frame(REPLY | OP_ADD, bytes((slot,)) + body[pos:])
+            elif opcode in (OP_GET, OP_UPDATE):
+                slot = body[0]
+                if not self.params.valid(slot):
+                    self.send_frame(OP_NOT_FOUND, bytes((opcode, slot)))
+                elif opcode == OP_GET:
+                    value = self.params.get(slot)[3]
+                    self.send_frame(REPLY | OP_GET, bytes((slot,)) + encode_varint(value))
+                else:
+                    value, _ = decode_varint(body, 1)
+                    param = self.params.get(slot)
+                    param[3] = constrain(value, param[1], param[2])
+                    self.send_frame(REPLY | OP_UPDATE, body[:1] + encode_varint(value))
+            elif opcode == OP_LIST:
+                for i in range(self.params.count):
+                    name, low, high, current = self.params.get(i)
+                    self.send_frame(REPLY | OP_LIST, bytes((i,)) + encode_varint(low)
+                                    + encode_varint(high) + encode_varint(current)
+                                    + name.encode("ascii", "replace"))
+            elif opcode == OP_SOFTWARE:
+                self.software_name = body.decode("ascii", "replace").strip()[
+                    :SOFTWARE_NAME_SIZE - 1]
+                self.send_frame(REPLY | OP_SOFTWARE, self.software_name.encode())
+            elif opcode == OP_READ_DIGITAL:
+                self.send_frame(REPLY | OP_READ_DIGITAL,
+                                body[:1] + encode_varint(self.digital.get(body[0], 0)))
+            elif opcode == OP_READ_ANALOG:
+                value = self.analog_value(body[0], time.monotonic())
+                self.send_frame(REPLY | OP_READ_ANALOG, body[:1] + encode_varint(value))
+            elif opcode in (OP_GET_NAMED, OP_UPDATE_NAMED):
+                value, pos = decode_varint(body, 0) if opcode == OP_UPDATE_NAMED else (0, 0)
+                name = body[pos:]
+                slot = self.params.slot(name.decode("ascii", "replace"))
+                if slot < 0:
+                    self.send_frame(OP_NO_NAME, bytes((opcode,)) + name)
+                    return
+                param = self.params.params[slot]
+                if opcode == OP_UPDATE_NAMED:
+                    param[3] = constrain(value, param[1], param[2])
+                else:
+                    value = param[3]
+                self.send_frame(OP_NAMED, bytes((opcode, slot)) + encode_varint(value) + name)
+            elif opcode == OP_TEXT:
+                self.send_frame(REPLY | OP_TEXT)
+                self.switch(False, TEXT_BAUD)
+            else:
+                self.send_frame(OP_ERROR, b"Unknown command")
+        except (IndexError, ValueError):
+            self.send_frame(OP_ERROR, b"Invalid frame")
+
+    def simulate_inputs(self):
+        now = time.monotonic()
+        if self.encoder_rate and now >= self.next_encoder:
+            self.turn_encoder(self.random.choice((-1, 1)))
+            self.next_encoder = now + self.random.expovariate(self.encoder_rate)
+        if self.button_interval and now >= self.next_button:
+            if now > self.started_at:
+                self.press_button()
+            self.next_button = now + self.button_interval
+
+    def poll_encoder(self):
+        with self.input_lock:
+            delta, self.encoder_delta = self.encoder_delta, 0
+        if not delta or self.selected < 0:
+            return
+        param = self.params.get(self.selected)
+        name, low, high, current = param
+        value = constrain(current + delta, low, high)
+        if value != current:
+            param[3] = value
+            if self.binary:
+                self.send_frame(REPLY | OP_UPDATE, bytes((self.selected,)) + encode_varint(value))
+            else:
+                self.println(f"U,{name},{value}")
+
+    def poll_button(self):
+        with self.input_lock:
+            if not self.button_presses:
+                return
+            self.button_presses -= 1
+        time.sleep(DEBOUNCE_DELAY)
+        if self.params.count:
+            self.selected = (self.selected + 1) % self.params.count
+            name, _, _, current = self.params.get(self.selected)
+            if self.binary:
+                self.send_frame(OP_SELECTED, bytes((self.selected,)) + encode_varint(current))
+            else:
+                self.println(f"S,{self.selected},{name},{current}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Emulate the control panel firmware on a pseudo-terminal.")
+    parser.add_argument("--baud", type=int, default=9600,
+                        help="simulated link speed, 0 for unpaced (default: %(default)s)")
+    parser.add_argument("--delay-ms", type=float, default=0.0,
+                        help="extra processing time per command (default: %(default)s)")
+    parser.add_argument("--encoder-rate", type=float, default=0.0,
+                        help="random encoder steps per second (default: off)")
+    parser.add_argument("--button-interval", type=float, default=0.0,
+                        help="seconds between simulated button presses (default: off)")
+    parser.add_argument("--link", metavar="PATH",
+                        help="also expose the pty under this path (a symlink)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    emulator = FirmwareEmulator(baud_rate=args.baud, command_delay=args.delay_ms / 1000,
+                                encoder_rate=args.encoder_rate,
+                                button_interval=args.button_interval, seed=args.seed)
+    port = emulator.start()
+    if args.link:
+        if os.path.islink(args.link):
+            os.remove(args.link)
+        os.symlink(port, args.link)
+    print(port, flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.stop()
+        if args.link and os.path.islink(args.link):
+            os.remove(args.link)
+        print(f"{emulator.commands} commands, {emulator.rx_overruns} bytes lost to RX overruns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""On-disk telemetry history for the Arduino control panel.
+
+Every parameter value (U, S, G and L replies) and pin reading (D and analog
+A replies) is appended as a fixed-size 16-byte record to memory-mapped
+segment files:
+
+    float64 time | uint32 series id | int32 value   (little endian)
+
+Values outside the int32 range are not recorded; out_of_range counts them.
+
+Series names map to ids through series.json next to the segments. Pins are
+stored as "pin:D<pin>" and "pin:A<index>" so they cannot clash with
+parameter names. Segments are preallocated, filled in time order and
+dropped oldest-first once the age or disk budget is exceeded. Records older
+than the age limit are never returned, even while their segment is kept.
+
+Queries bucket a time range into min/max/mean points. With numpy installed
+the mapped records are reduced as arrays; without it the records are
+unpacked with struct.iter_unpack, which is slower but needs nothing extra.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+RECORD = struct.Struct("<dIi")
+TIME = struct.Struct("<d")
+INT32_MIN, INT32_MAX = -2**31, 2**31 - 1
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([("time", "<f8"), ("series", "<u4"), ("value", "<i4")])
+
+
+def event_series(event):
+    """Return (series name, value) for a recordable engine event, or None."""
+    if event["type"] == "pin":
+        if event["kind"] == "digital":
+            name = f"pin:D{event['pin']}"
+        else:
+            name = f"pin:A{event['index']}"
+        value = event["value"]
+    elif event["type"] == "parameter" and event["source"] != "A":
+        name, value = event["name"], event.get("current")
+    else:
+        return None
+    if not isinstance(value, int):
+        return None
+    return name, value
+
+
+class Segment:
+    """One preallocated, memory-mapped file of records."""
+
+    __slots__ = ("path", "capacity", "count", "map")
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        size = capacity * RECORD.size
+        with open(path, "a+b") as f:
+            if os.fstat(f.fileno()).st_size != size:
+                f.truncate(size)
+            self.map = mmap.mmap(f.fileno(), size)
+        # Time is never 0.0 in a written record, so the zero-filled tail marks
+        # where writing stopped.
+        self.count = self.bisect(0, capacity, lambda t: t == 0.0)
+
+    def time_at(self, i):
+        return TIME.unpack_from(self.map, i * RECORD.size)[0]
+
+    def bisect(self, lo, hi, past):
+        """First index in [lo, hi) whose time satisfies past(time), else hi."""
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if past(self.time_at(mid)):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def last_time(self):
+        return self.time_at(self.count - 1) if self.count else None
+
+    def append(self, when, series_id, value):
+        RECORD.pack_into(self.map, self.count * RECORD.size, when, series_id, value)
+        self.count += 1
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            # A query still holds a view of it; the mapping goes away with it.
+            pass
+
+
+class HistoryStore:
+    """Append-only, segmented time-series log with downsampled queries.
+
+    record() runs on the serial reader thread and only packs 16 bytes into
+    the active mapping. query() works on a snapshot of the segment list, so
+    long range scans never hold the writer up.
+    """
+
+    SERIES_FILE = "series.json"
+    SEGMENT_SUFFIX = ".seg"
+    MAX_POINTS = 10000
+    # Seconds between age checks made by append().
+    RETENTION_INTERVAL = 60.0
+
+    def __init__(self, directory, segment_records=262144, max_bytes=1 << 30,
+                 max_age=28 * 86400):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.max_segments = max(1, max_bytes // (segment_records * RECORD.size))
+        self.max_age = max_age
+        self.out_of_range = 0
+        self.next_retention = 0.0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.series = {}
+        series_path = os.path.join(directory, self.SERIES_FILE)
+        if os.path.exists(series_path):
+            with open(series_path) as f:
+                self.series = json.load(f)
+
+        self.segments = []
+        self.next_number = 1
+        for entry in sorted(os.listdir(directory)):
+            stem, suffix = os.path.splitext(entry)
+            if suffix != self.SEGMENT_SUFFIX or not stem.isdigit():
+                continue
+            path = os.path.join(directory, entry)
+            capacity = os.path.getsize(path) // RECORD.size
+            if capacity:
+                self.segments.append(Segment(path, capacity))
+            self.next_number = int(stem) + 1
+        self.last_time = 0.0
+        for segment in reversed(self.segments):
+            if segment.count:
+                self.last_time = segment.last_time()
+                break
+        with self.lock:
+            self.apply_retention()
+
+    def record(self, event):
+        """Append an engine event if it carries a parameter value or pin reading."""
+        series = event_series(event)
+        if series is not None:
+            self.append(*series)
+
+    def append(self, name, value, when=None):
+        when = time.time() if when is None else when
+        with self.lock:
+            if not INT32_MIN <= value <= INT32_MAX:
+                self.out_of_range += 1
+                return
+            series_id = self.series.get(name)
+            if series_id is None:
+                series_id = self.add_series(name)
+            # Segments are searched by time, so keep it non-decreasing even if
+            # the wall clock steps back.
+            when = max(when, self.last_time)
+            self.last_time = when
+            if not self.segments or self.segments[-1].full:
+                self.rotate()
+            elif when >= self.next_retention:
+                self.expire(when)
+            self.segments[-1].append(when, series_id, value)
+
+    def add_series(self, name):
+        series_id = len(self.series) + 1
+        self.series[name] = series_id
+        path = os.path.join(self.directory, self.SERIES_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.series, f)
+        os.replace(path + ".tmp", path)
+        return series_id
+
+    def rotate(self):
+        path = os.path.join(self.directory,
+                            f"{self.next_number:08d}{self.SEGMENT_SUFFIX}")
+        self.next_number += 1
+        self.segments.append(Segment(path, self.segment_records))
+        self.apply_retention()
+
+    def expire(self, now):
+        """Age check between rotations (lock held).
+
+        Once the active segment's first record is past the age limit, a new
+        segment is started so the old one can be dropped when its last
+        record expires too.
+        """
+        self.next_retention = now + self.RETENTION_INTERVAL
+        active = self.segments[-1]
+        if self.max_age and active.count and active.time_at(0) < now - self.max_age:
+            self.rotate()
+        else:
+            self.apply_retention()
+
+    def apply_retention(self):
+        """Drop the oldest segments beyond the disk budget or age limit (lock held)."""
+        cutoff = time.time() - self.max_age if self.max_age else None
+        while len(self.segments) > 1:
+            oldest = self.segments[0]
+            expired = cutoff is not None and (oldest.count == 0
+                                              or oldest.last_time() < cutoff)
+            if len(self.segments) <= self.max_segments and not expired:
+                break
+            self.segments.pop(0)
+            oldest.close()
+            os.remove(oldest.path)
+
+    def flush(self):
+        with self.lock:
+            if self.segments:
+                self.segments[-1].map.flush()
+
+    def names(self):
+        with self.lock:
+            return sorted(self.series)
+
+    def query(self, name, start, end, step):
+        """Return min/max/mean points for name over [start, end) in step-second buckets.
+
+        Raises KeyError for a series that was never recorded and ValueError
+        for a range that would produce more than MAX_POINTS buckets.
+        """
+        if step <= 0 or end <= start:
+            raise ValueError("need from < to and step > 0")
+        if (end - start) / step > self.MAX_POINTS:
+            raise ValueError(f"more than {self.MAX_POINTS} points requested")
+        with self.lock:
+            series_id = self.series[name]
+            segments = [(segment, segment.count) for segment in self.segments]
+        # Expired records may still sit in a kept segment.
+        first = max(start, time.time() - self.max_age) if self.max_age else start
+
+        aggregate = aggregate_numpy if np is not None else aggregate_struct
+        try:
+            spans = []
+            for segment, count in segments:
+                if (not count or segment.time_at(count - 1) < first
+                        or segment.time_at(0) >= end):
+                    continue
+                lo = segment.bisect(0, count, lambda t: t >= first)
+                hi = segment.bisect(lo, count, lambda t: t >= end)
+                if lo < hi:
+                    spans.append((segment, lo, hi))
+            points = aggregate(spans, series_id, start, step)
+        except ValueError:
+            # A segment was retired (and its mapping closed) mid-scan.
+            points = []
+        return [{"time": start + bucket * step, "min": low, "max": high,
+                 "mean": total / count, "count": count}
+                for bucket, low, high, total, count in points]
+
+
+def aggregate_numpy(spans, series_id, start, step):
+    """Bucket the selected records with array reductions."""
+    times, values = [], []
+    for segment, lo, hi in spans:
+        records = np.frombuffer(segment.map, dtype=RECORD_DTYPE, count=hi - lo,
+                                offset=lo * RECORD.size)
+        mine = records[records["series"] == series_id]
+        times.append(mine["time"])
+        values.append(mine["value"])
+    if not times:
+        return []
+    times = np.concatenate(times)
+    if not len(times):
+        return []
+    values = np.concatenate(values).astype(np.int64)
+    buckets = ((times - start) // step).astype(np.int64)
+    # Records are in time order, so each bucket is one contiguous run.
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(buckets)])
+    return zip(buckets[starts].tolist(),
+               np.minimum.reduceat(values, starts).tolist(),
+               np.maximum.reduceat(values, starts).tolist(),
+               np.add.reduceat(values, starts).tolist(),
+               counts.tolist())
+
+
+def aggregate_struct(spans, series_id, start, step):
+    """Bucket the selected records without numpy."""
+    points = []
+    for segment, lo, hi in spans:
+        view = memoryview(segment.map)[lo * RECORD.size:hi * RECORD.size]
+        try:
+            for when, series, value in RECORD.iter_unpack(view):
+                if series != series_id:
+                    continue
+                bucket = int((when - start) // step)
+                if points and points[-1][0] == bucket:
+                    point = points[-1]
+                    point[1] = min(point[1], value)
+                    point[2] = max(point[2], value)
+                    point[3] += value
+                    point[4] += 1
+                else:
+                    points.append([bucket, value, value, value, 1])
+        finally:
+            view.release()
+    return points
@@ -0,0 +1,1827 @@
+"""Serial engine for the Arduino control panel.
+
+Owns the serial link, the line protocol and the parameter store. Nothing in
+here depends on Tk, so the engine can run headless behind the REST API or be
+driven by the desktop GUI in panelGui.py.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures import wait as futures_wait
+from itertools import islice
+
+import serial
+
+from binaryFraming import BinaryCodec
+from panelMetrics import EngineMetrics
+from serialParser import (BoardError, FramingChanged, ParameterAdded, ParameterListed,
+                          ParameterNotFound, ParameterSelected, ParameterValue, PinReading,
+                          SoftwareSet, Unrecognized, parse_line)
+
+
+class LineLatency:
+    """Rolling record of per-line arrival-to-dispatch times."""
+
+    def __init__(self, maxlen=2000):
+        self.samples = deque(maxlen=maxlen)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        """Return count, mean, p50, p99 and max in milliseconds."""
+        data = sorted(self.samples)
+        if not data:
+            return {"count": 0, "mean_ms": None, "p50_ms": None,
+                    "p99_ms": None, "max_ms": None}
+        count = len(data)
+        return {
+            "count": count,
+            "mean_ms": round(sum(data) / count * 1000, 3),
+            "p50_ms": round(data[int(0.50 * (count - 1))] * 1000, 3),
+            "p99_ms": round(data[int(0.99 * (count - 1))] * 1000, 3),
+            "max_ms": round(data[-1] * 1000, 3),
+        }
+
+
+class LineSplitter:
+    """Incremental newline splitter that keeps partial lines between reads."""
+
+    def __init__(self, max_pending=4096):
+        self.pending = b""
+        self.max_pending = max_pending
+
+    def feed(self, data):
+        """Return the complete lines in pending + data, keeping the remainder."""
+        lines = (self.pending + data).split(b"\n")
+        self.pending = lines.pop()
+        # Garbage without a newline should not grow the buffer forever.
+        if len(self.pending) > self.max_pending:
+            self.pending = b""
+        return lines
+
+
+def dispatch_line(engine, line):
+    """Hand one received line to the engine.
+
+    A failure while applying the line is a bug on this side, not a broken
+    link: it is logged and the reader carries on with the next line.
+    """
+    try:
+        engine.handle_line(line)
+    except Exception as e:
+        engine.log(f"Error handling {line!r}: {type(e).__name__}: {e}")
+
+
+class SerialReader(threading.Thread):
+    """Background reader that hands each received line to the engine.
+
+    mode="event" blocks on the port and wakes as soon as bytes arrive, pulling
+    everything available in one call. mode="poll" keeps the original
+    readline()/sleep(poll_interval) loop.
+    """
+
+    def __init__(self, ser, engine, mode="event", poll_interval=0.1):
+        super().__init__()
+        self.ser = ser
+        self.engine = engine  # receives each line via handle_line
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.latency = LineLatency()
+        self.running = True
+        self.daemon = True  # exit when main program closes
+
+    def run(self):
+        if self.mode == "poll":
+            self.run_polling()
+        else:
+            self.run_event_driven()
+
+    def run_polling(self):
+        # Bytes may have landed any time since the previous check, so timing
+        # is measured from there.
+        last_check = time.perf_counter()
+        while self.running:
+            try:
+                raw = self.ser.readline() if self.ser.in_waiting else b""
+            except (serial.SerialException, OSError) as e:
+                self.engine.log(f"Serial read error: {e}")
+                self.engine.link_failed(e)
+                return
+            if raw:
+                self.engine.metrics.bytes_in.inc(len(raw))
+                self.engine.metrics.last_rx = time.monotonic()
+                line = raw.decode("utf-8", errors="ignore").strip()
+                if line:
+                    self.dispatch(line, last_check)
+            last_check = time.perf_counter()
+            time.sleep(self.poll_interval)
+
+    def run_event_driven(self):
+        while self.running:
+            try:
+                # Blocks until at least one byte arrives (or the port timeout
+                # expires), then drains whatever else is already buffered.
+                chunk = self.ser.read(self.ser.in_waiting or 1)
+                if not chunk:
+                    continue
+                waiting = self.ser.in_waiting
+                if waiting:
+                    chunk += self.ser.read(waiting)
+            except (serial.SerialException, OSError) as e:
+                if self.running:
+                    self.engine.log(f"Serial read error: {e}")
+                    # The supervisor reopens the port with a new reader.
+                    self.engine.link_failed(e)
+                return
+            arrived = time.perf_counter()
+            self.engine.metrics.bytes_in.inc(len(chunk))
+            self.engine.metrics.last_rx = time.monotonic()
+            for raw in self.engine.decoder.feed(chunk):
+                line = raw.decode("utf-8", errors="ignore").strip()
+                if line:
+                    self.dispatch(line, arrived)
+
+    def dispatch(self, line, arrived):
+        self.latency.record(time.perf_counter() - arrived)
+        dispatch_line(self.engine, line)
+
+    def stop(self):
+        self.running = False
+        # Wake a read blocked on the port, so the thread leaves it promptly.
+        if hasattr(self.ser, "cancel_read"):
+            try:
+                self.ser.cancel_read()
+            except (serial.SerialException, OSError):
+                pass
+
+
+class AsyncSerialLink:
+    """Serial reader and writer driven by an asyncio event loop (POSIX only).
+
+    The loop watches the port's file descriptor and parses whatever is
+    readable without blocking. Writes from any thread are queued to a single
+    writer task, so commands go out in submission order and no thread ever
+    blocks on the port. Commands that never make it out (the port failed, or
+    the link was detached first) are handed back to PanelEngine.hold_unsent.
+    """
+
+    mode = "asyncio"
+
+    def __init__(self, ser, engine, loop):
+        self.ser = ser
+        self.engine = engine
+        self.loop = loop
+        self.latency = LineLatency()
+        self.queue = None
+        self.writer = None
+        self.current = None  # (data, cmd) being written
+        self.fd = None
+        self.ident = self.native_id = None
+
+    def start(self):
+        """Attach to the loop; safe to call from any thread."""
+        attached = Future()
+
+        def attach():
+            try:
+                self.ident = threading.get_ident()
+                self.native_id = threading.get_native_id()
+                self.ser.timeout = 0
+                self.fd = self.ser.fileno()
+                self.queue = asyncio.Queue()
+                self.loop.add_reader(self.fd, self.on_readable)
+                self.writer = self.loop.create_task(self.write_loop())
+                attached.set_result(None)
+            except Exception as e:
+                attached.set_exception(e)
+
+        self.loop.call_soon_threadsafe(attach)
+        attached.result()
+
+    def on_readable(self):
+        try:
+            chunk = self.ser.read(self.ser.in_waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            self.engine.log(f"Serial read error: {e}")
+            self.loop.remove_reader(self.fd)
+            self.engine.link_failed(e)
+            return
+        if not chunk:
+            return
+        arrived = time.perf_counter()
+        self.engine.metrics.bytes_in.inc(len(chunk))
+        self.engine.metrics.last_rx = time.monotonic()
+        for raw in self.engine.decoder.feed(chunk):
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if line:
+                self.latency.record(time.perf_counter() - arrived)
+                dispatch_line(self.engine, line)
+
+    def write(self, data, cmd=None):
+        """Queue data; cmd, if given, is held by the engine should it not go out."""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (data, cmd))
+
+    def unsent(self):
+        """Take the commands not written yet, oldest first (on the loop)."""
+        items = [self.current] if self.current is not None else []
+        self.current = None
+        while self.queue is not None and not self.queue.empty():
+            items.append(self.queue.get_nowait())
+        return [cmd for _, cmd in items if cmd is not None]
+
+    async def write_loop(self):
+        fd = self.fd
+        while True:
+            self.current = await self.queue.get()
+            view = memoryview(self.current[0])
+            try:
+                while view:
+                    try:
+                        view = view[os.write(fd, view):]
+                    except BlockingIOError:
+                        writable = self.loop.create_future()
+                        self.loop.add_writer(fd, writable.set_result, None)
+                        try:
+                            await writable
+                        finally:
+                            self.loop.remove_writer(fd)
+                self.current = None
+            except OSError as e:
+                self.engine.log(f"Error sending command: {e}")
+                self.engine.link_failed(e)
+                self.engine.hold_unsent(self.unsent())
+
+    def stop(self):
+        """Detach from the loop before the port is closed under it."""
+        detached = Future()
+
+        def detach():
+            self.loop.remove_reader(self.fd)
+            if self.writer is not None:
+                self.writer.cancel()
+            self.engine.hold_unsent(self.unsent())
+            detached.set_result(None)
+
+        if self.fd is None:
+            return
+        if threading.get_ident() == self.ident:
+            detach()
+            return
+        try:
+            self.loop.call_soon_threadsafe(detach)
+            detached.result(timeout=1.0)
+        except (RuntimeError, FutureTimeoutError):
+            pass  # the loop is gone or stuck; nothing left to detach from
+
+
+class LogStore:
+    """Bounded, thread-safe ring buffer of structured log records.
+
+    Each record has a sequence number, a wall-clock timestamp, a direction
+    ("in" for received lines, "out" for sent commands, "info" otherwise) and
+    the raw line. Sequence numbers keep counting across clears, so readers
+    can resume from the last one they saw.
+    """
+
+    PREFIXES = {"in": "Received: ", "out": "Sending: ", "info": ""}
+
+    def __init__(self, capacity=5000):
+        self.records = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.next_seq = 1
+
+    def append(self, direction, line):
+        with self.lock:
+            record = {"seq": self.next_seq, "time": time.time(),
+                      "direction": direction, "line": line}
+            self.next_seq += 1
+            self.records.append(record)
+        return record
+
+    def since(self, seq=0, limit=None):
+        """Return up to limit records with a sequence number above seq."""
+        with self.lock:
+            if not self.records:
+                return []
+            # Sequence numbers in the buffer are contiguous.
+            start = max(0, seq - self.records[0]["seq"] + 1)
+            stop = None if limit is None else start + limit
+            return list(islice(self.records, start, stop))
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+    @classmethod
+    def render(cls, record):
+        return cls.PREFIXES.get(record["direction"], "") + record["line"]
+
+
+# Size of the Uno's hardware serial RX buffer. Bytes beyond this that arrive
+# while the firmware is busy (e.g. redrawing the OLED) are lost.
+FIRMWARE_RX_BUFFER = 64
+
+
+class FirmwareError(Exception):
+    """The Arduino answered a command with ERR,<message> or an ERROR value."""
+
+
+class LinkDown(serial.SerialException):
+    """The serial link is down and the command could not be held for replay."""
+
+
+def expected_reply(command):
+    """Return a predicate that matches the firmware's reply to command.
+
+    Returns None for commands without a single correlatable reply (e.g.
+    get:AlladdedParams, which answers with zero or more L, lines).
+    """
+    verb, _, args = command.strip().partition(",")
+    if verb == "add:param":
+        reply = "A," + args.split(",")[0]
+        return lambda line: line == reply
+    if verb == "update:paramsCurval":
+        prefix = "U," + args.split(",")[0] + ","
+    elif verb == "get:paramCurval":
+        prefix = "G," + args + ","
+    elif verb == "set:software":
+        # The firmware echoes the bare name, truncated to its 31-char buffer.
+        reply = args.strip()[:31]
+        return lambda line: line == reply
+    elif verb in ("read:digital", "read:analog"):
+        try:
+            pin = int(args.strip())
+        except ValueError:
+            return None
+        prefix = ("D," if verb == "read:digital" else "A,") + f"{pin},"
+    else:
+        return None
+    return lambda line: line.startswith(prefix) and line.count(",") == 2
+
+
+class PendingCommand:
+    """An outgoing command waiting for its reply; future yields the reply line."""
+
+    def __init__(self, command, matches, quiet=False, errors=True):
+        self.command = command
+        self.matches = matches
+        # False for commands the firmware never answers with ERR, (the sync
+        # marker), so a stray ERR, cannot be taken for their reply.
+        self.errors = errors
+        # Quiet replies (e.g. scheduled pin samples) are kept out of the log.
+        self.quiet = quiet
+        self.sent_at = time.perf_counter()
+        self.replied_at = None
+        self.future = Future()
+
+
+class CommandTracker:
+    """Pairs outgoing commands with the firmware replies that answer them.
+
+    The firmware handles commands strictly in order, so an ERR, line is
+    attributed to the oldest command still in flight that can fail that way.
+    """
+
+    def __init__(self):
+        self.pending = deque()
+        self.lock = threading.Lock()
+
+    def expect(self, command, matches=None, quiet=False, errors=True):
+        """Register command before sending it; returns None if it has no reply.
+
+        matches overrides the reply predicate derived from the command.
+        errors=False keeps ERR, lines from being attributed to it.
+        """
+        if matches is None:
+            matches = expected_reply(command)
+        if matches is None:
+            return None
+        pending = PendingCommand(command, matches, quiet, errors)
+        with self.lock:
+            self.pending.append(pending)
+        return pending
+
+    def discard(self, pending):
+        """Stop waiting for pending; returns False if its reply already arrived."""
+        with self.lock:
+            try:
+                self.pending.remove(pending)
+            except ValueError:
+                return False
+        return True
+
+    def fail_all(self, error):
+        """Fail every command still waiting, e.g. when the link drops under them."""
+        with self.lock:
+            pending, self.pending = list(self.pending), deque()
+        for p in pending:
+            p.future.set_exception(error)
+
+    def claim(self, line):
+        """Take the in-flight command answered by line off the queue, or None."""
+        with self.lock:
+            if not self.pending:
+                return None
+            if line.startswith("ERR,"):
+                pending = next((p for p in self.pending if p.errors), None)
+            else:
+                pending = next((p for p in self.pending if p.matches(line)), None)
+            if pending is None:
+                return None
+            self.pending.remove(pending)
+        pending.replied_at = time.perf_counter()
+        return pending
+
+    @staticmethod
+    def complete(pending, line):
+        """Hand line to a claimed command's waiter."""
+        if line.startswith("ERR,"):
+            pending.future.set_exception(FirmwareError(line[4:]))
+        elif line.endswith(",ERROR"):
+            pending.future.set_exception(
+                FirmwareError(f"Parameter not found: {line.split(',')[1]}"))
+        else:
+            pending.future.set_result(line)
+
+    def resolve(self, line):
+        """Complete the in-flight command answered by line; returns it, or None."""
+        pending = self.claim(line)
+        if pending is not None:
+            self.complete(pending, line)
+        return pending
+
+
+class TokenBucket:
+    """Paces writes to a fraction of the link's byte rate.
+
+    Bursts are capped at burst_bytes, by default the Uno's 64-byte RX
+    buffer. Only the owning writer thread may call wait and spend.
+    """
+
+    def __init__(self, baud_rate, utilization, burst_bytes=FIRMWARE_RX_BUFFER):
+        self.utilization = utilization
+        self.set_baud(baud_rate)
+        self.burst = burst_bytes
+        self.tokens = float(burst_bytes)
+        self.refilled_at = time.perf_counter()
+
+    def wait(self, cost):
+        """Sleep until cost bytes may be written."""
+        while True:
+            now = time.perf_counter()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.refilled_at) * self.rate)
+            self.refilled_at = now
+            if self.tokens >= cost:
+                return
+            time.sleep((cost - self.tokens) / self.rate)
+
+    def spend(self, cost):
+        self.tokens -= cost
+
+    def set_baud(self, baud_rate):
+        # 8N1 framing: 10 bits on the wire per byte.
+        self.rate = baud_rate / 10 * self.utilization
+
+
+class UpdateThrottler(threading.Thread):
+    """Last-writer-wins slots for update:paramsCurval writes.
+
+    Each parameter has at most one pending value; a newer submit replaces it
+    in place. The slots are drained in order with a token bucket sized to a
+    fraction of the link's byte rate, bursting no more than the Uno's 64-byte
+    RX buffer, so the board never falls behind on stale setpoints.
+    """
+
+    def __init__(self, send, baud_rate, utilization=0.5,
+                 burst_bytes=FIRMWARE_RX_BUFFER, cost=None, log=print):
+        super().__init__()
+        self.send = send
+        self.log = log
+        # Bytes a command takes on the wire; text CSV unless told otherwise.
+        self.cost = cost or (lambda cmd: len(cmd) + 1)
+        self.bucket = TokenBucket(baud_rate, utilization, burst_bytes)
+        self.slots = OrderedDict()  # name -> (value, submitted_at)
+        self.cond = threading.Condition()
+        # Held from taking a slot until its command is written, so
+        # supersede() cannot slip in between.
+        self.send_lock = threading.Lock()
+        self.submitted = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.running = True
+        self.daemon = True
+
+    def submit(self, name, value):
+        """Queue value for name; returns True if it replaced a pending value."""
+        with self.cond:
+            self.submitted += 1
+            replaced = name in self.slots
+            if replaced:
+                self.coalesced += 1
+            self.slots[name] = (value, time.perf_counter())
+            self.cond.notify()
+        return replaced
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.slots:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                name, (value, _) = next(iter(self.slots.items()))
+            self.bucket.wait(self.cost(f"update:paramsCurval,{name},{value}"))
+            with self.send_lock:
+                with self.cond:
+                    if name not in self.slots:
+                        continue
+                    # Pick up any value that superseded the one we paced for.
+                    value, submitted_at = self.slots.pop(name)
+                cmd = f"update:paramsCurval,{name},{value}"
+                try:
+                    self.send(cmd)
+                except Exception as e:
+                    self.log(f"Dropped update {cmd}: {e}")
+                    self.dropped += 1
+                    continue
+            self.bucket.spend(self.cost(cmd))
+            self.sent += 1
+            self.last_lag = time.perf_counter() - submitted_at
+            self.max_lag = max(self.max_lag, self.last_lag)
+
+    def supersede(self, name):
+        """Drop name's pending value before a newer one is sent directly.
+
+        Returns True if a value was dropped. Once this returns, the throttler
+        sends nothing older for name.
+        """
+        with self.send_lock, self.cond:
+            replaced = self.slots.pop(name, None) is not None
+            if replaced:
+                self.coalesced += 1
+            return replaced
+
+    def stats(self):
+        with self.cond:
+            pending = len(self.slots)
+        return {
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "pending": pending,
+            "last_lag_ms": round(self.last_lag * 1000, 3),
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "rate_bytes_per_s": self.bucket.rate,
+        }
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.dropped += len(self.slots)
+            self.slots.clear()
+            self.cond.notify()
+
+
+PIN_RANGES = {"A": range(0, 6), "D": range(2, 14)}
+
+
+def pin_command(pin):
+    """Map a pin name ("A0"-"A5", "D2"-"D13") to its read command."""
+    kind, number = pin[:1].upper(), pin[1:]
+    if kind not in PIN_RANGES or not number.isdigit() or int(number) not in PIN_RANGES[kind]:
+        raise ValueError(f"Invalid pin: {pin} (use A0-A5 or D2-D13)")
+    verb = "read:analog" if kind == "A" else "read:digital"
+    return kind + str(int(number)), f"{verb},{int(number)}"
+
+
+class PinChannel:
+    """One sampled pin: its schedule, ring buffer of readings and counters."""
+
+    def __init__(self, pin, command, rate_hz, capacity, cost):
+        self.pin = pin
+        self.command = command
+        self.cost = cost  # bytes per request on the wire (PanelEngine.wire_cost)
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self.next_due = time.perf_counter()
+        self.samples = deque(maxlen=capacity)  # (wall time, value)
+        self.reply_times = deque(maxlen=256)   # perf_counter of recent replies
+        self.count = 0
+        self.missed = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def add_sample(self, replied_at, value):
+        self.samples.append((time.time(), value))
+        self.reply_times.append(replied_at)
+        self.count += 1
+
+    def since(self, start=0.0, limit=None):
+        """Samples taken after wall time start, oldest first, at most limit."""
+        samples = list(self.samples)
+        samples = [(t, v) for t, v in samples if t > start]
+        if limit is not None:
+            samples = samples[-limit:]
+        return [{"time": t, "value": v} for t, v in samples]
+
+    def stats(self):
+        times = list(self.reply_times)
+        intervals = [b - a for a, b in zip(times, times[1:])]
+        achieved = jitter = None
+        if intervals:
+            mean = sum(intervals) / len(intervals)
+            achieved = 1.0 / mean if mean > 0 else None
+            jitter = (sum((i - mean) ** 2 for i in intervals) / len(intervals)) ** 0.5
+        return {
+            "pin": self.pin,
+            "target_hz": self.rate_hz,
+            "achieved_hz": round(achieved, 3) if achieved else None,
+            "jitter_ms": round(jitter * 1000, 3) if jitter is not None else None,
+            "samples": self.count,
+            "buffered": len(self.samples),
+            "capacity": self.samples.maxlen,
+            "missed": self.missed,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+
+class PinSampler(threading.Thread):
+    """Schedules read:digital/read:analog requests for registered pins.
+
+    The pin whose next sample is due first goes next. Requests are paced by
+    a token bucket and at most window_bytes of them are in flight, so the
+    firmware's RX buffer never overflows and the sampler settles at the
+    fastest rate the board actually answers. A pin that falls behind skips
+    the samples it missed instead of bursting to catch up.
+    """
+
+    def __init__(self, engine, utilization=0.4, window_bytes=FIRMWARE_RX_BUFFER // 2,
+                 timeout=1.0):
+        super().__init__()
+        self.engine = engine
+        self.bucket = TokenBucket(engine.link_baud, utilization, window_bytes)
+        self.window = window_bytes
+        self.timeout = timeout
+        self.channels = {}
+        self.in_flight = {}  # PendingCommand -> (PinChannel, bytes charged)
+        self.in_flight_bytes = 0
+        self.cond = threading.Condition()
+        self.running = True
+        self.daemon = True
+
+    def add(self, pin, rate_hz, capacity=1000):
+        """Start (or reschedule) sampling pin at rate_hz; raises ValueError."""
+        pin, command = pin_command(pin)
+        if not rate_hz > 0:
+            raise ValueError("rate_hz must be positive")
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        channel = PinChannel(pin, command, rate_hz, capacity,
+                             self.engine.wire_cost(command))
+        with self.cond:
+            self.channels[pin] = channel
+            self.cond.notify()
+        return channel
+
+    def remove(self, pin):
+        """Stop sampling pin; raises KeyError if it is not registered."""
+        with self.cond:
+            return self.channels.pop(pin_command(pin)[0])
+
+    def channel(self, pin):
+        """The registered channel for pin; raises KeyError (or ValueError)."""
+        with self.cond:
+            return self.channels[pin_command(pin)[0]]
+
+    def run(self):
+        while True:
+            with self.cond:
+                channel = self.next_request()
+                if channel is None:
+                    return
+                cost = channel.cost
+                self.in_flight_bytes += cost
+            self.bucket.wait(cost)
+            pending = self.engine.command_tracker.expect(channel.command, quiet=True)
+            with self.cond:
+                self.in_flight[pending] = (channel, cost)
+            pending.future.add_done_callback(
+                lambda future, pending=pending: self.completed(pending))
+            try:
+                self.engine.write(channel.command, hold=False)
+            except LinkDown:
+                # Samples missed during an outage are not replayed later.
+                if self.engine.command_tracker.discard(pending):
+                    pending.future.set_exception(TimeoutError(channel.command))
+                continue
+            except Exception as e:
+                self.engine.log(f"Pin sampler write failed: {e}")
+                if self.engine.command_tracker.discard(pending):
+                    pending.future.set_exception(e)
+                continue
+            self.bucket.spend(cost)
+
+    def next_request(self):
+        """Wait (cond held) until a channel is due and fits the window; None on stop."""
+        while self.running:
+            now = time.perf_counter()
+            self.expire(now)
+            wait = None
+            if self.in_flight:
+                oldest = min(p.sent_at for p in self.in_flight)
+                wait = max(0.0, oldest + self.timeout - now)
+            if self.channels:
+                channel = min(self.channels.values(), key=lambda c: c.next_due)
+                # The framing changes when binary mode is entered or left.
+                channel.cost = self.engine.wire_cost(channel.command)
+                if channel.next_due <= now and self.in_flight_bytes + channel.cost <= self.window:
+                    late = now - channel.next_due
+                    if late > channel.period:
+                        skipped = int(late / channel.period)
+                        channel.missed += skipped
+                        channel.next_due += skipped * channel.period
+                    channel.next_due += channel.period
+                    return channel
+                if channel.next_due > now:
+                    due = channel.next_due - now
+                    wait = due if wait is None else min(wait, due)
+            self.cond.wait(wait)
+        return None
+
+    def expire(self, now):
+        """Give up on requests the board has not answered within timeout (cond held)."""
+        for pending in [p for p in self.in_flight if now - p.sent_at > self.timeout]:
+            if self.engine.command_tracker.discard(pending):
+                pending.future.set_exception(TimeoutError(pending.command))
+
+    def completed(self, pending):
+        """Done-callback of each request: store the reading and free its window bytes."""
+        with self.cond:
+            entry = self.in_flight.pop(pending, None)
+            if entry is None:
+                return
+            channel, cost = entry
+            self.in_flight_bytes -= cost
+            error = pending.future.exception()
+            if isinstance(error, TimeoutError):
+                channel.timeouts += 1
+            elif error is not None:
+                channel.errors += 1
+            else:
+                reading = parse_line(pending.future.result())
+                channel.add_sample(pending.replied_at, reading.value)
+            self.cond.notify()
+
+    def stats(self):
+        with self.cond:
+            demand = sum(c.cost * c.rate_hz for c in self.channels.values())
+            return {
+                "pins": {pin: c.stats() for pin, c in self.channels.items()},
+                "demand_bytes_per_s": round(demand, 3),
+                "rate_bytes_per_s": self.bucket.rate,
+                "in_flight_bytes": self.in_flight_bytes,
+                "window_bytes": self.window,
+            }
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+
+class LinkSupervisor(threading.Thread):
+    """Reopens a lost or stalled serial link and resynchronizes the engine.
+
+    Readers report a failed port through PanelEngine.link_failed; a link
+    whose oldest in-flight command has gone stall_timeout without a byte
+    from the board counts as stalled. Reopening backs off from
+    initial_delay to max_delay. Once the board answers again, the parameter
+    store is rebuilt from one get:AlladdedParams sweep and the writes held
+    during the outage are replayed in order.
+    """
+
+    def __init__(self, engine, stall_timeout=5.0, initial_delay=0.5, max_delay=10.0,
+                 ready_timeout=3.0, check_interval=0.5):
+        super().__init__()
+        self.engine = engine
+        self.stall_timeout = stall_timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.ready_timeout = ready_timeout
+        self.check_interval = check_interval
+        self.lost = threading.Event()
+        self.stopped = threading.Event()
+        self.state = "connected"
+        self.reconnects = 0
+        self.attempts = 0
+        self.last_error = None
+        self.down_since = None  # time.monotonic() when the current outage began
+        self.last_outage = None  # seconds the previous outage lasted
+        self.daemon = True
+
+    def run(self):
+        while not self.stopped.is_set():
+            if not self.lost.wait(self.check_interval):
+                if not self.engine.stalled(self.stall_timeout):
+                    continue
+                self.engine.link_failed(
+                    f"no reply from the board for {self.stall_timeout:g} s")
+            if self.stopped.is_set():
+                return
+            self.recover()
+
+    def set_state(self, state):
+        self.state = state
+        self.engine.publish_event({"type": "link", "state": state})
+
+    def recover(self):
+        self.lost.clear()
+        if self.down_since is None:
+            self.down_since = time.monotonic()
+        self.set_state("reconnecting")
+        self.engine.close_link()
+        delay = self.initial_delay
+        while not self.stopped.is_set():
+            self.attempts += 1
+            try:
+                self.engine.open_link()
+                if not self.engine.reach_board(self.ready_timeout):
+                    raise serial.SerialException("the board did not answer")
+                break
+            except (serial.SerialException, OSError) as e:
+                self.last_error = str(e)
+                self.engine.close_link()
+                self.stopped.wait(delay)
+                delay = min(delay * 2, self.max_delay)
+        else:
+            return
+        self.set_state("resyncing")
+        if self.engine.binary_baud:
+            self.engine.negotiate_binary()
+        self.engine.resync()
+        self.set_state("replaying")
+        if not self.engine.replay_held():
+            return  # the link failed again; run() starts over
+        self.reconnects += 1
+        self.last_outage = time.monotonic() - self.down_since
+        self.down_since = None
+        self.engine.log(f"Serial link restored after {self.last_outage:.1f} s")
+        self.set_state("connected")
+
+    def stats(self):
+        outage = None if self.down_since is None else time.monotonic() - self.down_since
+        return {
+            "state": self.state,
+            "reconnects": self.reconnects,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "outage_s": None if outage is None else round(outage, 3),
+            "last_outage_s": None if self.last_outage is None else round(self.last_outage, 3),
+            "held_writes": len(self.engine.held),
+            "framing": "binary" if self.engine.codec is not None else "text",
+            "baud": self.engine.link_baud,
+        }
+
+    def stop(self):
+        self.stopped.set()
+        self.lost.set()
+
+
+class Subscription:
+    """One streaming client's bounded event queue.
+
+    When the client falls behind, the oldest events are dropped and counted,
+    so a slow consumer never blocks the publisher.
+    """
+
+    def __init__(self, maxsize):
+        self.events = deque(maxlen=maxsize)
+        self.cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, event):
+        with self.cond:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+            self.cond.notify()
+
+    def get(self, timeout):
+        """Wait up to timeout for events; return (events, dropped since last get)."""
+        with self.cond:
+            if not self.events:
+                self.cond.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+
+class AsyncSubscription:
+    """Subscription consumed from an asyncio event loop.
+
+    put() may be called from any thread; events are handed to the loop, so
+    waiting clients cost no thread each.
+    """
+
+    def __init__(self, maxsize, loop):
+        self.events = deque(maxlen=maxsize)
+        self.loop = loop
+        self.ready = asyncio.Event()
+        self.dropped = 0
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self.deliver, event)
+        except RuntimeError:
+            # The loop has closed; nobody is listening any more.
+            pass
+
+    def deliver(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.events.append(event)
+        self.ready.set()
+
+    async def get(self, timeout):
+        """Wait up to timeout for events; return (events, dropped since last get)."""
+        if not self.events:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        events = list(self.events)
+        self.events.clear()
+        self.ready.clear()
+        dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+
+class EventBroker:
+    """Fans parsed serial events out to any number of subscribers.
+
+    The newest backlog_size events are kept, so a client that reconnects
+    with the last seq it saw (SSE Last-Event-ID) gets what it missed.
+    """
+
+    def __init__(self, queue_size=256, backlog_size=1024):
+        self.queue_size = queue_size
+        # Replaced, never mutated, so publish() can iterate without the lock.
+        self.subscribers = ()
+        self.backlog = deque(maxlen=backlog_size)
+        self.lock = threading.Lock()
+        self.next_seq = 1
+
+    def subscribe(self, loop=None, last_seq=None):
+        """Add a subscriber; with loop, one read from that asyncio loop.
+
+        With last_seq, the backlog events after it are queued first; any
+        that already fell out of the backlog are counted as dropped.
+        """
+        if loop is None:
+            sub = Subscription(self.queue_size)
+        else:
+            sub = AsyncSubscription(self.queue_size, loop)
+        with self.lock:
+            if last_seq is not None and last_seq < self.next_seq:
+                oldest = self.backlog[0]["seq"] if self.backlog else self.next_seq
+                sub.dropped += max(0, oldest - last_seq - 1)
+                for event in self.backlog:
+                    if event["seq"] > last_seq:
+                        sub.put(event)
+            self.subscribers = self.subscribers + (sub,)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers = tuple(s for s in self.subscribers if s is not sub)
+
+    def publish(self, event):
+        # Publishers run on several threads (reader, supervisor, sampler, API
+        # workers); numbering and delivering under one lock keeps seq unique
+        # and in delivery order, which Last-Event-ID resume relies on.
+        with self.lock:
+            event["seq"] = self.next_seq
+            event["time"] = time.time()
+            self.next_seq += 1
+            self.backlog.append(event)
+            for sub in self.subscribers:
+                sub.put(event)
+
+
+def reply_value(line):
+    """Extract the confirmed value from a firmware reply line."""
+    parts = line.split(",")
+    if len(parts) == 3:
+        try:
+            return int(parts[2])
+        except ValueError:
+            return parts[2]
+    if len(parts) == 2:
+        return parts[1]
+    return line
+
+
+def command_result(tracker, pending, timeout):
+    """Wait for pending's reply and describe the outcome as a result dict.
+
+    status is "Confirmed" (with reply and value), "Error" or "Timeout".
+    """
+    cmd = pending.command
+    try:
+        line = pending.future.result(timeout=max(0.0, timeout))
+    except FutureTimeoutError:
+        tracker.discard(pending)
+        return {"status": "Timeout", "command": cmd}
+    except FirmwareError as e:
+        return {"status": "Error", "command": cmd, "error": str(e)}
+    elapsed_ms = (pending.replied_at - pending.sent_at) * 1000
+    return {"status": "Confirmed", "command": cmd, "reply": line,
+            "value": reply_value(line), "elapsed_ms": round(elapsed_ms, 3)}
+
+
+def pipeline_commands(tracker, send, commands, timeout=2.0,
+                      window_bytes=FIRMWARE_RX_BUFFER, cost=None):
+    """Send commands back to back, keeping at most window_bytes unanswered.
+
+    The firmware answers in order, so once the window is full the oldest
+    command's reply (or its timeout) frees room for the next one. cost gives
+    the bytes a command takes on the wire (PanelEngine.wire_cost); text CSV
+    unless given. Returns one result dict per command, in order.
+    """
+    cost_of = cost or (lambda cmd: len(cmd) + 1)
+    in_flight = deque()  # (pending, bytes)
+    in_flight_bytes = 0
+    sent = []
+    for cmd in commands:
+        cost = cost_of(cmd)
+        while in_flight and in_flight_bytes + cost > window_bytes:
+            oldest, oldest_cost = in_flight.popleft()
+            done, _ = futures_wait(
+                [oldest.future],
+                timeout=max(0.0, oldest.sent_at + timeout - time.perf_counter()))
+            if not done:
+                # Stop waiting now, so it cannot take a later command's ERR,.
+                tracker.discard(oldest)
+            in_flight_bytes -= oldest_cost
+        pending = tracker.expect(cmd)
+        send(cmd)
+        if pending is None:
+            # No reply to wait for; it only occupies the link briefly.
+            sent.append((cmd, None))
+            continue
+        in_flight.append((pending, cost))
+        in_flight_bytes += cost
+        sent.append((cmd, pending))
+    results = []
+    for cmd, pending in sent:
+        if pending is None:
+            results.append({"status": "Command sent", "command": cmd})
+        else:
+            remaining = pending.sent_at + timeout - time.perf_counter()
+            results.append(command_result(tracker, pending, remaining))
+    return results
+
+
+class ParameterRecord:
+    """One parameter as last reported by the board; unknown fields are None."""
+
+    __slots__ = ("index", "min", "max", "current", "version")
+
+    FIELDS = ("index", "min", "max", "current")
+
+    def __init__(self, index=None, min=None, max=None, current=None):
+        self.index = index
+        self.min = min
+        self.max = max
+        self.current = current
+        self.version = 0  # store version of the last change to this record
+
+    def as_dict(self):
+        return {"index": self.index, "min": self.min,
+                "max": self.max, "current": self.current}
+
+
+class ParameterStore:
+    """Typed, versioned parameter store with cached JSON snapshots.
+
+    version increases on every change that actually alters a value, so
+    readers can skip work (and HTTP clients can get a 304) when nothing
+    changed. Serialized snapshots are rebuilt only when the version moves.
+    """
+
+    def __init__(self):
+        self.records = {}
+        self.version = 0
+        self.lock = threading.Lock()
+        self.cached_json = None
+        self.cached_version = -1
+
+    def update(self, name, **fields):
+        """Set the given fields of name, creating it if needed; returns True if anything changed."""
+        with self.lock:
+            record = self.records.get(name)
+            changed = record is None
+            if changed:
+                record = self.records[name] = ParameterRecord()
+            for field, value in fields.items():
+                if getattr(record, field) != value:
+                    setattr(record, field, value)
+                    changed = True
+            if changed:
+                self.version += 1
+                record.version = self.version
+            return changed
+
+    def reset(self, name):
+        """(Re)create name with every field unknown."""
+        with self.lock:
+            self.records[name] = ParameterRecord()
+            self.version += 1
+            self.records[name].version = self.version
+
+    def remove(self, name):
+        """Forget name; returns False if it was not in the store."""
+        with self.lock:
+            if self.records.pop(name, None) is None:
+                return False
+            self.version += 1
+            return True
+
+    def clear(self):
+        with self.lock:
+            if self.records:
+                self.records.clear()
+                self.version += 1
+
+    def snapshot(self):
+        """Return (version, {name: dict}) copied under the lock."""
+        with self.lock:
+            return self.version, {name: record.as_dict()
+                                  for name, record in self.records.items()}
+
+    def get(self, name):
+        """Return (record version, dict) for name, or None."""
+        with self.lock:
+            record = self.records.get(name)
+            if record is None:
+                return None
+            return record.version, record.as_dict()
+
+    def to_json(self):
+        """Return (version, serialized JSON of the whole store)."""
+        with self.lock:
+            if self.cached_version != self.version:
+                self.cached_json = json.dumps(
+                    {name: record.as_dict() for name, record in self.records.items()},
+                    separators=(",", ":"))
+                self.cached_version = self.version
+            return self.version, self.cached_json
+
+
+class PanelEngine:
+    """Serial link, protocol parser and parameter store for one control panel.
+
+    Front ends (the Tk GUI, the REST API) reach the board only through this
+    class. handle_line runs on the serial reader thread; everything else is
+    safe to call from any thread.
+    """
+
+    # Reading a parameter that cannot exist answers "G,~sync,ERROR". Sent after
+    # other commands, its reply shows the board has answered all of them.
+    SYNC_COMMAND = "get:paramCurval,~sync"
+    # Writes held while the link is down, replayed in order on reconnect.
+    MAX_HELD_WRITES = 256
+
+    def __init__(self, serial_port, baud_rate, reader_mode="event", low_latency=False,
+                 history=None, loop=None, binary_baud=None):
+        if binary_baud and reader_mode == "poll":
+            raise ValueError("binary framing needs the event or asyncio reader")
+        self.serial_port = serial_port
+        self.baud_rate = baud_rate
+        # Negotiate binary framing at this baud rate once the board answers.
+        self.binary_baud = binary_baud
+        self.reader_mode = reader_mode
+        # Event loop that runs the serial link when reader_mode is "asyncio".
+        self.loop = loop
+        self.low_latency = low_latency
+        self.ser = None
+        self.serial_reader = None
+        self.update_throttler = None
+        self.pin_sampler = None
+        self.supervisor = None
+        self.write_lock = threading.Lock()
+        self.link_up = False
+        # While set, write() holds commands in self.held instead of sending them.
+        self.holding = False
+        self.held = deque()
+        # L, lines collected by an ongoing sweep_board(), in order. The lock
+        # lets one sweep run at a time, since the listings carry no tag.
+        self.sweep = None
+        self.sweep_lock = threading.Lock()
+        # Name in the board's latest A, reply; the slot after it is overwritten next.
+        self.last_added = None
+        # time.monotonic() of the oldest command sent since the board last spoke.
+        self.unanswered_since = None
+        # binaryFraming.BinaryCodec while the link uses binary frames, else None.
+        self.codec = None
+        # Splits received bytes into lines; a FrameDecoder in binary mode.
+        self.decoder = LineSplitter()
+        self.link_baud = baud_rate
+        # The framing change a set:binary/set:text in flight asked for.
+        self.framing_request = None
+
+        self.parameters = ParameterStore()
+        self.software_name = "Unknown"
+        # Replies still expected to set:software commands, oldest first.
+        self.software_echoes = deque(maxlen=8)
+
+        self.log_store = LogStore()
+        self.command_tracker = CommandTracker()
+        self.event_broker = EventBroker()
+        self.metrics = EngineMetrics()
+        self.message_handlers = {
+            ParameterAdded: self.on_parameter_added,
+            ParameterValue: self.on_parameter_value,
+            ParameterNotFound: self.on_parameter_not_found,
+            ParameterSelected: self.on_parameter_selected,
+            ParameterListed: self.on_parameter_listed,
+            PinReading: self.on_pin_reading,
+            SoftwareSet: self.on_software_set,
+            BoardError: self.on_board_error,
+            FramingChanged: self.on_framing_changed,
+            Unrecognized: self.on_unrecognized,
+        }
+        # Optional historyStore.HistoryStore that records values and readings.
+        self.history = history
+        # Optional sessionCapture.SessionCapture that records every line in and out.
+        self.capture = None
+
+    def start(self, ready_timeout=5.0, retry=False):
+        """Open the port, start the reader and wait for the board to answer.
+
+        Raises serial.SerialException if the port cannot be opened, unless
+        retry is set, in which case the supervisor keeps trying in the
+        background. Returns the seconds the board took to answer, or None if
+        it stayed silent (or the port is not open yet).
+        """
+        try:
+            self.open_link()
+        except serial.SerialException as e:
+            if not retry:
+                raise
+            self.log(f"Could not open {self.serial_port}: {e}; retrying")
+            ready = None
+            self.link_failed(e)
+        else:
+            ready = self.wait_until_ready(ready_timeout)
+            if ready is None and self.binary_baud and self.leave_binary():
+                # The board kept binary framing from an earlier session.
+                ready = self.wait_until_ready(ready_timeout)
+            if ready is None:
+                self.log(f"No reply from the board after {ready_timeout:g} s")
+            else:
+                self.log(f"Board ready after {ready * 1000:.0f} ms")
+            if ready is not None and self.binary_baud:
+                with self.write_lock:
+                    self.holding = True
+                if self.negotiate_binary():
+                    self.resync()  # teaches the codec the parameter slots
+                self.replay_held()
+
+        self.start_workers()
+        # Reopens the port if it fails, and replays what was held meanwhile.
+        self.supervisor = LinkSupervisor(self)
+        if not self.link_up:
+            self.supervisor.lost.set()
+        self.supervisor.start()
+        return ready
+
+    def start_workers(self):
+        """Start the threads that pace writes to the board."""
+        # Paces API parameter updates to what the link can carry.
+        self.update_throttler = UpdateThrottler(self.send_command, self.link_baud,
+                                                cost=self.wire_cost, log=self.log)
+        self.update_throttler.start()
+        # Continuous pin acquisition for clients that register pins.
+        self.pin_sampler = PinSampler(self)
+        self.pin_sampler.start()
+
+    def open_link(self):
+        """Open the port and start its reader; raises serial.SerialException."""
+        self.ser = serial.Serial(self.serial_port, self.baud_rate, timeout=1)
+        # A freshly opened port speaks text; the board resets when it is opened.
+        self.set_framing(None, self.baud_rate)
+
+        # Ask the driver to deliver bytes immediately instead of batching them
+        # (e.g. the 16 ms FTDI latency timer). Only supported on Linux.
+        if self.low_latency:
+            try:
+                self.ser.set_low_latency_mode(True)
+            except (AttributeError, NotImplementedError, IOError, ValueError) as e:
+                self.log(f"Low-latency mode not available: {e}")
+
+        if self.reader_mode == "asyncio":
+            self.serial_reader = AsyncSerialLink(self.ser, self, self.loop)
+        else:
+            self.serial_reader = SerialReader(self.ser, self, mode=self.reader_mode)
+        self.serial_reader.start()
+        self.unanswered_since = None
+        self.link_up = True
+
+    def close_link(self):
+        """Stop the reader and close the port, ignoring a port that is already gone."""
+        self.link_up = False
+        reader = self.serial_reader
+        if reader is not None:
+            reader.stop()
+            # Closing the port under a thread still inside read() makes
+            # pyserial fail with a TypeError instead of a SerialException.
+            if isinstance(reader, threading.Thread) and reader is not threading.current_thread():
+                reader.join(timeout=2.0)
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except (serial.SerialException, OSError):
+                pass
+
+    def link_failed(self, error):
+        """Report a dead port: hold writes from now on and wake the supervisor.
+
+        Commands already sent get no reply, so their waiters fail at once.
+        """
+        with self.write_lock:
+            was_up, self.link_up, self.holding = self.link_up, False, True
+        if not was_up:
+            return
+        self.log(f"Serial link lost: {error}")
+        self.command_tracker.fail_all(LinkDown(f"Serial link lost: {error}"))
+        if self.supervisor is not None:
+            self.supervisor.lost.set()
+
+    def hold_unsent(self, commands):
+        """Hold commands the asyncio writer took but never sent, ahead of later writes."""
+        if not commands:
+            return
+        with self.write_lock:
+            self.holding = True
+            kept = commands[:max(0, self.MAX_HELD_WRITES - len(self.held))]
+            self.held.extendleft(reversed(kept))
+        if len(kept) < len(commands):
+            self.log(f"Dropped {len(commands) - len(kept)} unsent commands; "
+                     f"{self.MAX_HELD_WRITES} are already held")
+
+    def stalled(self, timeout):
+        """True if the board has sent nothing for timeout seconds since a command went out."""
+        since = self.unanswered_since
+        return self.link_up and since is not None and time.monotonic() - since >= timeout
+
+    def sync(self, timeout):
+        """Wait until the board has answered everything sent so far; returns success.
+
+        The marker's reply cannot be mistaken for the ERR, answer to a command
+        held during an outage.
+        """
+        pending = self.command_tracker.expect(self.SYNC_COMMAND, quiet=True, errors=False)
+        try:
+            self.transmit(self.SYNC_COMMAND)
+            pending.future.result(timeout=timeout)
+        except FirmwareError:
+            return True
+        except FutureTimeoutError:
+            self.command_tracker.discard(pending)
+        except (serial.SerialException, OSError):
+            self.command_tracker.discard(pending)
+        return False
+
+    def reach_board(self, timeout):
+        """sync(), first asking a board left in binary framing to return to text."""
+        if self.sync(timeout):
+            return True
+        return bool(self.binary_baud) and self.leave_binary(timeout) and self.sync(timeout)
+
+    def negotiate_binary(self, timeout=2.0):
+        """Switch both ends to binary framing at binary_baud; returns success.
+
+        Call with writes held: nothing else may go out while the baud rate
+        changes. Old firmware answers ERR, and the link stays text.
+        """
+        cmd = f"set:binary,{self.binary_baud}"
+        pending = self.command_tracker.expect(cmd, matches=lambda line: line.startswith("B,"))
+        self.framing_request = "binary"
+        try:
+            self.transmit(cmd)
+            pending.future.result(timeout=timeout)
+        except FirmwareError as e:
+            self.log(f"Board does not support binary framing: {e}")
+            return False
+        except FutureTimeoutError:
+            self.command_tracker.discard(pending)
+            self.log("No reply to set:binary; staying with text framing")
+            return False
+        finally:
+            self.framing_request = None
+        return self.sync(timeout)
+
+    def leave_binary(self, timeout=1.0):
+        """Ask a board still using binary framing to go back to text; returns success."""
+        self.set_framing(BinaryCodec(self.metrics.frame_errors), self.binary_baud)
+        pending = self.command_tracker.expect("set:text", matches=lambda line: line == "T")
+        self.framing_request = "text"
+        try:
+            self.transmit("set:text")
+            pending.future.result(timeout=timeout)
+            return True
+        except (FirmwareError, FutureTimeoutError):
+            self.command_tracker.discard(pending)
+            self.set_framing(None, self.baud_rate)
+            return False
+        except (serial.SerialException, OSError):
+            self.command_tracker.discard(pending)
+            return False
+        finally:
+            self.framing_request = None
+
+    def set_framing(self, codec, baud):
+        """Switch the host end of the link; runs on the reader for negotiated changes."""
+        self.codec = codec
+        self.decoder = codec.decoder if codec is not None else LineSplitter()
+        if baud != self.link_baud:
+            self.ser.baudrate = baud
+            self.link_baud = baud
+            for worker in (self.update_throttler, self.pin_sampler):
+                if worker is not None:
+                    worker.bucket.set_baud(baud)
+
+    def wire_cost(self, cmd):
+        """Bytes cmd takes on the wire with the current framing."""
+        codec = self.codec
+        return len(codec.frame(cmd)) if codec is not None else len(cmd) + 1
+
+    def resync(self, timeout=2.0):
+        """Rebuild the store from one get:AlladdedParams sweep.
+
+        Returns the changed names (see apply_sweep), or None if the sweep did
+        not finish.
+        """
+        listed = self.sweep_board(timeout)
+        if listed is None:
+            self.log("Parameter resync did not finish")
+            return None
+        return self.apply_sweep(listed)
+
+    def sweep_board(self, timeout=2.0):
+        """List the board's store; returns its ParameterListed messages in slot order.
+
+        Nothing is applied or published. Returns None if the sweep did not
+        finish. Concurrent callers take turns.
+        """
+        with self.sweep_lock:
+            self.sweep = []
+            try:
+                self.transmit("get:AlladdedParams")
+            except (serial.SerialException, OSError) as e:
+                self.sweep = None
+                self.link_failed(e)
+                return None
+            finished = self.sync(timeout)
+            listed, self.sweep = self.sweep, None
+            return listed if finished else None
+
+    def apply_sweep(self, listed):
+        """Diff a sweep against the cached store and publish what changed.
+
+        Parameters the board no longer has are removed. Returns the changed
+        names.
+        """
+        listed = {message.name: message for message in listed}
+        changed = []
+        for message in listed.values():
+            if self.parameters.update(message.name, index=message.index, min=message.min,
+                                      max=message.max, current=message.value):
+                changed.append(message.name)
+                self.publish_event(message.event())
+        for name in set(self.snapshot_parameters()) - set(listed):
+            if self.parameters.remove(name):
+                changed.append(name)
+                self.publish_event({"type": "parameter", "source": "resync",
+                                    "name": name, "removed": True})
+        self.log(f"Resynchronized {len(listed)} parameters, {len(changed)} changed")
+        return changed
+
+    def replay_held(self, utilization=0.5):
+        """Send the writes held during the outage, in order and paced.
+
+        New writes keep queueing behind them until the queue is empty.
+        Returns False if the link failed again first.
+        """
+        bucket = TokenBucket(self.link_baud, utilization)
+        replayed = 0
+        while True:
+            with self.write_lock:
+                if not self.held:
+                    self.holding = False
+                    break
+                cmd = self.held.popleft()
+            bucket.wait(len(cmd) + 1)
+            try:
+                self.transmit(cmd, hold=True)
+            except (serial.SerialException, OSError) as e:
+                with self.write_lock:
+                    self.held.appendleft(cmd)
+                self.link_failed(e)
+                return False
+            bucket.spend(len(cmd) + 1)
+            replayed += 1
+        if replayed:
+            self.log(f"Replayed {replayed} commands held during the outage")
+        return True
+
+    def wait_until_ready(self, timeout, interval=0.1):
+        """Probe the board until it answers, instead of sleeping through its reset.
+
+        Each probe reads a different impossible parameter, so only the reply
+        to the latest one counts. Probes sent while the board was still
+        booting, and the ERR, lines they may cause, are answered before it,
+        and none of them can be taken for the reply to a later command.
+        """
+        start = time.perf_counter()
+        attempt = 0
+        while time.perf_counter() - start < timeout:
+            attempt += 1
+            probe = f"{self.SYNC_COMMAND}{attempt}"
+            pending = self.command_tracker.expect(probe, quiet=True, errors=False)
+            self.write(probe)
+            try:
+                pending.future.result(timeout=interval)
+            except FutureTimeoutError:
+                self.command_tracker.discard(pending)
+                continue
+            except FirmwareError:
+                pass
+            return time.perf_counter() - start
+        return None
+
+    def stop(self):
+        if self.supervisor is not None:
+            self.supervisor.stop()
+        if self.pin_sampler is not None:
+            self.pin_sampler.stop()
+        if self.update_throttler is not None:
+            self.update_throttler.stop()
+        self.close_link()
+        if self.history is not None:
+            self.history.flush()
+        if self.capture is not None:
+            self.capture.close()
+
+    def write(self, cmd, hold=True):
+        """Send cmd, or hold it for replay while the link is down.
+
+        Raises LinkDown if the link is down and hold is False or the held
+        queue is full.
+        """
+        with self.write_lock:
+            if self.holding:
+                if not hold or len(self.held) >= self.MAX_HELD_WRITES:
+                    raise LinkDown(f"Serial link to {self.serial_port} is down")
+                self.held.append(cmd)
+                return
+        try:
+            self.transmit(cmd, hold=hold)
+        except (serial.SerialException, OSError) as e:
+            self.link_failed(e)
+            with self.write_lock:
+                if hold and len(self.held) < self.MAX_HELD_WRITES:
+                    self.held.append(cmd)
+                    return
+            raise
+
+    def transmit(self, cmd, hold=False):
+        """Put cmd on the wire now, whether or not writes are being held.
+
+        In asyncio mode the write completes later on the loop; with hold, a
+        cmd the writer cannot send is held for replay instead of being lost.
+        """
+        with self.write_lock:
+            codec = self.codec
+            data = codec.encode(cmd) if codec is not None else (cmd + "\n").encode("utf-8")
+            if self.reader_mode == "asyncio":
+                self.serial_reader.write(data, cmd if hold else None)
+            else:
+                self.ser.write(data)
+            if self.capture is not None:
+                self.capture.record("o", cmd)
+            if cmd.startswith("set:software,"):
+                self.software_echoes.append(cmd.partition(",")[2].strip()[:31])
+            # Every command but the listing of an empty store gets an answer.
+            if self.unanswered_since is None and cmd != "get:AlladdedParams":
+                self.unanswered_since = time.monotonic()
+        self.metrics.bytes_out.inc(len(data))
+        self.metrics.lines_out.inc()
+
+    def send_command(self, cmd):
+        """Log and send one command line to the board."""
+        self.log(cmd, direction="out")
+        try:
+            self.write(cmd)
+        except Exception as e:
+            self.log("Error sending command: " + str(e))
+
+    def log(self, msg, direction="info"):
+        self.log_store.append(direction, msg)
+
+    def handle_line(self, line):
+        """Apply one received line to the store, then notify waiters and subscribers."""
+        start = time.perf_counter()
+        if self.capture is not None:
+            self.capture.record("i", line)
+        self.unanswered_since = None
+        message = parse_line(line)
+        if self.software_echoes and line == self.software_echoes[0]:
+            # The firmware echoes the bare name, which may look like any message.
+            message = SoftwareSet(line)
+            self.software_echoes.popleft()
+        pending = self.command_tracker.claim(line)
+        quiet = pending is not None and pending.quiet
+        if not quiet:
+            self.log(line, direction="in")
+        if self.sweep is not None and isinstance(message, ParameterListed):
+            # Collected for sweep_board(); resync() publishes only what changed.
+            self.sweep.append(message)
+            event = None
+        else:
+            if not quiet:
+                self.apply_message(message)
+            event = message.event()
+        if pending is not None:
+            self.command_tracker.complete(pending, line)
+        self.publish_event(event)
+        self.metrics.observe_line(line, time.perf_counter() - start,
+                                  recognized=not isinstance(message, Unrecognized))
+
+    def publish_event(self, event):
+        """Record event in the history and hand it to subscribers; None is ignored."""
+        if event is None:
+            return
+        if self.history is not None:
+            self.history.record(event)
+        self.event_broker.publish(event)
+
+    def apply_line(self, line):
+        """Parse a CSV message from Arduino and update the parameter store."""
+        self.apply_message(parse_line(line))
+
+    def apply_message(self, message):
+        """Update the parameter store from one parsed message."""
+        self.message_handlers[type(message)](message)
+
+    def on_parameter_added(self, message):
+        self.last_added = message.name
+        self.parameters.reset(message.name)
+        self.log(f"Parameter added: {message.name}")
+
+    def on_parameter_value(self, message):
+        self.parameters.update(message.name, current=message.value)
+        if message.source == "U":
+            self.log(f"Parameter {message.name} updated to {message.value}")
+        else:
+            self.log(f"Parameter {message.name} current value: {message.value}")
+
+    def on_parameter_not_found(self, message):
+        self.log(f"Parameter {message.name} not found on the board")
+
+    def on_parameter_selected(self, message):
+        self.parameters.update(message.name, index=message.index, current=message.value)
+        self.log(f"Switched to parameter {message.name} (index {message.index})")
+
+    def on_parameter_listed(self, message):
+        self.parameters.update(message.name, index=message.index, min=message.min,
+                               max=message.max, current=message.value)
+        self.log(f"List: {message.name} -> min:{message.min}, max:{message.max}, "
+                 f"current:{message.value}")
+
+    def on_software_set(self, message):
+        self.software_name = message.name
+        self.log(f"Software name updated to: {self.software_name}")
+
+    def on_board_error(self, message):
+        self.log("Board error: " + message.message)
+
+    def on_framing_changed(self, message):
+        if message.framing != self.framing_request:
+            self.log(f"Ignored unrequested framing change to {message.framing}")
+            return
+        if message.framing == "binary":
+            self.set_framing(BinaryCodec(self.metrics.frame_errors), message.baud)
+            self.log(f"Binary framing at {message.baud} baud")
+        else:
+            self.set_framing(None, self.baud_rate)
+            self.log(f"Text framing at {self.baud_rate} baud")
+
+    def on_unrecognized(self, message):
+        self.log("Unrecognized message: " + message.line)
+
+    def on_pin_reading(self, message):
+        # Pin readings only reach front ends (and the history) as events.
+        pass
+
+    def snapshot_parameters(self):
+        """Return a copy of the parameter store that is safe to iterate."""
+        return self.parameters.snapshot()[1]
+
+    def clear_parameters(self):
+        self.parameters.clear()
+        self.log("Parameter list cleared.")
+
+
+class DeviceRegistry:
+    """The engines served by this process, keyed by device id.
+
+    The first device added is the default one, used by un-prefixed API
+    routes. Groups name sets of devices for fan-out operations.
+    """
+
+    def __init__(self):
+        self.engines = {}
+        self.groups = {}
+        self.errors = {}  # device id -> error from the last start attempt
+
+    def add(self, device_id, engine):
+        if device_id in self.engines:
+            raise ValueError(f"Duplicate device id: {device_id}")
+        self.engines[device_id] = engine
+
+    def get(self, device_id=None):
+        """Return the engine for device_id (default device if None), or None."""
+        if device_id is None:
+            return next(iter(self.engines.values()), None)
+        return self.engines.get(device_id)
+
+    def add_group(self, name, device_ids):
+        unknown = [d for d in device_ids if d not in self.engines]
+        if unknown:
+            raise ValueError(f"Group {name} names unknown devices: {', '.join(unknown)}")
+        self.groups[name] = list(device_ids)
+
+    def resolve(self, device_ids=None, group=None):
+        """Expand an explicit id list or a group name (default: every device)."""
+        if group is not None:
+            if group not in self.groups:
+                raise KeyError(f"Unknown group: {group}")
+            return list(self.groups[group])
+        if device_ids is None:
+            return list(self.engines)
+        unknown = [d for d in device_ids if d not in self.engines]
+        if unknown:
+            raise KeyError(f"Unknown devices: {', '.join(unknown)}")
+        return list(device_ids)
+
+    def start_all(self, device_ids=None, retry=False):
+        """Start engines (default: all) in parallel; returns {device id: error} for failures.
+
+        With retry, ports that cannot be opened yet are retried in the background.
+        """
+        def start(item):
+            device_id, engine = item
+            try:
+                engine.start(retry=retry)
+            except Exception as e:
+                return device_id, e
+            return device_id, None
+
+        if device_ids is None:
+            device_ids = list(self.engines)
+        with ThreadPoolExecutor(max_workers=max(1, len(device_ids))) as pool:
+            outcomes = list(pool.map(
+                start, [(d, self.engines[d]) for d in device_ids]))
+        errors = {device_id: e for device_id, e in outcomes if e is not None}
+        self.errors.update(errors)
+        return errors
+
+    def stop_all(self):
+        for engine in self.engines.values():
+            engine.stop()
+
+    def describe(self):
+        devices = {}
+        for device_id, engine in self.engines.items():
+            error = self.errors.get(device_id)
+            devices[device_id] = {
+                "port": engine.serial_port,
+                "baud_rate": engine.baud_rate,
+                "connected": engine.link_up,
+                "error": str(error) if error else None,
+            }
+        return {"devices": devices, "groups": self.groups}
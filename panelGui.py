@@ -0,0 +1,443 @@
+"""Tkinter desktop front end for the Arduino control panel.
+
+Only imported when the GUI is requested, so headless installs do not need
+tkinter or a display.
+"""
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk, scrolledtext, messagebox
+
+from panelEngine import LinkDown, LogStore
+from panelProfiles import apply_profile, snapshot_board
+
+
+class ArduinoGUI(tk.Tk):
+    # The log widget only shows the newest LOG_VIEW_LINES lines; the full
+    # (bounded) history lives in the engine's log store.
+    LOG_VIEW_LINES = 500
+
+    # Engine events are drained here once per frame, so Tk is only ever
+    # touched from the main loop, and any number of updates between two
+    # frames costs a single tree sync.
+    FRAME_INTERVAL_MS = 16
+
+    def __init__(self, engine, profiles=None):
+        super().__init__()
+        self.title("Arduino Parameter Control GUI")
+        self.geometry("900x700")
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+        self.engine = engine
+        self.profiles = profiles  # panelProfiles.ProfileStore, or None
+        self.subscription = engine.event_broker.subscribe()
+        engine.metrics.ui_backlog = lambda: len(self.subscription.events)
+        self.log_view_seq = 0
+        self.log_view_lines = 0
+
+        # Create UI elements.
+        self.create_widgets()
+        self.after(self.FRAME_INTERVAL_MS, self.refresh)
+
+    def connect(self):
+        """Start the engine; on failure report it and close the window.
+
+        A port that cannot be opened yet is retried in the background.
+        """
+        try:
+            self.engine.start(retry=True)
+        except Exception as e:
+            messagebox.showerror("Serial Connection Error",
+                                 f"Could not open {self.engine.serial_port}: {e}")
+            self.on_closing()
+            return False
+        return True
+
+    def create_widgets(self):
+        # Top frame: Connection Status
+        top_frame = ttk.Frame(self, padding=10)
+        top_frame.pack(fill=tk.X)
+        self.connection_label = ttk.Label(
+            top_frame, text=f"Connected to {self.engine.serial_port} at {self.engine.baud_rate}")
+        self.connection_label.pack(side=tk.LEFT)
+
+        # Dedicated bar for reading pins.
+        read_pin_frame = ttk.Frame(self, padding=(10, 5))
+        read_pin_frame.pack(fill=tk.X)
+        ttk.Label(read_pin_frame, text="Pin Type:").grid(
+            row=0, column=0, padx=5, pady=5, sticky=tk.W)
+        self.pin_type = tk.StringVar(value="Digital")
+        digital_rb = ttk.Radiobutton(
+            read_pin_frame, text="Digital", variable=self.pin_type, value="Digital", command=self.update_pin_options)
+        analog_rb = ttk.Radiobutton(
+            read_pin_frame, text="Analog", variable=self.pin_type, value="Analog", command=self.update_pin_options)
+        digital_rb.grid(row=0, column=1, padx=5, pady=5)
+        analog_rb.grid(row=0, column=2, padx=5, pady=5)
+
+        ttk.Label(read_pin_frame, text="Select Pin:").grid(
+            row=0, column=3, padx=5, pady=5, sticky=tk.W)
+        self.pin_select = ttk.Combobox(read_pin_frame, state="readonly")
+        self.pin_select.grid(row=0, column=4, padx=5, pady=5)
+        self.update_pin_options()  # Populate with default (Digital) options
+
+        read_btn = ttk.Button(
+            read_pin_frame, text="Read Pin", command=self.read_pin)
+        read_btn.grid(row=0, column=5, padx=5, pady=5)
+
+        ttk.Label(read_pin_frame, text="Reading Result:").grid(
+            row=0, column=6, padx=5, pady=5, sticky=tk.W)
+        self.pin_result_label = ttk.Label(read_pin_frame, text="N/A")
+        self.pin_result_label.grid(row=0, column=7, padx=5, pady=5)
+
+        # Main PanedWindow: Left for parameters, right for tabs.
+        main_pane = ttk.Panedwindow(self, orient=tk.HORIZONTAL)
+        main_pane.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        # Left Frame: Parameter List inside a labeled frame.
+        left_frame = ttk.Labelframe(
+            main_pane, text="Parameters", padding=10, width=300)
+        left_frame.pack_propagate(False)
+        self.tree = ttk.Treeview(left_frame, columns=(
+            "Index", "Name", "Min", "Max", "Current"), show="headings")
+        for col, width in zip(("Index", "Name", "Min", "Max", "Current"), (50, 100, 60, 60, 60)):
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width, anchor=tk.CENTER)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        # Parameter name -> (tree item id, row values) for incremental updates.
+        self.tree_items = {}
+        self.tree_height = None
+        self.tree_version = None
+        clear_params_btn = ttk.Button(
+            left_frame, text="Clear Parameter List", command=self.clear_parameters)
+        clear_params_btn.pack(pady=5)
+        main_pane.add(left_frame, weight=1)
+
+        # Right Frame: Notebook for various tabs.
+        right_frame = ttk.Frame(main_pane, padding=10)
+        main_pane.add(right_frame, weight=3)
+
+        self.notebook = ttk.Notebook(right_frame)
+        self.notebook.pack(fill=tk.BOTH, expand=True)
+
+        # Tab 1: Add Parameter
+        add_tab = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(add_tab, text="Add Parameter")
+        ttk.Label(add_tab, text="Name:").grid(
+            row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        self.add_name = ttk.Entry(add_tab)
+        self.add_name.grid(row=0, column=1, padx=5, pady=5)
+        ttk.Label(add_tab, text="Min:").grid(
+            row=1, column=0, sticky=tk.W, padx=5, pady=5)
+        self.add_min = ttk.Entry(add_tab)
+        self.add_min.grid(row=1, column=1, padx=5, pady=5)
+        ttk.Label(add_tab, text="Max:").grid(
+            row=2, column=0, sticky=tk.W, padx=5, pady=5)
+        self.add_max = ttk.Entry(add_tab)
+        self.add_max.grid(row=2, column=1, padx=5, pady=5)
+        ttk.Label(add_tab, text="Current:").grid(
+            row=3, column=0, sticky=tk.W, padx=5, pady=5)
+        self.add_current = ttk.Entry(add_tab)
+        self.add_current.grid(row=3, column=1, padx=5, pady=5)
+        add_btn = ttk.Button(add_tab, text="Add Parameter",
+                             command=self.add_parameter)
+        add_btn.grid(row=4, column=0, columnspan=2, pady=10)
+
+        # Tab 2: Update Parameter
+        update_tab = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(update_tab, text="Update Parameter")
+        ttk.Label(update_tab, text="Name:").grid(
+            row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        self.update_name = ttk.Entry(update_tab)
+        self.update_name.grid(row=0, column=1, padx=5, pady=5)
+        ttk.Label(update_tab, text="New Value:").grid(
+            row=1, column=0, sticky=tk.W, padx=5, pady=5)
+        self.update_value = ttk.Entry(update_tab)
+        self.update_value.grid(row=1, column=1, padx=5, pady=5)
+        update_btn = ttk.Button(
+            update_tab, text="Update Value", command=self.update_parameter)
+        update_btn.grid(row=2, column=0, columnspan=2, pady=10)
+
+        # Tab 3: Get Parameter
+        get_tab = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(get_tab, text="Get Parameter")
+        ttk.Label(get_tab, text="Name:").grid(
+            row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        self.get_name = ttk.Entry(get_tab)
+        self.get_name.grid(row=0, column=1, padx=5, pady=5)
+        get_btn = ttk.Button(
+            get_tab, text="Get Current Value", command=self.get_parameter)
+        get_btn.grid(row=1, column=0, columnspan=2, pady=10)
+
+        # Tab 4: Manual Command
+        manual_tab = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(manual_tab, text="Manual Command")
+        ttk.Label(manual_tab, text="Command:").grid(
+            row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        self.manual_cmd = ttk.Entry(manual_tab, width=40)
+        self.manual_cmd.grid(row=0, column=1, padx=5, pady=5)
+        manual_btn = ttk.Button(manual_tab, text="Send",
+                                command=self.send_manual_command)
+        manual_btn.grid(row=1, column=0, columnspan=2, pady=10)
+        refresh_btn = ttk.Button(
+            manual_tab, text="Refresh Parameter List", command=self.refresh_parameters)
+        refresh_btn.grid(row=2, column=0, columnspan=2, pady=10)
+
+        # Tab 5: Software Settings
+        software_tab = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(software_tab, text="Software")
+        ttk.Label(software_tab, text="Software Name:").grid(
+            row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        self.software_entry = ttk.Entry(software_tab)
+        self.software_entry.grid(row=0, column=1, padx=5, pady=5)
+        set_software_btn = ttk.Button(
+            software_tab, text="Set Software", command=self.set_software)
+        set_software_btn.grid(row=1, column=0, columnspan=2, pady=10)
+        ttk.Label(software_tab, text="Current Software Name:").grid(
+            row=2, column=0, sticky=tk.W, padx=5, pady=5)
+        self.current_software_label = ttk.Label(
+            software_tab, text=self.engine.software_name)
+        self.current_software_label.grid(row=2, column=1, padx=5, pady=5)
+
+        # Tab 6: Parameter Profiles
+        if self.profiles is not None:
+            profiles_tab = ttk.Frame(self.notebook, padding=10)
+            self.notebook.add(profiles_tab, text="Profiles")
+            ttk.Label(profiles_tab, text="Profile:").grid(
+                row=0, column=0, sticky=tk.W, padx=5, pady=5)
+            self.profile_name = ttk.Combobox(
+                profiles_tab, postcommand=self.update_profile_options)
+            self.profile_name.grid(row=0, column=1, columnspan=2, padx=5, pady=5)
+            ttk.Button(profiles_tab, text="Save Current", command=self.save_profile).grid(
+                row=1, column=0, padx=5, pady=10)
+            ttk.Button(profiles_tab, text="Apply", command=self.apply_profile).grid(
+                row=1, column=1, padx=5, pady=10)
+            ttk.Button(profiles_tab, text="Delete", command=self.delete_profile).grid(
+                row=1, column=2, padx=5, pady=10)
+
+        # Bottom Frame: Log Window in a labeled frame.
+        log_frame = ttk.Labelframe(self, text="Log", padding=10)
+        log_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.log_text = scrolledtext.ScrolledText(
+            log_frame, wrap=tk.WORD, height=10)
+        self.log_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        clear_log_btn = ttk.Button(
+            log_frame, text="Clear Log", command=self.clear_log)
+        clear_log_btn.pack(pady=5)
+
+    def update_pin_options(self):
+        """Update the combobox values based on selected pin type."""
+        if self.pin_type.get() == "Digital":
+            # For Arduino Uno, digital pins (excluding 0 and 1 used for Serial) can be 2-13.
+            self.pin_select['values'] = [str(i) for i in range(2, 14)]
+            self.pin_select.current(0)
+        else:
+            # For analog, show A0-A5.
+            self.pin_select['values'] = [f"A{i}" for i in range(6)]
+            self.pin_select.current(0)
+
+    def read_pin(self):
+        pin_type = self.pin_type.get()
+        pin_value = self.pin_select.get().strip()
+        if pin_type == "Digital":
+            # Send command: read:digital,<pin>
+            cmd = f"read:digital,{pin_value}"
+        else:
+            # For analog, convert "A0" -> index 0, etc.
+            try:
+                index = int(pin_value[1:])
+            except Exception as e:
+                self.log_message("Invalid analog pin selection.")
+                return
+            cmd = f"read:analog,{index}"
+        self.send_command(cmd)
+
+    def add_parameter(self):
+        name = self.add_name.get().strip()
+        min_val = self.add_min.get().strip()
+        max_val = self.add_max.get().strip()
+        cur_val = self.add_current.get().strip()
+        if not name or not min_val or not max_val or not cur_val:
+            self.log_message("All fields are required for adding a parameter.")
+            return
+        cmd = f"add:param,{name},{min_val},{max_val},{cur_val}"
+        self.send_command(cmd)
+
+    def update_parameter(self):
+        name = self.update_name.get().strip()
+        new_val = self.update_value.get().strip()
+        if not name or not new_val:
+            self.log_message("Name and new value are required for update.")
+            return
+        cmd = f"update:paramsCurval,{name},{new_val}"
+        self.send_command(cmd)
+
+    def get_parameter(self):
+        name = self.get_name.get().strip()
+        if not name:
+            self.log_message("Please enter a parameter name.")
+            return
+        cmd = f"get:paramCurval,{name}"
+        self.send_command(cmd)
+
+    def send_manual_command(self):
+        cmd = self.manual_cmd.get().strip()
+        if not cmd:
+            self.log_message("Please enter a command.")
+            return
+        self.send_command(cmd)
+
+    def refresh_parameters(self):
+        self.send_command("get:AlladdedParams")
+
+    def set_software(self):
+        name = self.software_entry.get().strip()
+        if not name:
+            self.log_message("Please enter a software name.")
+            return
+        cmd = f"set:software,{name}"
+        self.send_command(cmd)
+
+    def send_command(self, cmd):
+        self.engine.send_command(cmd)
+
+    def refresh(self):
+        """Apply engine events, sync the tree and log view, then reschedule."""
+        events, dropped = self.subscription.get(timeout=0)
+        if dropped:
+            self.engine.metrics.ui_dropped.inc(dropped)
+        for event in events:
+            if event["type"] == "pin" and event["kind"] == "digital":
+                self.pin_result_label.config(
+                    text=f"Digital Pin {event['pin']}: {event['value']}")
+            elif event["type"] == "pin":
+                self.pin_result_label.config(
+                    text=f"Analog Pin A{event['index']}: {event['value']}")
+            elif event["type"] == "software":
+                self.current_software_label.config(text=event["name"])
+            elif event["type"] == "link":
+                self.update_connection_label(event["state"])
+        if events or dropped:
+            self.update_parameter_list()
+        self.update_log_view()
+        self.after(self.FRAME_INTERVAL_MS, self.refresh)
+
+    def update_connection_label(self, state):
+        if state == "connected":
+            text = f"Connected to {self.engine.serial_port} at {self.engine.baud_rate}"
+        else:
+            text = f"{self.engine.serial_port}: {state}..."
+        self.connection_label.config(text=text)
+
+    def process_serial_line(self, line):
+        """Feed one line through the engine and repaint the tree immediately."""
+        self.engine.handle_line(line)
+        self.update_parameter_list()
+
+    def update_parameter_list(self):
+        """Sync the Treeview with the parameter store, touching only changed rows."""
+        if self.engine.parameters.version == self.tree_version:
+            return
+        start = time.perf_counter()
+        self.tree_version, parameters = self.engine.parameters.snapshot()
+        items = self.tree_items
+        for name in [n for n in items if n not in parameters]:
+            self.tree.delete(items.pop(name)[0])
+        for name, info in parameters.items():
+            idx = info.get("index") if info.get("index") is not None else "-"
+            min_val = info.get("min") if info.get("min") is not None else "-"
+            max_val = info.get("max") if info.get("max") is not None else "-"
+            curr = info.get("current") if info.get(
+                "current") is not None else "-"
+            values = (idx, name, min_val, max_val, curr)
+            entry = items.get(name)
+            if entry is None:
+                items[name] = (self.tree.insert("", tk.END, values=values), values)
+            elif entry[1] != values:
+                self.tree.item(entry[0], values=values)
+                items[name] = (entry[0], values)
+        # Update Treeview height so that every row is visible.
+        num_rows = len(items) if items else 1
+        if num_rows != self.tree_height:
+            self.tree["height"] = num_rows
+            self.tree_height = num_rows
+        self.engine.metrics.ui_update_seconds.observe(time.perf_counter() - start)
+
+    def clear_parameters(self):
+        self.engine.clear_parameters()
+        self.update_parameter_list()
+
+    def update_profile_options(self):
+        self.profile_name["values"] = self.profiles.names()
+
+    def run_profile_task(self, task, name):
+        """Run a profile action off the Tk thread; it reports through the log."""
+        def run():
+            try:
+                task(name)
+            except (KeyError, ValueError, TimeoutError, LinkDown) as e:
+                self.log_message(f"Profile {name}: {e}")
+        threading.Thread(target=run, daemon=True).start()
+
+    def save_profile(self):
+        name = self.profile_name.get().strip()
+        if not name:
+            self.log_message("Please enter a profile name.")
+            return
+
+        def save(name):
+            profile = self.profiles.save(name, snapshot_board(self.engine))
+            self.log_message(f"Profile {name} saved with "
+                             f"{len(profile['parameters'])} parameters")
+        self.run_profile_task(save, name)
+
+    def apply_profile(self):
+        name = self.profile_name.get().strip()
+        if not name:
+            self.log_message("Please choose a profile.")
+            return
+        # apply_profile() logs its own summary.
+        self.run_profile_task(
+            lambda name: apply_profile(self.engine, self.profiles.load(name)), name)
+
+    def delete_profile(self):
+        name = self.profile_name.get().strip()
+        if not name:
+            self.log_message("Please choose a profile.")
+            return
+        try:
+            self.profiles.delete(name)
+        except (KeyError, ValueError):
+            self.log_message(f"No profile named {name}")
+            return
+        self.profile_name.set("")
+        self.log_message(f"Profile {name} deleted")
+
+    def log_message(self, msg):
+        self.engine.log(msg)
+
+    def update_log_view(self):
+        """Append log records added since the last frame, keeping the view capped."""
+        records = self.engine.log_store.since(self.log_view_seq)
+        if not records:
+            return
+        self.log_view_seq = records[-1]["seq"]
+        records = records[-self.LOG_VIEW_LINES:]
+        self.log_text.insert(
+            tk.END, "".join(LogStore.render(r) + "\n" for r in records))
+        self.log_view_lines += len(records)
+        excess = self.log_view_lines - self.LOG_VIEW_LINES
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
+            self.log_view_lines -= excess
+        self.log_text.see(tk.END)
+
+    def clear_log(self):
+        self.log_text.delete("1.0", tk.END)
+        self.log_view_lines = 0
+        self.engine.log_store.clear()
+
+    def on_closing(self):
+        self.engine.event_broker.unsubscribe(self.subscription)
+        self.engine.metrics.ui_backlog = None
+        self.engine.stop()
+        self.destroy()
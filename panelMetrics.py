@@ -0,0 +1,295 @@
+"""Low-overhead counters, histograms and a sampling profiler.
+
+Metrics are plain objects updated on the hot paths (the serial reader, the
+Tk frame, each HTTP request) and only formatted when /metrics is scraped,
+in the Prometheus text exposition format. Nothing here depends on a
+metrics library.
+"""
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as FrameCounter
+
+# Upper bounds in seconds.
+FAST_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                1e-2, 2.5e-2, 5e-2, 0.1)
+REQUEST_BUCKETS = (1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+# Message prefixes of the firmware protocol; anything else is "other".
+PREFIXES = ("A", "U", "G", "L", "S", "D", "ERR")
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is a bisect and three adds."""
+
+    def __init__(self, buckets=FAST_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        """Return ([(le, cumulative count)], sum, count)."""
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        cumulative, running = [], 0
+        for le, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            cumulative.append((le, running))
+        return cumulative, total, running
+
+
+class EngineMetrics:
+    """Per-device link and parser metrics, updated by PanelEngine and the GUI."""
+
+    def __init__(self):
+        self.bytes_in = Counter()
+        self.bytes_out = Counter()
+        self.lines_in = Counter()
+        self.lines_out = Counter()
+        self.unrecognized = Counter()
+        self.firmware_errors = Counter()
+        self.frame_errors = Counter()  # binary frames that failed their CRC
+        self.parse_seconds = {prefix: Histogram() for prefix in PREFIXES + ("other",)}
+        self.ui_update_seconds = Histogram()
+        self.ui_dropped = Counter()
+        # Set by a front end: returns how many events wait for its next frame.
+        self.ui_backlog = None
+        self.last_rx = None  # time.monotonic() of the last received byte
+
+    def observe_line(self, line, seconds, recognized):
+        prefix = line.split(",", 1)[0]
+        if prefix not in self.parse_seconds:
+            prefix = "other"
+        self.parse_seconds[prefix].observe(seconds)
+        self.lines_in.inc()
+        if prefix == "ERR":
+            self.firmware_errors.inc()
+        elif not recognized:
+            self.unrecognized.inc()
+
+
+def label_text(labels):
+    if not labels:
+        return ""
+    pairs = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                     for k, v in labels.items())
+    return "{" + pairs + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Exposition:
+    """Collects metric families and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self.families = {}  # name -> (type, help, [lines])
+
+    def family(self, name, kind, help_text):
+        return self.families.setdefault(name, (kind, help_text, []))[2]
+
+    def sample(self, name, kind, help_text, value, **labels):
+        self.family(name, kind, help_text).append(
+            f"{name}{label_text(labels)} {format_value(value)}")
+
+    def histogram(self, name, help_text, histogram, **labels):
+        lines = self.family(name, "histogram", help_text)
+        buckets, total, count = histogram.snapshot()
+        for le, cumulative in buckets:
+            lines.append(f"{name}_bucket{label_text(dict(labels, le=format_value(le)))} "
+                         f"{cumulative}")
+        lines.append(f"{name}_sum{label_text(labels)} {format_value(total)}")
+        lines.append(f"{name}_count{label_text(labels)} {count}")
+
+    def render(self):
+        out = []
+        for name, (kind, help_text, lines) in self.families.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+def engine_metrics(exposition, device, engine):
+    """Add one device's metrics to exposition."""
+    metrics = engine.metrics
+    for direction, counter in (("in", metrics.bytes_in), ("out", metrics.bytes_out)):
+        exposition.sample("panel_serial_bytes_total", "counter",
+                          "Bytes moved over the serial link.",
+                          counter.value, device=device, direction=direction)
+    for direction, counter in (("in", metrics.lines_in), ("out", metrics.lines_out)):
+        exposition.sample("panel_serial_lines_total", "counter",
+                          "Lines received from and commands sent to the board.",
+                          counter.value, device=device, direction=direction)
+    for prefix, histogram in metrics.parse_seconds.items():
+        exposition.histogram("panel_line_handling_seconds",
+                             "Time to parse and apply one received line, by message prefix.",
+                             histogram, device=device, prefix=prefix)
+    exposition.sample("panel_unrecognized_lines_total", "counter",
+                      "Received lines that matched no message type or pending command.",
+                      metrics.unrecognized.value, device=device)
+    exposition.sample("panel_firmware_errors_total", "counter",
+                      "ERR, lines received from the board.",
+                      metrics.firmware_errors.value, device=device)
+    exposition.sample("panel_frame_crc_errors_total", "counter",
+                      "Binary frames from the board dropped for a bad CRC.",
+                      metrics.frame_errors.value, device=device)
+    exposition.sample("panel_commands_in_flight", "gauge",
+                      "Commands waiting for their reply.",
+                      len(engine.command_tracker.pending), device=device)
+    if metrics.last_rx is not None:
+        exposition.sample("panel_device_silence_seconds", "gauge",
+                          "Seconds since the board last sent a byte.",
+                          round(time.monotonic() - metrics.last_rx, 6), device=device)
+    if engine.history is not None:
+        exposition.sample("panel_history_out_of_range_total", "counter",
+                          "Values not recorded in the history because they do not fit int32.",
+                          engine.history.out_of_range, device=device)
+    supervisor = engine.supervisor
+    if supervisor is not None:
+        exposition.sample("panel_link_up", "gauge",
+                          "1 while the serial link is open and not replaying held writes.",
+                          int(engine.link_up and not engine.holding), device=device)
+        exposition.sample("panel_link_reconnects_total", "counter",
+                          "Times the serial link was lost and restored.",
+                          supervisor.reconnects, device=device)
+        exposition.sample("panel_link_held_writes", "gauge",
+                          "Commands held for replay while the link is down.",
+                          len(engine.held), device=device)
+    if metrics.ui_backlog is not None:
+        exposition.sample("panel_ui_event_backlog", "gauge",
+                          "Engine events waiting for the GUI's next frame.",
+                          metrics.ui_backlog(), device=device)
+        exposition.sample("panel_ui_events_dropped_total", "counter",
+                          "Engine events the GUI fell too far behind to receive.",
+                          metrics.ui_dropped.value, device=device)
+        exposition.histogram("panel_ui_tree_update_seconds",
+                             "Time spent syncing the parameter Treeview.",
+                             metrics.ui_update_seconds, device=device)
+
+
+class RouteMetrics:
+    """Per-route HTTP latency histograms."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, route, method, status, seconds):
+        key = (route, method, status)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram(REQUEST_BUCKETS))
+        histogram.observe(seconds)
+
+    def expose(self, exposition):
+        with self.lock:
+            items = sorted(self.histograms.items())
+        for (route, method, status), histogram in items:
+            exposition.histogram("panel_http_request_seconds",
+                                 "Time to produce each REST API response.",
+                                 histogram, route=route, method=method, status=status)
+
+
+class SamplingProfiler:
+    """Opt-in stack sampler for selected threads.
+
+    Every interval it reads the current frame of each target thread and
+    counts the collapsed stack, in the "frame;frame;frame count" format
+    that flame graph tools read. targets is a callable returning
+    {label: threading.Thread}, so threads started later are picked up.
+    """
+
+    def __init__(self, targets, interval=0.005, max_depth=64):
+        self.targets = targets
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = FrameCounter()
+        self.samples = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        # Each run gets its own event, so a run still sleeping when the
+        # profiler is restarted ends instead of sampling alongside the new one.
+        self.stopped = None
+        self.running = False
+        self.started_at = None
+
+    @property
+    def enabled(self):
+        return self.running
+
+    def start(self, interval=None):
+        with self.lock:
+            if self.running:
+                return
+            if interval:
+                self.interval = interval
+            self.stacks.clear()
+            self.samples = 0
+            self.running = True
+            self.started_at = time.time()
+            self.stopped = threading.Event()
+            self.thread = threading.Thread(target=self.run, args=(self.stopped,),
+                                           daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            if self.stopped is not None:
+                self.stopped.set()
+
+    def run(self, stopped):
+        while not stopped.is_set():
+            frames = sys._current_frames()
+            with self.lock:
+                if stopped.is_set():
+                    break
+                for label, thread in self.targets().items():
+                    frame = frames.get(thread.ident)
+                    if frame is not None:
+                        self.stacks[self.collapse(label, frame)] += 1
+                self.samples += 1
+            stopped.wait(self.interval)
+
+    def collapse(self, label, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}"
+                         f":{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join([label] + names[::-1])
+
+    def status(self):
+        with self.lock:
+            return {"enabled": self.running, "interval_ms": self.interval * 1000,
+                    "samples": self.samples, "started_at": self.started_at}
+
+    def folded(self):
+        with self.lock:
+            items = self.stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
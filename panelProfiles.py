@@ -0,0 +1,296 @@
+"""Named parameter profiles: snapshot to disk, diff against a board, restore.
+
+A profile is the list of parameters (name, min, max, current) a job needs,
+saved as <directory>/<name>.json. Applying one first lists the board's store
+(get:AlladdedParams), then sends only what differs:
+
+- parameters already on the board with the same bounds get an
+  update:paramsCurval if their value differs, and nothing otherwise;
+- missing parameters, and ones whose bounds changed, get an add:param.
+
+The firmware keeps 5 parameters in a circular store: add:param always
+overwrites the slot after the last one added. plan_profile simulates that,
+so an add that would evict a parameter the profile keeps also re-adds it,
+with the profile's value, instead of losing it. The commands go out as one
+pipelined sequence and a second listing verifies the result.
+"""
+import json
+import os
+import re
+import time
+from collections import namedtuple
+
+from panelEngine import pipeline_commands
+
+# The firmware's store (src/helpers.h): 5 slots, names cut to 14 characters.
+MAX_PARAMS = 5
+NAME_LENGTH = 14
+
+PROFILE_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+
+Slot = namedtuple("Slot", "name min max current")
+
+
+def profile_parameter(item):
+    """Validate one profile entry; returns a Slot or raises ValueError."""
+    try:
+        name = str(item["name"]).strip()[:NAME_LENGTH]
+        low, high, current = int(item["min"]), int(item["max"]), int(item["current"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"expected name, min, max and current, got {item!r}")
+    if not name or "," in name or "\n" in name:
+        raise ValueError(f"invalid parameter name {item.get('name')!r}")
+    if low > high:
+        raise ValueError(f"{name}: min {low} is greater than max {high}")
+    return Slot(name, low, high, min(max(current, low), high))
+
+
+def profile_parameters(items):
+    """Validate a profile's parameter list; raises ValueError."""
+    if not isinstance(items, list):
+        raise ValueError("parameters must be a list")
+    parameters = [profile_parameter(item) for item in items]
+    names = [p.name for p in parameters]
+    if len(set(names)) != len(names):
+        raise ValueError("parameter names must be unique (after cutting to "
+                         f"{NAME_LENGTH} characters)")
+    if len(parameters) > MAX_PARAMS:
+        raise ValueError(f"the board holds at most {MAX_PARAMS} parameters, "
+                         f"got {len(parameters)}")
+    return parameters
+
+
+class ProfileStore:
+    """Profiles saved as JSON files in one directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, name):
+        if not PROFILE_NAME.fullmatch(name or ""):
+            raise ValueError(f"invalid profile name {name!r}")
+        return os.path.join(self.directory, name + ".json")
+
+    def names(self):
+        try:
+            files = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(f[:-5] for f in files
+                      if f.endswith(".json") and PROFILE_NAME.fullmatch(f[:-5]))
+
+    def load(self, name):
+        """Return the profile dict; raises KeyError if there is none."""
+        try:
+            with open(self.path(name), encoding="utf-8") as f:
+                profile = json.load(f)
+        except FileNotFoundError:
+            raise KeyError(name)
+        profile["parameters"] = [p._asdict() for p in
+                                 profile_parameters(profile.get("parameters"))]
+        return profile
+
+    def save(self, name, parameters):
+        """Write a profile, replacing any of the same name; returns it."""
+        path = self.path(name)
+        profile = {"name": name, "saved": round(time.time(), 3),
+                   "parameters": [p._asdict() for p in profile_parameters(parameters)]}
+        os.makedirs(self.directory, exist_ok=True)
+        # Write then rename, so a crash never leaves half a profile.
+        temp = path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=2)
+        os.replace(temp, path)
+        return profile
+
+    def delete(self, name):
+        """Remove a profile; raises KeyError if there is none."""
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            raise KeyError(name)
+
+
+def board_slots(listed):
+    """The board's store, indexed by slot, from a sweep (None for empty slots)."""
+    slots = [None] * MAX_PARAMS
+    for message in listed:
+        if 0 <= message.index < MAX_PARAMS:
+            slots[message.index] = Slot(message.name, message.min, message.max, message.value)
+    return slots
+
+
+def next_slot(slots, last_added):
+    """The slot the next add:param overwrites, or None if it cannot be told.
+
+    Until the store is full that is the first empty slot. After that it is
+    the slot after the last parameter added, found by name.
+    """
+    count = sum(slot is not None for slot in slots)
+    if count < MAX_PARAMS:
+        return count
+    if last_added is None:
+        return None
+    where = [i for i, slot in enumerate(slots) if slot.name == last_added[:NAME_LENGTH]]
+    return (where[0] + 1) % MAX_PARAMS if len(where) == 1 else None
+
+
+def plan_profile(slots, head, parameters):
+    """Commands that turn the board's slots into the profile.
+
+    slots is board_slots() of a sweep, head the slot the next add:param
+    overwrites and parameters the profile's Slots. Returns a dict with the
+    adds and updates (as Slots and (name, value) pairs), the commands, the
+    board parameters outside the profile that get overwritten, and
+    conflicts: parameters whose old entry cannot be overwritten without
+    filling the store's empty slots.
+    """
+    slots = list(slots)
+    wanted = {p.name: p for p in parameters}
+
+    def settled(p):
+        held = [slot for slot in slots if slot is not None and slot.name == p.name]
+        return len(held) == 1 and (held[0].min, held[0].max) == (p.min, p.max)
+
+    def correct_copy(p):
+        return any(slot is not None and slot.name == p.name and
+                   (slot.min, slot.max) == (p.min, p.max) for slot in slots)
+
+    adds, evicted = [], []
+    position = head
+    # Each add overwrites the next slot; two laps cover every order.
+    for _ in range(2 * MAX_PARAMS):
+        unsettled = [p for p in parameters if not settled(p)]
+        if not unsettled:
+            break
+        occupant = slots[position]
+        missing = [p for p in unsettled if not correct_copy(p)]
+        if missing:
+            new = missing[0]
+        elif occupant is not None:
+            # Only stale duplicates are left: step over this slot by adding
+            # back what it holds.
+            new = wanted.get(occupant.name, occupant)
+        else:
+            break
+        if occupant is not None and occupant.name not in wanted and occupant != new:
+            evicted.append(occupant.name)
+        slots[position] = new
+        adds.append(new)
+        position = (position + 1) % MAX_PARAMS
+
+    added = {slot.name for slot in adds}
+    updates = []
+    for p in parameters:
+        if p.name in added or not settled(p):
+            continue
+        slot = next(slot for slot in slots if slot is not None and slot.name == p.name)
+        if slot.current != p.current:
+            updates.append((p.name, p.current))
+    commands = ([f"add:param,{s.name},{s.min},{s.max},{s.current}" for s in adds] +
+                [f"update:paramsCurval,{name},{value}" for name, value in updates])
+    return {"adds": adds, "updates": updates, "commands": commands, "evicted": evicted,
+            "conflicts": [p.name for p in parameters if not settled(p)]}
+
+
+def profile_differences(slots, parameters):
+    """Profile parameters the board does not hold exactly, as {name: reason}."""
+    differences = {}
+    for p in parameters:
+        held = [slot for slot in slots if slot is not None and slot.name == p.name]
+        if not held:
+            differences[p.name] = "missing"
+        elif len(held) > 1:
+            differences[p.name] = f"listed {len(held)} times"
+        elif (held[0].min, held[0].max) != (p.min, p.max):
+            differences[p.name] = f"bounds {held[0].min}..{held[0].max}"
+        elif held[0].current != p.current:
+            differences[p.name] = f"value {held[0].current}"
+    return differences
+
+
+def describe_plan(plan):
+    return {"adds": [slot._asdict() for slot in plan["adds"]],
+            "updates": [{"name": name, "current": value} for name, value in plan["updates"]],
+            "commands": plan["commands"], "evicted": plan["evicted"],
+            "conflicts": plan["conflicts"]}
+
+
+def snapshot_board(engine, timeout=2.0):
+    """The board's parameters, in slot order, as profile entries.
+
+    Where a name is listed twice only the lowest slot counts, as on the
+    firmware. Raises TimeoutError if the board does not list its store.
+    """
+    listed = engine.sweep_board(timeout)
+    if listed is None:
+        raise TimeoutError("the board did not list its parameters")
+    engine.apply_sweep(listed)
+    parameters = {}
+    for slot in board_slots(listed):
+        if slot is not None and slot.name not in parameters:
+            parameters[slot.name] = slot._asdict()
+    return list(parameters.values())
+
+
+def diff_profile(engine, profile, timeout=2.0):
+    """Plan a profile against the board's current store, without sending it.
+
+    Raises TimeoutError if the board does not list its store.
+    """
+    listed = engine.sweep_board(timeout)
+    if listed is None:
+        raise TimeoutError("the board did not list its parameters")
+    engine.apply_sweep(listed)
+    slots = board_slots(listed)
+    parameters = profile_parameters(profile["parameters"])
+    head = next_slot(slots, engine.last_added)
+    return slots, head, parameters
+
+
+def apply_profile(engine, profile, timeout=2.0, verify=True):
+    """Bring the board to a profile with as few commands as possible.
+
+    Returns a report: the plan, one result per command, and (with verify)
+    whether a final listing matched the profile. Raises TimeoutError if the
+    board does not list its store.
+    """
+    started = time.perf_counter()
+    slots, head, parameters = diff_profile(engine, profile, timeout)
+    probe = []
+    results = []
+    if head is None:
+        # The store is full and the last add is unknown, so which slot the
+        # next add overwrites is too. Send one add and look where it landed.
+        plan = plan_profile(slots, 0, parameters)
+        if plan["adds"]:
+            probe = plan["adds"][:1]
+            results += pipeline_commands(engine.command_tracker, engine.send_command,
+                                         plan["commands"][:1], timeout,
+                                         cost=engine.wire_cost)
+            slots, head, parameters = diff_profile(engine, profile, timeout)
+    if head is None:
+        head = 0
+    plan = plan_profile(slots, head, parameters)
+    results += pipeline_commands(engine.command_tracker, engine.send_command,
+                                 plan["commands"], timeout, cost=engine.wire_cost)
+    # The probing add is part of what was sent.
+    plan["adds"] = probe + plan["adds"]
+    plan["commands"] = [r["command"] for r in results]
+    report = {"profile": profile["name"], **describe_plan(plan), "results": results,
+              "confirmed": all(r["status"] == "Confirmed" for r in results)}
+    if verify:
+        listed = engine.sweep_board(timeout)
+        if listed is None:
+            report["verified"] = False
+            report["differences"] = None
+        else:
+            engine.apply_sweep(listed)
+            report["differences"] = profile_differences(board_slots(listed), parameters)
+            report["verified"] = not report["differences"]
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    engine.log(f"Profile {profile['name']} applied: {len(plan['adds'])} added, "
+               f"{len(plan['updates'])} updated" +
+               ("" if not verify else ", verified" if report["verified"] else
+                ", NOT verified"))
+    return report
@@ -0,0 +1,173 @@
+"""Table-driven parser for the firmware's serial protocol.
+
+Every line the board sends starts with a message prefix. DECODERS maps each
+prefix to precompiled patterns, tried in order, and the message type built
+from the matched fields:
+
+    A,<name>                          ParameterAdded
+    A,<index>,<value>                 PinReading (analog)
+    D,<pin>,<value>                   PinReading (digital)
+    U,<name>,<value> / G,...          ParameterValue
+    U,<name>,ERROR / G,...            ParameterNotFound
+    S,<index>,<name>,<value>          ParameterSelected (button press)
+    S,software set to,<name>          SoftwareSet
+    L,<index>,<name>,<min>,<max>,<v>  ParameterListed
+    ERR,<message>                     BoardError
+    B,<baud> / T                      FramingChanged (binary / text framing)
+
+Anything else is Unrecognized. The two A forms are told apart by their
+field count, so a parameter may have any name, all digits included.
+Names are never converted to numbers.
+
+Messages are small immutable tuples. event() gives the change-event dict
+the engine publishes, or None for messages that change nothing. Nothing
+here depends on Tk or on the serial link, so the parser can be benchmarked
+and fuzzed on its own.
+"""
+import re
+from collections import namedtuple
+
+INT = r"\s*(-?\d+)\s*"
+
+
+class ParameterAdded(namedtuple("ParameterAdded", "name")):
+    __slots__ = ()
+
+    def event(self):
+        return {"type": "parameter", "source": "A", "name": self.name}
+
+
+class ParameterValue(namedtuple("ParameterValue", "source name value")):
+    """A U, (update confirmed or encoder turned) or G, (value read) line."""
+    __slots__ = ()
+
+    def event(self):
+        return {"type": "parameter", "source": self.source, "name": self.name,
+                "current": self.value}
+
+
+class ParameterNotFound(namedtuple("ParameterNotFound", "source name")):
+    __slots__ = ()
+
+    def event(self):
+        return None
+
+
+class ParameterSelected(namedtuple("ParameterSelected", "index name value")):
+    __slots__ = ()
+
+    def event(self):
+        return {"type": "parameter", "source": "S", "index": self.index,
+                "name": self.name, "current": self.value}
+
+
+class ParameterListed(namedtuple("ParameterListed", "index name min max value")):
+    __slots__ = ()
+
+    def event(self):
+        return {"type": "parameter", "source": "L", "index": self.index,
+                "name": self.name, "min": self.min, "max": self.max,
+                "current": self.value}
+
+
+class PinReading(namedtuple("PinReading", "kind pin value")):
+    """kind is "digital" (D,) or "analog" (A,; pin is the A0-based index)."""
+    __slots__ = ()
+
+    def event(self):
+        key = "pin" if self.kind == "digital" else "index"
+        return {"type": "pin", "kind": self.kind, key: self.pin, "value": self.value}
+
+
+class SoftwareSet(namedtuple("SoftwareSet", "name")):
+    __slots__ = ()
+
+    def event(self):
+        return {"type": "software", "name": self.name}
+
+
+class BoardError(namedtuple("BoardError", "message")):
+    __slots__ = ()
+
+    def event(self):
+        return None
+
+
+class FramingChanged(namedtuple("FramingChanged", "framing baud")):
+    """Reply to set:binary (framing "binary") or set:text ("text", baud None)."""
+    __slots__ = ()
+
+    def event(self):
+        return None
+
+
+class Unrecognized(namedtuple("Unrecognized", "line")):
+    __slots__ = ()
+
+    def event(self):
+        return None
+
+
+def value_decoders(prefix):
+    return (
+        (re.compile(prefix + r",(.*),ERROR$"),
+         lambda name: ParameterNotFound(prefix, name)),
+        (re.compile(prefix + r",(.*)," + INT + "$"),
+         lambda name, value: ParameterValue(prefix, name, int(value))),
+    )
+
+
+# prefix -> ((compiled pattern, builder taking the matched groups), ...)
+DECODERS = {
+    "A": (
+        (re.compile(r"A," + INT + "," + INT + "$"),
+         lambda index, value: PinReading("analog", int(index), int(value))),
+        (re.compile(r"A,([^,]*)$"), ParameterAdded),
+    ),
+    "D": (
+        (re.compile(r"D," + INT + "," + INT + "$"),
+         lambda pin, value: PinReading("digital", int(pin), int(value))),
+    ),
+    "U": value_decoders("U"),
+    "G": value_decoders("G"),
+    "S": (
+        (re.compile(r"S,\s*software set to\s*,\s*(.*?)\s*$", re.IGNORECASE), SoftwareSet),
+        (re.compile(r"S," + INT + ",(.*)," + INT + "$"),
+         lambda index, name, value: ParameterSelected(int(index), name, int(value))),
+    ),
+    "L": (
+        (re.compile(r"L," + INT + ",(.*)," + INT + "," + INT + "," + INT + "$"),
+         lambda index, name, low, high, value: ParameterListed(
+             int(index), name, int(low), int(high), int(value))),
+    ),
+    "ERR": (
+        (re.compile(r"ERR,(.*)$"), BoardError),
+    ),
+    "B": (
+        (re.compile(r"B," + INT + "$"), lambda baud: FramingChanged("binary", int(baud))),
+    ),
+    "T": (
+        (re.compile(r"T$"), lambda: FramingChanged("text", None)),
+    ),
+}
+
+
+def parse_line(line):
+    """Decode one line (without its line ending) into a message."""
+    for pattern, build in DECODERS.get(line.partition(",")[0], ()):
+        match = pattern.match(line)
+        if match:
+            return build(*match.groups())
+    return Unrecognized(line)
+
+
+def parse_lines(lines):
+    """Decode an iterable of lines, skipping blank ones."""
+    return [parse_line(line) for line in (raw.strip() for raw in lines) if line]
+
+
+def parse_buffer(data):
+    """Decode every complete line in a str or bytes buffer in one call."""
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8", errors="ignore")
+    return parse_lines(data.splitlines())
@@ -0,0 +1,205 @@
+"""Serial session capture and replay.
+
+SessionCapture records every line a PanelEngine receives and sends. The
+capture file is UTF-8 text, gzip-compressed when its name ends in .gz:
+
+    #panel-capture 1 {"started": 1760000000.123456, "port": "/dev/ttyUSB0", "baud": 9600}
+    0 o add:param,Setpoint,0,1000,500
+    31250 i A,Setpoint
+    201733 i U,Setpoint,501
+
+Each record is the microseconds since the previous record, "i" (from the
+board) or "o" (to the board), and the line. Lines are the CSV protocol in
+either framing, since the engine decodes binary frames back into CSV.
+
+ReplayDriver feeds a capture through an engine that has no serial port,
+in real time, scaled by a speed factor, or as fast as possible, and
+reports throughput, per-line handling latency and how far it fell behind
+the capture's schedule.
+"""
+import gzip
+import json
+import threading
+import time
+from array import array
+from collections import deque
+
+MAGIC = "#panel-capture"
+VERSION = 1
+
+
+def open_text(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="\n")
+    return open(path, mode, encoding="utf-8", newline="\n")
+
+
+class SessionCapture:
+    """Appends the lines in and out of one engine to a capture file.
+
+    record() runs on the serial reader and on whichever thread writes, so it
+    only appends a tuple to a deque. A background thread formats and writes
+    the records every flush_interval seconds.
+    """
+
+    def __init__(self, path, port="", baud=None, flush_interval=0.5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.records = deque()
+        self.count = 0
+        self.file = open_text(path, "w")
+        header = {"started": round(time.time(), 6), "port": port, "baud": baud}
+        self.file.write(f"{MAGIC} {VERSION} {json.dumps(header)}\n")
+        self.last = time.perf_counter_ns()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="session-capture", daemon=True)
+        self.thread.start()
+
+    def record(self, direction, line):
+        """Note one line; direction is "i" (received) or "o" (sent)."""
+        self.records.append((time.perf_counter_ns(), direction, line))
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.drain()
+        self.drain()
+        self.file.close()
+
+    def drain(self):
+        records = self.records
+        last = self.last
+        out = []
+        while records:
+            stamp, direction, line = records.popleft()
+            # Reader and writer threads may append slightly out of order.
+            out.append(f"{max(0, stamp - last) // 1000} {direction} "
+                       f"{line.replace(chr(10), ' ')}\n")
+            last = max(last, stamp)
+        self.last = last
+        if out:
+            self.file.write("".join(out))
+            self.file.flush()
+            self.count += len(out)
+
+    def close(self):
+        """Write what is still queued and close the file."""
+        if not self.stopped.is_set():
+            self.stopped.set()
+            self.thread.join()
+
+
+def load_capture(path):
+    """Return (header dict, [(seconds since start, direction, line), ...])."""
+    with open_text(path, "r") as f:
+        magic, _, rest = f.readline().partition(" ")
+        version, _, header = rest.partition(" ")
+        if magic != MAGIC or version.strip() != str(VERSION):
+            raise ValueError(f"{path} is not a version {VERSION} panel capture")
+        header = json.loads(header)
+        records = []
+        elapsed = 0
+        try:
+            for number, row in enumerate(f, start=2):
+                if not row.endswith("\n"):
+                    break  # cut off mid-write
+                delta, direction, line = row[:-1].split(" ", 2)
+                if direction not in ("i", "o"):
+                    raise ValueError(f"{path}:{number}: unknown direction {direction!r}")
+                elapsed += int(delta)
+                records.append((elapsed / 1e6, direction, line))
+        except EOFError:
+            # The process stopped without closing the file; every record it
+            # flushed is still readable.
+            pass
+    return header, records
+
+
+def percentiles(samples, scale, unit):
+    """count, mean, p50, p90, p99 and max of samples (seconds) in unit."""
+    data = sorted(samples)
+    if not data:
+        return {"count": 0}
+    count = len(data)
+
+    def pick(p):
+        return round(data[int(p * (count - 1))] * scale, 3)
+
+    return {"count": count, f"mean_{unit}": round(sum(data) / count * scale, 3),
+            f"p50_{unit}": pick(0.50), f"p90_{unit}": pick(0.90),
+            f"p99_{unit}": pick(0.99), f"max_{unit}": round(data[-1] * scale, 3)}
+
+
+class ReplayDriver(threading.Thread):
+    """Plays captured lines into an engine that was never started.
+
+    Received lines go through engine.handle_line, exactly as the serial
+    reader delivers them, so parsing, the store, the history and every
+    event subscriber see the production traffic. Sent lines are only
+    logged and counted: there is no board to send them to. speed scales the
+    capture's timing (1.0 is real time); None replays as fast as possible.
+    """
+
+    def __init__(self, engine, records, speed=1.0, repeat=1):
+        super().__init__(name="session-replay", daemon=True)
+        self.engine = engine
+        self.records = records
+        self.speed = speed
+        self.repeat = repeat
+        self.handle_seconds = array("d")
+        self.lag_seconds = array("d")
+        self.lines_in = 0
+        self.lines_out = 0
+        self.started = None
+        self.finished = None
+        self.running = True
+
+    def run(self):
+        engine = self.engine
+        span = self.records[-1][0] if self.records else 0.0
+        self.started = time.perf_counter()
+        for lap in range(self.repeat):
+            offset = self.started + lap * span / self.speed if self.speed else None
+            for at, direction, line in self.records:
+                if not self.running:
+                    break
+                if offset is not None:
+                    due = offset + at / self.speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    self.lag_seconds.append(max(0.0, time.perf_counter() - due))
+                if direction == "i":
+                    start = time.perf_counter()
+                    engine.handle_line(line)
+                    self.handle_seconds.append(time.perf_counter() - start)
+                    self.lines_in += 1
+                else:
+                    engine.log(line, direction="out")
+                    engine.metrics.lines_out.inc()
+                    self.lines_out += 1
+        self.finished = time.perf_counter()
+
+    def stop(self):
+        self.running = False
+
+    def report(self):
+        """Throughput and latency of the replay so far."""
+        end = self.finished or time.perf_counter()
+        wall = end - self.started if self.started else 0.0
+        captured = (self.records[-1][0] if self.records else 0.0) * self.repeat
+        lines = self.lines_in + self.lines_out
+        report = {
+            "lines_in": self.lines_in,
+            "lines_out": self.lines_out,
+            "capture_s": round(captured, 3),
+            "wall_s": round(wall, 3),
+            "speedup": round(captured / wall, 2) if wall else None,
+            "lines_per_s": round(lines / wall) if wall else None,
+            "handle_line": percentiles(self.handle_seconds, 1e6, "us"),
+            "unrecognized": self.engine.metrics.unrecognized.value,
+            "firmware_errors": self.engine.metrics.firmware_errors.value,
+            "done": self.finished is not None,
+        }
+        if self.speed:
+            report["lag"] = percentiles(self.lag_seconds, 1e3, "ms")
+        return report
@@ -42,20 +42,41 @@ public:
         }
     }
 
-    // Add a parameter; when full, overwrites the oldest.
-    void addParameter(const char *name, int min, int max, int current)
+    // Add a parameter; when full, overwrites the oldest. Returns its index.
+    int addParameter(const char *name, int min, int max, int current)
     {
-        strncpy(params[head].name, name, MAX_NAME_LENGTH - 1);
-        params[head].name[MAX_NAME_LENGTH - 1] = '\0'; // ensure null termination
-        params[head].min = min;
-        params[head].max = max;
-        params[head].current = constrain(current, min, max);
+        int slot = head;
+        strncpy(params[slot].name, name, MAX_NAME_LENGTH - 1);
+        params[slot].name[MAX_NAME_LENGTH - 1] = '\0'; // ensure null termination
+        params[slot].min = min;
+        params[slot].max = max;
+        params[slot].current = constrain(current, min, max);
 
         head = (head + 1) % MAX_PARAMS;
         if (count < MAX_PARAMS)
         {
             count++;
         }
+        return slot;
+    }
+
+    // Index of the parameter with this name, or -1 if not found.
+    int findParameter(const char *name)
+    {
+        for (int i = 0; i < MAX_PARAMS; i++)
+        {
+            if (strcmp(params[i].name, name) == 0)
+            {
+                return i;
+            }
+        }
+        return -1;
+    }
+
+    // Return true if index holds a parameter.
+    bool isValidIndex(int index)
+    {
+        return index >= 0 && index < count;
     }
 
     // Return true if no parameters have been added.
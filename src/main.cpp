@@ -29,6 +29,49 @@ unsigned long lastEncoderUpdateTime = 0;
 bool rapidUpdateMode = false;
 const unsigned long rapidUpdateThreshold = 600;
 
+// --- Binary framing, negotiated with "set:binary,<baud>" (see binaryFraming.py) ---
+#define TEXT_BAUD 9600
+#define FRAME_SYNC 0xA5
+#define FRAME_MAX_PAYLOAD 48
+#define FRAME_TIMEOUT_MS 50
+
+#define OP_ADD 0x01
+#define OP_GET 0x02
+#define OP_UPDATE 0x03
+#define OP_LIST 0x04
+#define OP_SOFTWARE 0x05
+#define OP_READ_DIGITAL 0x06
+#define OP_READ_ANALOG 0x07
+#define OP_TEXT 0x08
+#define OP_GET_NAMED 0x09
+#define OP_UPDATE_NAMED 0x0A
+#define OP_REPLY 0x80
+#define OP_SELECTED 0x89
+#define OP_NAMED 0x8A
+#define OP_NO_NAME 0x8C
+#define OP_NOT_FOUND 0x8D
+#define OP_ERROR 0x8E
+
+bool binaryMode = false;
+
+// Receive state of the binary frame parser.
+enum RxState
+{
+  RX_SYNC,
+  RX_LENGTH,
+  RX_PAYLOAD,
+  RX_CRC
+};
+RxState rxState = RX_SYNC;
+uint8_t rxFrame[FRAME_MAX_PAYLOAD];
+uint8_t rxLength = 0;
+uint8_t rxReceived = 0;
+unsigned long rxLastByte = 0;
+
+// Outgoing frame payload (opcode and fields) under construction.
+uint8_t txFrame[FRAME_MAX_PAYLOAD];
+uint8_t txLength = 0;
+
 // --- New display mode tracking to reduce clearDisplay calls ---
 enum DisplayMode
 {
@@ -83,6 +126,363 @@ void updateOLEDRapid(const char *name, int value)
   // (If your library requires an explicit display update, add display.display() here)
 }
 
+// Redraw after the software name changed.
+void showSoftwareName()
+{
+  if (selectedParamIndex >= 0)
+  {
+    ParameterStore::Parameter currentParam = params.getParameter(selectedParamIndex);
+    if (rapidUpdateMode)
+      updateOLEDRapid(currentParam.name, currentParam.current);
+    else
+      updateOLED(currentParam.name, currentParam.current, currentParam.min, currentParam.max);
+  }
+  else
+  {
+    display.clearDisplay();
+    sprintf(buffer, "Software: %s      ", softwareName);
+    display.drawString(0, 7, buffer);
+  }
+}
+
+// CRC-8, polynomial 0x07, over the length byte and the payload.
+uint8_t crc8Update(uint8_t crc, uint8_t data)
+{
+  crc ^= data;
+  for (int i = 0; i < 8; i++)
+    crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+  return crc;
+}
+
+void putByte(uint8_t value)
+{
+  if (txLength < FRAME_MAX_PAYLOAD)
+    txFrame[txLength++] = value;
+}
+
+void beginFrame(uint8_t opcode)
+{
+  txLength = 0;
+  putByte(opcode);
+}
+
+// Zigzag varint: small magnitudes of either sign take one byte.
+void putVarint(long value)
+{
+  unsigned long raw = ((unsigned long)value << 1) ^ (unsigned long)(value >> 31);
+  do
+  {
+    uint8_t low = raw & 0x7F;
+    raw >>= 7;
+    putByte(raw ? (low | 0x80) : low);
+  } while (raw);
+}
+
+void putString(const char *text)
+{
+  while (*text)
+    putByte(*text++);
+}
+
+void sendFrame()
+{
+  uint8_t crc = crc8Update(0, txLength);
+  for (uint8_t i = 0; i < txLength; i++)
+    crc = crc8Update(crc, txFrame[i]);
+  Serial.write(FRAME_SYNC);
+  Serial.write(txLength);
+  Serial.write(txFrame, txLength);
+  Serial.write(crc);
+}
+
+void sendErrorFrame(const char *message)
+{
+  beginFrame(OP_ERROR);
+  putString(message);
+  sendFrame();
+}
+
+// Read a zigzag varint at body[*pos]; returns false if the body ends first.
+bool readVarint(const uint8_t *body, uint8_t length, uint8_t *pos, long *value)
+{
+  unsigned long raw = 0;
+  for (uint8_t shift = 0; *pos < length && shift < 32; shift += 7)
+  {
+    uint8_t next = body[(*pos)++];
+    raw |= (unsigned long)(next & 0x7F) << shift;
+    if (!(next & 0x80))
+    {
+      *value = (long)(raw >> 1) ^ -(long)(raw & 1);
+      return true;
+    }
+  }
+  return false;
+}
+
+// Copy body[pos..length) into name as a C string.
+void readName(const uint8_t *body, uint8_t length, uint8_t pos, char *name)
+{
+  uint8_t n = 0;
+  while (pos < length && n < FRAME_MAX_PAYLOAD - 1)
+    name[n++] = body[pos++];
+  name[n] = '\0';
+}
+
+// Encoder turned: "U,<name>,<value>" or an UPDATED frame.
+void reportEncoderValue(int index, const char *name, int value)
+{
+  if (binaryMode)
+  {
+    beginFrame(OP_REPLY | OP_UPDATE);
+    putByte(index);
+    putVarint(value);
+    sendFrame();
+    return;
+  }
+  Serial.print("U,");
+  Serial.print(name);
+  Serial.print(",");
+  Serial.println(value);
+}
+
+// Button pressed: "S,<index>,<name>,<value>" or a SELECTED frame.
+void reportSelection(int index, const char *name, int value)
+{
+  if (binaryMode)
+  {
+    beginFrame(OP_SELECTED);
+    putByte(index);
+    putVarint(value);
+    sendFrame();
+    return;
+  }
+  Serial.print("S,");
+  Serial.print(index);
+  Serial.print(",");
+  Serial.print(name);
+  Serial.print(",");
+  Serial.println(value);
+}
+
+bool isSupportedBaud(long baud)
+{
+  return baud == 9600 || baud == 19200 || baud == 38400 || baud == 57600 || baud == 115200;
+}
+
+// Execute one binary command frame; replies with frames.
+void handleFrame(uint8_t opcode, const uint8_t *body, uint8_t length)
+{
+  char name[FRAME_MAX_PAYLOAD];
+  uint8_t pos = 0;
+  long minVal, maxVal, value;
+
+  switch (opcode)
+  {
+  case OP_ADD:
+  {
+    if (!readVarint(body, length, &pos, &minVal) || !readVarint(body, length, &pos, &maxVal) ||
+        !readVarint(body, length, &pos, &value))
+    {
+      sendErrorFrame("Invalid frame");
+      return;
+    }
+    readName(body, length, pos, name);
+    int slot = params.addParameter(name, minVal, maxVal, value);
+    if (params.getCount() == 1)
+    {
+      selectedParamIndex = 0;
+      display.clearDisplay();
+      currentDisplayMode = MODE_FULL;
+      updateOLED(name, value, minVal, maxVal);
+    }
+    beginFrame(OP_REPLY | OP_ADD);
+    putByte(slot);
+    putString(name);
+    sendFrame();
+    break;
+  }
+  case OP_GET:
+  case OP_UPDATE:
+  {
+    pos = 1;
+    if (length < 1 || (opcode == OP_UPDATE && !readVarint(body, length, &pos, &value)))
+    {
+      sendErrorFrame("Invalid frame");
+      return;
+    }
+    int slot = body[0];
+    if (!params.isValidIndex(slot))
+    {
+      beginFrame(OP_NOT_FOUND);
+      putByte(opcode);
+      putByte(slot);
+      sendFrame();
+      return;
+    }
+    if (opcode == OP_UPDATE)
+    {
+      params.updateParameterValue(slot, value);
+      ParameterStore::Parameter param = params.getParameter(slot);
+      updateOLED(param.name, value, param.min, param.max);
+    }
+    else
+    {
+      value = params.getParameter(slot).current;
+    }
+    beginFrame(OP_REPLY | opcode);
+    putByte(slot);
+    putVarint(value);
+    sendFrame();
+    break;
+  }
+  case OP_GET_NAMED:
+  case OP_UPDATE_NAMED:
+  {
+    if (opcode == OP_UPDATE_NAMED && !readVarint(body, length, &pos, &value))
+    {
+      sendErrorFrame("Invalid frame");
+      return;
+    }
+    readName(body, length, pos, name);
+    int slot = params.findParameter(name);
+    if (slot < 0)
+    {
+      beginFrame(OP_NO_NAME);
+      putByte(opcode);
+      putString(name);
+      sendFrame();
+      return;
+    }
+    if (opcode == OP_UPDATE_NAMED)
+    {
+      params.updateParameterValue(slot, value);
+      ParameterStore::Parameter param = params.getParameter(slot);
+      updateOLED(param.name, value, param.min, param.max);
+    }
+    else
+    {
+      value = params.getParameter(slot).current;
+    }
+    beginFrame(OP_NAMED);
+    putByte(opcode);
+    putByte(slot);
+    putVarint(value);
+    putString(name);
+    sendFrame();
+    break;
+  }
+  case OP_LIST:
+    for (int i = 0; i < params.getCount(); i++)
+    {
+      ParameterStore::Parameter param = params.getParameter(i);
+      beginFrame(OP_REPLY | OP_LIST);
+      putByte(i);
+      putVarint(param.min);
+      putVarint(param.max);
+      putVarint(param.current);
+      putString(param.name);
+      sendFrame();
+    }
+    break;
+  case OP_SOFTWARE:
+  {
+    readName(body, length, 0, name);
+    String sname = name;
+    sname.trim();
+    sname.toCharArray(softwareName, sizeof(softwareName));
+    beginFrame(OP_REPLY | OP_SOFTWARE);
+    putString(softwareName);
+    sendFrame();
+    showSoftwareName();
+    break;
+  }
+  case OP_READ_DIGITAL:
+  case OP_READ_ANALOG:
+  {
+    if (length < 1)
+    {
+      sendErrorFrame("Invalid frame");
+      return;
+    }
+    int pin = body[0];
+    if (opcode == OP_READ_DIGITAL)
+    {
+      pinMode(pin, INPUT);
+      value = digitalRead(pin);
+    }
+    else
+    {
+      value = analogRead(A0 + pin);
+    }
+    beginFrame(OP_REPLY | opcode);
+    putByte(pin);
+    putVarint(value);
+    sendFrame();
+    break;
+  }
+  case OP_TEXT:
+    beginFrame(OP_REPLY | OP_TEXT);
+    sendFrame();
+    Serial.flush();
+    Serial.begin(TEXT_BAUD);
+    binaryMode = false;
+    break;
+  default:
+    sendErrorFrame("Unknown command");
+    break;
+  }
+}
+
+// Feed received bytes through the frame parser, executing each good frame.
+void pollBinaryFrames()
+{
+  // Abandon a frame whose remaining bytes never arrived.
+  if (rxState != RX_SYNC && millis() - rxLastByte > FRAME_TIMEOUT_MS)
+    rxState = RX_SYNC;
+
+  while (binaryMode && Serial.available() > 0)
+  {
+    uint8_t next = Serial.read();
+    rxLastByte = millis();
+    switch (rxState)
+    {
+    case RX_SYNC:
+      if (next == FRAME_SYNC)
+        rxState = RX_LENGTH;
+      break;
+    case RX_LENGTH:
+      if (next == 0 || next > FRAME_MAX_PAYLOAD)
+      {
+        rxState = (next == FRAME_SYNC) ? RX_LENGTH : RX_SYNC;
+      }
+      else
+      {
+        rxLength = next;
+        rxReceived = 0;
+        rxState = RX_PAYLOAD;
+      }
+      break;
+    case RX_PAYLOAD:
+      rxFrame[rxReceived++] = next;
+      if (rxReceived == rxLength)
+        rxState = RX_CRC;
+      break;
+    case RX_CRC:
+    {
+      rxState = RX_SYNC;
+      uint8_t crc = crc8Update(0, rxLength);
+      for (uint8_t i = 0; i < rxLength; i++)
+        crc = crc8Update(crc, rxFrame[i]);
+      if (crc != next)
+        sendErrorFrame("CRC mismatch");
+      else
+        handleFrame(rxFrame[0], rxFrame + 1, rxLength - 1);
+      break;
+    }
+    }
+  }
+}
+
 void processSerialCommands()
 {
   if (Serial.available() > 0)
@@ -199,20 +599,7 @@ void processSerialCommands()
       Serial.println(softwareName);
 
       // Update display with the new software name.
-      if (selectedParamIndex >= 0)
-      {
-        ParameterStore::Parameter currentParam = params.getParameter(selectedParamIndex);
-        if (rapidUpdateMode)
-          updateOLEDRapid(currentParam.name, currentParam.current);
-        else
-          updateOLED(currentParam.name, currentParam.current, currentParam.min, currentParam.max);
-      }
-      else
-      {
-        display.clearDisplay();
-        sprintf(buffer, "Software: %s      ", softwareName);
-        display.drawString(0, 7, buffer);
-      }
+      showSoftwareName();
     }
     // New command to read a digital pin.
     else if (command.startsWith("read:digital"))
@@ -253,6 +640,24 @@ void processSerialCommands()
       Serial.print(",");
       Serial.println(val);
     }
+    // Switch to binary framing at the given baud rate.
+    else if (command.startsWith("set:binary"))
+    {
+      int comma = command.indexOf(',');
+      long baud = comma == -1 ? 0 : command.substring(comma + 1).toInt();
+      if (!isSupportedBaud(baud))
+      {
+        Serial.println("ERR,Invalid baud");
+        return;
+      }
+      Serial.print("B,");
+      Serial.println(baud);
+      // The reply goes out at the old rate before the switch.
+      Serial.flush();
+      Serial.begin(baud);
+      binaryMode = true;
+      rxState = RX_SYNC;
+    }
     else
     {
       Serial.println("ERR,Unknown command");
@@ -273,7 +678,10 @@ void setup()
 
 void loop()
 {
-  processSerialCommands();
+  if (binaryMode)
+    pollBinaryFrames();
+  else
+    processSerialCommands();
 
   encoder.tick();
   int delta = encoder.getPosition();
@@ -290,10 +698,7 @@ void loop()
       if (newVal != currentParam.current)
       {
         params.updateParameterValue(selectedParamIndex, newVal);
-        Serial.print("U,");
-        Serial.print(currentParam.name);
-        Serial.print(",");
-        Serial.println(newVal);
+        reportEncoderValue(selectedParamIndex, currentParam.name, newVal);
 
         unsigned long now = millis();
         // If updates come in rapid succession, use rapid update mode.
@@ -335,12 +740,7 @@ void loop()
       {
         selectedParamIndex = (selectedParamIndex + 1) % params.getCount();
         ParameterStore::Parameter p = params.getParameter(selectedParamIndex);
-        Serial.print("S,");
-        Serial.print(selectedParamIndex);
-        Serial.print(",");
-        Serial.print(p.name);
-        Serial.print(",");
-        Serial.println(p.current);
+        reportSelection(selectedParamIndex, p.name, p.current);
 
         // Force a full-mode update when switching parameters.
         currentDisplayMode = MODE_FULL;
@@ -0,0 +1,85 @@
+"""Fixtures for the host-side tests: an emulated board and an engine on it.
+
+Run from the repository root with ``python -m pytest test/host``. The
+emulator needs a pseudo-terminal, so tests using it are skipped on Windows.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from panelEngine import DeviceRegistry, PanelEngine  # noqa: E402
+
+
+@pytest.fixture
+def board(tmp_path):
+    """Start emulated boards behind one stable port path, like --link.
+
+    Returns start(); each call replaces the previous board, as if it had
+    been unplugged and another one plugged in. The path is board.port.
+    """
+    pytest.importorskip("pty")
+    from firmwareEmulator import FirmwareEmulator
+
+    link = str(tmp_path / "panel")
+    running = []
+
+    def start(**options):
+        stop()
+        emulator = FirmwareEmulator(baud_rate=None, **options)
+        os.symlink(emulator.start(), link)
+        running.append(emulator)
+        return emulator
+
+    def stop():
+        while running:
+            running.pop().stop()
+        if os.path.islink(link):
+            os.remove(link)
+
+    start.port = link
+    start.stop = stop
+    yield start
+    stop()
+
+
+@pytest.fixture
+def engine(board):
+    """A started PanelEngine talking to a fresh emulated board."""
+    board()
+    engines = []
+
+    def make(**options):
+        engine = PanelEngine(board.port, 9600, **options)
+        engines.append(engine)
+        assert engine.start(ready_timeout=5.0) is not None, "the emulator did not answer"
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.stop()
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    """Flask test client for writeCommand's REST API.
+
+    Returns serve(devices): devices maps device ids to engines, the first
+    being the default device. Profiles are saved under tmp_path.
+    """
+    pytest.importorskip("flask")
+    import writeCommand
+    from panelProfiles import ProfileStore
+
+    monkeypatch.setattr(writeCommand, "profiles", ProfileStore(str(tmp_path / "profiles")))
+
+    def serve(devices):
+        registry = DeviceRegistry()
+        for device_id, engine in devices.items():
+            registry.add(device_id, engine)
+        monkeypatch.setattr(writeCommand, "registry", registry)
+        return writeCommand.app_api.test_client()
+
+    return serve
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from panelEngine import AsyncSerialLink, PanelEngine, pipeline_commands
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="the asyncio link needs POSIX")
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def loop():
+    """An event loop on its own thread, like the async API server's."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+class PipePort:
+    """Stands in for a serial port; fileno() is one end of a pipe."""
+
+    in_waiting = 0
+
+    def __init__(self, end):
+        self.fds = os.pipe()
+        self.fd = self.fds[end]
+        self.timeout = 1
+
+    def fileno(self):
+        return self.fd
+
+    def read(self, size):
+        return b""
+
+    def close(self):
+        for fd in self.fds:
+            os.close(fd)
+
+
+def attach(loop, port):
+    """An asyncio-mode engine whose link writes to port."""
+    panel = PanelEngine("/dev/null", 9600, reader_mode="asyncio", loop=loop)
+    panel.ser = port
+    panel.serial_reader = AsyncSerialLink(port, panel, loop)
+    panel.serial_reader.start()
+    panel.link_up = True
+    return panel
+
+
+def test_failed_write_is_held_for_replay(loop):
+    # Writing to the read end of a pipe fails with EBADF, like a pulled cable.
+    panel = attach(loop, PipePort(0))
+    panel.write("add:param,Speed,0,100,5")
+    panel.write("add:param,Depth,0,9,3")
+    try:
+        assert wait_for(lambda: len(panel.held) == 2)
+        assert list(panel.held) == ["add:param,Speed,0,100,5", "add:param,Depth,0,9,3"]
+        assert panel.holding and not panel.link_up
+        # Probes and sampler requests are not held.
+        panel.holding = False
+        panel.transmit(PanelEngine.SYNC_COMMAND)
+        time.sleep(0.1)
+        assert len(panel.held) == 2
+    finally:
+        panel.close_link()
+
+
+def test_writes_queued_at_detach_are_held(loop):
+    port = PipePort(1)
+    os.set_blocking(port.fd, False)
+    try:
+        while True:
+            os.write(port.fd, b"x" * 4096)
+    except BlockingIOError:
+        pass  # the pipe is full, so the writer has to wait
+    panel = attach(loop, port)
+    panel.write("add:param,Speed,0,100,5")
+    panel.write("update:paramsCurval,Speed,7")
+    time.sleep(0.1)
+    assert not panel.held
+    panel.close_link()
+    assert list(panel.held) == ["add:param,Speed,0,100,5", "update:paramsCurval,Speed,7"]
+    assert panel.holding
+
+
+def test_asyncio_engine_talks_to_the_board(loop, engine):
+    panel = engine(reader_mode="asyncio", loop=loop)
+    assert panel.serial_reader.mode == "asyncio"
+    results = pipeline_commands(panel.command_tracker, panel.send_command,
+                                ["add:param,Speed,0,100,5", "get:paramCurval,Speed"])
+    assert [r["reply"] for r in results] == ["A,Speed", "G,Speed,5"]
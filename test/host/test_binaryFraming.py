@@ -0,0 +1,92 @@
+import pytest
+
+from binaryFraming import (MAX_PAYLOAD, OP_ADD, OP_ERROR, OP_LIST, OP_NAMED, OP_UPDATE,
+                           OP_UPDATE_NAMED, REPLY, SYNC, BinaryCodec, FrameDecoder, SlotMap,
+                           decode_varint, encode_frame, encode_varint)
+from panelEngine import command_result
+from panelMetrics import Counter
+
+
+@pytest.mark.parametrize("value", [0, 1, -1, 63, -64, 64, 1000, -1000, 2**31 - 1, -2**31])
+def test_varint_round_trip(value):
+    data = encode_varint(value)
+    assert decode_varint(data, 0) == (value, len(data))
+
+
+def board_frames():
+    """A short board session and the CSV lines it stands for."""
+    return [
+        (encode_frame(REPLY | OP_ADD, bytes((2,)) + b"Speed"), "A,Speed"),
+        (encode_frame(REPLY | OP_LIST, bytes((2,)) + encode_varint(-5) + encode_varint(100)
+                      + encode_varint(42) + b"Speed"), "L,2,Speed,-5,100,42"),
+        (encode_frame(REPLY | OP_UPDATE, bytes((2,)) + encode_varint(7)), "U,Speed,7"),
+        (encode_frame(OP_NAMED, bytes((OP_UPDATE_NAMED, 3)) + encode_varint(-9) + b"Temp"),
+         "U,Temp,-9"),
+        (encode_frame(OP_ERROR, b"Unknown command"), "ERR,Unknown command"),
+    ]
+
+
+def test_frames_decode_to_csv_lines():
+    decoder = FrameDecoder(SlotMap())
+    frames = board_frames()
+    assert decoder.feed(b"".join(f for f, _ in frames)) == [
+        line.encode() for _, line in frames]
+
+
+def test_frames_split_across_reads():
+    decoder = FrameDecoder(SlotMap())
+    frames = board_frames()
+    lines = []
+    for byte in b"".join(f for f, _ in frames):
+        lines += decoder.feed(bytes((byte,)))
+    assert lines == [line.encode() for _, line in frames]
+
+
+def test_bad_crc_is_dropped_and_counted():
+    errors = Counter()
+    decoder = FrameDecoder(SlotMap(), errors)
+    good = encode_frame(REPLY | OP_ADD, bytes((0,)) + b"Mode")
+    bad = bytearray(good)
+    bad[-2] ^= 0x01  # flip a payload bit; the CRC no longer matches
+    # Noise and the corrupt frame are skipped; the decoder resynchronizes
+    # on the next sync byte.
+    assert decoder.feed(b"\x00\x13" + bytes(bad) + good) == [b"A,Mode"]
+    assert errors.value == 1
+
+
+def test_unknown_slot_is_dropped():
+    decoder = FrameDecoder(SlotMap())
+    frame = encode_frame(REPLY | OP_UPDATE, bytes((4,)) + encode_varint(1))
+    assert decoder.feed(frame) == []
+    assert decoder.dropped == 1
+
+
+def test_oversized_payload_is_refused():
+    encode_frame(OP_LIST, bytes(MAX_PAYLOAD - 1))
+    with pytest.raises(ValueError):
+        encode_frame(OP_LIST, bytes(MAX_PAYLOAD))
+
+
+def test_codec_frames_commands():
+    codec = BinaryCodec()
+    frame = codec.encode("add:param,Speed,0,100,5")
+    assert frame[0] == SYNC and frame[2] == OP_ADD
+    # Until the board says which slot Speed went to, updates carry the name.
+    assert codec.frame("update:paramsCurval,Speed,6")[2] == OP_UPDATE_NAMED
+    codec.decoder.feed(encode_frame(REPLY | OP_ADD, bytes((0,)) + b"Speed"))
+    update = codec.frame("update:paramsCurval,Speed,6")
+    assert update[2] == OP_UPDATE and len(update) < len("update:paramsCurval,Speed,6\n")
+
+
+def test_binary_link_against_emulator(engine):
+    panel = engine(binary_baud=57600)
+    assert panel.codec is not None
+    tracker = panel.command_tracker
+    for cmd, reply in (("add:param,Speed,0,100,5", "A,Speed"),
+                       ("update:paramsCurval,Speed,250", "U,Speed,250"),
+                       ("get:paramCurval,Speed", "G,Speed,100")):
+        pending = tracker.expect(cmd)
+        panel.send_command(cmd)
+        result = command_result(tracker, pending, 2.0)
+        assert (result["status"], result["reply"]) == ("Confirmed", reply)
+    assert panel.metrics.frame_errors.value == 0
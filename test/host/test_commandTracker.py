@@ -0,0 +1,63 @@
+from panelEngine import CommandTracker, FirmwareError, command_result, expected_reply
+
+
+def test_expected_replies():
+    assert expected_reply("add:param,Speed,0,100,5")("A,Speed")
+    assert not expected_reply("add:param,Speed,0,100,5")("A,Speeds")
+    assert expected_reply("update:paramsCurval,Speed,7")("U,Speed,100")
+    assert expected_reply("get:paramCurval,Speed")("G,Speed,ERROR")
+    assert not expected_reply("get:paramCurval,Speed")("G,Speed,1,2")
+    assert expected_reply("set:software," + "x" * 40)("x" * 31)
+    assert expected_reply("read:analog,3")("A,3,512")
+    assert not expected_reply("read:analog,3")("A,4,512")
+    assert expected_reply("read:digital,x") is None
+    assert expected_reply("get:AlladdedParams") is None
+
+
+def test_replies_reach_the_command_they_answer():
+    tracker = CommandTracker()
+    a = tracker.expect("get:paramCurval,a")
+    b = tracker.expect("get:paramCurval,b")
+    assert tracker.resolve("U,a,3") is None  # an encoder turn, not a reply
+    assert tracker.resolve("G,b,2") is b
+    assert tracker.resolve("G,a,1") is a
+    assert (a.future.result(), b.future.result()) == ("G,a,1", "G,b,2")
+    assert not tracker.pending
+
+
+def test_errors_go_to_the_oldest_command():
+    tracker = CommandTracker()
+    first = tracker.expect("add:param,a,0,1,0")
+    second = tracker.expect("get:paramCurval,a")
+    tracker.resolve("ERR,Invalid add:param format")
+    assert isinstance(first.future.exception(), FirmwareError)
+    tracker.resolve("G,a,ERROR")
+    assert str(second.future.exception()) == "Parameter not found: a"
+
+
+def test_unanswered_command_times_out_and_is_forgotten():
+    tracker = CommandTracker()
+    pending = tracker.expect("get:paramCurval,a")
+    assert command_result(tracker, pending, 0.01) == {
+        "status": "Timeout", "command": "get:paramCurval,a"}
+    assert not tracker.pending
+
+
+def test_api_waits_for_the_reply(engine, api):
+    client = api({"default": engine()})
+    added = client.post("/parameters?wait=true",
+                        json={"name": "Speed", "min": 0, "max": 100, "current": 5})
+    assert added.status_code == 200
+    assert added.get_json()["reply"] == "A,Speed"
+    updated = client.put("/parameter/Speed?wait=1", json={"new_value": 250}).get_json()
+    assert (updated["status"], updated["value"]) == ("Confirmed", 250)
+    missing = client.post("/command?wait=1", json={"command": "get:paramCurval,Nope"})
+    assert missing.status_code == 502
+    assert missing.get_json()["error"] == "Parameter not found: Nope"
+    assert client.post("/command?wait=1",
+                       json={"command": "get:AlladdedParams"}).status_code == 400
+    assert client.post("/command?wait=1&timeout_ms=soon",
+                       json={"command": "get:paramCurval,Speed"}).status_code == 400
+    # Without wait the command is only sent.
+    sent = client.post("/command", json={"command": "get:paramCurval,Speed"}).get_json()
+    assert sent == {"status": "Command sent", "command": "get:paramCurval,Speed"}
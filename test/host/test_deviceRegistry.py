@@ -0,0 +1,73 @@
+import pytest
+
+from panelEngine import DeviceRegistry, PanelEngine
+
+
+@pytest.fixture
+def second_engine():
+    """A started engine on a board of its own, beside the engine fixture's."""
+    pytest.importorskip("pty")
+    from firmwareEmulator import FirmwareEmulator
+
+    emulator = FirmwareEmulator(baud_rate=None)
+    engine = PanelEngine(emulator.start(), 9600)
+    engine.start(ready_timeout=5.0)
+    yield engine
+    engine.stop()
+    emulator.stop()
+
+
+def test_registry_resolves_devices_and_groups():
+    registry = DeviceRegistry()
+    a, b = PanelEngine("/dev/a", 9600), PanelEngine("/dev/b", 9600)
+    registry.add("a", a)
+    registry.add("b", b)
+    with pytest.raises(ValueError):
+        registry.add("a", b)
+    assert registry.get() is a and registry.get("b") is b and registry.get("c") is None
+    registry.add_group("line", ["b"])
+    with pytest.raises(ValueError):
+        registry.add_group("bad", ["b", "c"])
+    assert registry.resolve() == ["a", "b"]
+    assert registry.resolve(group="line") == ["b"]
+    assert registry.resolve(["b", "a"]) == ["b", "a"]
+    with pytest.raises(KeyError):
+        registry.resolve(group="nope")
+    with pytest.raises(KeyError):
+        registry.resolve(["c"])
+
+
+def test_devices_that_fail_to_start_are_reported():
+    registry = DeviceRegistry()
+    registry.add("missing", PanelEngine("/nonexistent/tty", 9600))
+    errors = registry.start_all()
+    assert list(errors) == ["missing"]
+    described = registry.describe()["devices"]["missing"]
+    assert described["connected"] is False and described["error"]
+
+
+def test_routes_address_each_device(engine, second_engine, api):
+    client = api({"left": engine(), "right": second_engine})
+    client.post("/devices/right/parameters?wait=1",
+                json={"name": "Gain", "min": 0, "max": 9, "current": 4})
+    assert "Gain" in client.get("/devices/right/parameters").get_json()
+    # Un-prefixed routes go to the first device.
+    assert client.get("/parameters").get_json() == {}
+    assert client.get("/devices/nope/parameters").status_code == 404
+    devices = client.get("/devices").get_json()
+    assert sorted(devices["devices"]) == ["left", "right"]
+    assert all(d["connected"] for d in devices["devices"].values())
+
+
+def test_fanout_runs_on_every_device(engine, second_engine, api):
+    client = api({"left": engine(), "right": second_engine})
+    operations = [{"op": "add", "name": "Speed", "min": 0, "max": 100, "current": 5},
+                  {"op": "get", "name": "Speed"}]
+    response = client.post("/fanout", json={"operations": operations})
+    assert response.status_code == 200
+    devices = response.get_json()["devices"]
+    assert sorted(devices) == ["left", "right"]
+    for outcome in devices.values():
+        assert [r["reply"] for r in outcome["results"]] == ["A,Speed", "G,Speed,5"]
+    assert client.post("/fanout", json={"operations": operations,
+                                        "devices": ["nope"]}).status_code == 404
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from panelEngine import EventBroker, PanelEngine
+
+
+def publish(broker, count):
+    for value in range(count):
+        broker.publish({"type": "parameter", "name": "Speed", "current": value})
+
+
+def seqs(events):
+    return [event["seq"] for event in events]
+
+
+def sub_events(sub):
+    events, dropped = sub.get(timeout=0)
+    return seqs(events), dropped
+
+
+def test_events_are_numbered_in_delivery_order():
+    broker = EventBroker(queue_size=1000)
+    sub = broker.subscribe()
+    threads = [threading.Thread(target=publish, args=(broker, 200)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    events, dropped = sub.get(timeout=0)
+    assert seqs(events) == list(range(1, 801)) and dropped == 0
+
+
+def test_slow_subscriber_loses_the_oldest_events():
+    broker = EventBroker(queue_size=4)
+    sub = broker.subscribe()
+    publish(broker, 10)
+    events, dropped = sub.get(timeout=0)
+    assert seqs(events) == [7, 8, 9, 10] and dropped == 6
+    broker.unsubscribe(sub)
+    publish(broker, 1)
+    assert sub.get(timeout=0) == ([], 0)
+
+
+def test_resume_replays_missed_events():
+    broker = EventBroker()
+    publish(broker, 5)
+    assert sub_events(broker.subscribe()) == ([], 0)
+    assert sub_events(broker.subscribe(last_seq=2)) == ([3, 4, 5], 0)
+    assert sub_events(broker.subscribe(last_seq=5)) == ([], 0)
+
+
+def test_resume_past_the_backlog_counts_the_gap():
+    broker = EventBroker(backlog_size=3)
+    publish(broker, 6)
+    assert sub_events(broker.subscribe(last_seq=1)) == ([4, 5, 6], 2)
+    # An id from before a restart of the service is ignored.
+    assert sub_events(broker.subscribe(last_seq=99)) == ([], 0)
+
+
+def test_async_subscriber_resumes_on_its_loop():
+    broker = EventBroker()
+    publish(broker, 3)
+
+    async def main():
+        sub = broker.subscribe(asyncio.get_running_loop(), last_seq=1)
+        threading.Thread(target=publish, args=(broker, 1)).start()
+        received = []
+        while len(received) < 3:
+            events, _ = await sub.get(timeout=2)
+            received += events
+        return seqs(received)
+
+    assert asyncio.run(main()) == [2, 3, 4]
+
+
+def frames(text):
+    """(id, type, data) for each event in an SSE body."""
+    found = []
+    for block in text.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines()
+                      if line and not line.startswith(":"))
+        if "event" in fields:
+            found.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return found
+
+
+def test_sse_stream_resumes_from_last_event_id(api):
+    panel = PanelEngine("/dev/null", 9600)
+    client = api({"default": panel})
+    publish(panel.event_broker, 4)
+    response = client.get("/events", headers={"Last-Event-ID": "2"}, buffered=False)
+    assert response.mimetype == "text/event-stream"
+    chunks = iter(response.response)
+    assert next(chunks) == b"retry: 1000\n\n"
+    body = b"".join(next(chunks) for _ in range(2)).decode()
+    response.close()
+    assert [(id, event["current"]) for id, _, event in frames(body)] == [("3", 2), ("4", 3)]
+
+
+def test_async_stream_resumes_from_last_event_id(api):
+    import writeCommand
+
+    panel = PanelEngine("/dev/null", 9600)
+    api({"default": panel})
+    publish(panel.event_broker, 4)
+
+    class Request:
+        headers = {"last-event-id": "3"}
+
+    class Response:
+        sent = []
+
+        async def start(self, headers):
+            pass
+
+        async def send(self, text):
+            self.sent.append(text)
+            if len(self.sent) == 2:
+                raise ConnectionResetError
+
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(writeCommand.stream_events(Request(), Response()))
+    assert [id for id, _, _ in frames("".join(Response.sent))] == ["4"]
+    assert not panel.event_broker.subscribers
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+import serial
+
+
+@pytest.fixture
+def port(board):
+    board()
+    with serial.Serial(board.port, 9600, timeout=1) as ser:
+        yield ser
+
+
+def ask(ser, command, replies=1):
+    ser.write((command + "\n").encode())
+    return [ser.readline().decode().strip() for _ in range(replies)]
+
+
+def test_replies(port):
+    assert ask(port, "add:param,Speed,0,100,5") == ["A,Speed"]
+    assert ask(port, "update:paramsCurval,Speed,250") == ["U,Speed,250"]
+    assert ask(port, "get:paramCurval,Speed") == ["G,Speed,100"]
+    assert ask(port, "get:paramCurval,Nope") == ["G,Nope,ERROR"]
+    assert ask(port, "set:software,Lathe") == ["Lathe"]
+    assert ask(port, "read:digital,2") == ["D,2,1"]
+    assert ask(port, "bogus") == ["ERR,Unknown command"]
+
+
+def test_store_is_circular_with_short_names(port):
+    for name in ("a", "b", "c", "d", "e", "f", "A-very-long-parameter"):
+        ask(port, f"add:param,{name},0,9,1")
+    listed = ask(port, "get:AlladdedParams", replies=5)
+    # f and the cut name overwrote the two oldest slots.
+    assert listed == ["L,0,f,0,9,1", "L,1,A-very-long-pa,0,9,1", "L,2,c,0,9,1",
+                      "L,3,d,0,9,1", "L,4,e,0,9,1"]
+
+
+def test_rx_buffer_overflows_like_the_uno(board):
+    emulator = board(command_delay=0.05)
+    with serial.Serial(board.port, 9600, timeout=1) as ser:
+        ser.write(b"".join(f"add:param,P{i},0,100,{i}\n".encode() for i in range(10)))
+        time.sleep(1.0)
+    # Everything past the first 64 bytes arrived while the loop was busy.
+    assert emulator.rx_overruns > 0
+    assert emulator.commands < 10
+
+
+def test_inputs_turn_the_selected_parameter(board):
+    emulator = board()
+    with serial.Serial(board.port, 9600, timeout=1) as ser:
+        ask(ser, "add:param,Speed,0,100,5")
+        emulator.turn_encoder(3)
+        assert ser.readline().decode().strip() == "U,Speed,8"
+        emulator.press_button()
+        assert ser.readline().decode().strip() == "S,0,Speed,8"
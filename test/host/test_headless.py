@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from panelEngine import CommandTracker, FirmwareError, PanelEngine
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+
+
+def test_service_runs_without_tk():
+    pytest.importorskip("flask")
+    # A None entry makes any import of tkinter fail.
+    code = ("import sys; sys.modules['tkinter'] = None; "
+            "import panelEngine, writeCommand; print('ok')")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, timeout=60)
+    assert result.stdout.strip() == "ok", result.stderr
+
+
+def test_stray_err_skips_the_sync_marker():
+    tracker = CommandTracker()
+    marker = tracker.expect(PanelEngine.SYNC_COMMAND, errors=False)
+    get = tracker.expect("get:paramCurval,Speed")
+    # An ERR left over from an earlier command goes to the get, not the marker.
+    assert tracker.resolve("ERR,Unknown command") is get
+    assert isinstance(get.future.exception(), FirmwareError)
+    assert tracker.resolve("ERR,Unknown command") is None
+    assert tracker.resolve("G,~sync,ERROR") is marker
+
+
+def test_start_returns_once_the_board_answers(board):
+    board()
+    panel = PanelEngine(board.port, 9600)
+    try:
+        # Probing instead of sleeping through a reset: the emulator has none.
+        assert panel.start(ready_timeout=5.0) < 0.5
+    finally:
+        panel.stop()
+
+
+def test_start_gives_up_on_a_silent_board():
+    pty = pytest.importorskip("pty")
+    master, slave = pty.openpty()
+    panel = PanelEngine(os.ttyname(slave), 9600)
+    try:
+        assert panel.start(ready_timeout=0.3) is None
+        # Its probes were sent and forgotten.
+        assert os.read(master, 1024).startswith(PanelEngine.SYNC_COMMAND.encode())
+        assert not panel.command_tracker.pending
+    finally:
+        panel.stop()
+        os.close(master)
+        os.close(slave)
@@ -0,0 +1,114 @@
+import os
+import time
+
+import pytest
+
+import historyStore
+from historyStore import RECORD, HistoryStore
+from panelEngine import PanelEngine
+
+
+def segment_files(directory):
+    return sorted(f for f in os.listdir(directory) if f.endswith(".seg"))
+
+
+def test_full_segments_roll_over(tmp_path):
+    history = HistoryStore(str(tmp_path), segment_records=4)
+    now = time.time()
+    for i in range(10):
+        history.append("Speed", i, now - 10 + i)
+    assert segment_files(tmp_path) == ["00000001.seg", "00000002.seg", "00000003.seg"]
+    points = history.query("Speed", now - 10, now, 5)
+    assert [(p["min"], p["max"], p["mean"], p["count"]) for p in points] == [
+        (0, 4, 2.0, 5), (5, 9, 7.0, 5)]
+
+
+def test_series_are_kept_apart(tmp_path):
+    history = HistoryStore(str(tmp_path), segment_records=64)
+    now = time.time()
+    history.record({"type": "parameter", "source": "U", "name": "Speed", "current": 3})
+    history.record({"type": "parameter", "source": "A", "name": "Speed"})
+    history.record({"type": "pin", "kind": "digital", "pin": 2, "value": 1})
+    history.record({"type": "pin", "kind": "analog", "index": 0, "value": 512})
+    assert history.names() == ["Speed", "pin:A0", "pin:D2"]
+    [point] = history.query("pin:A0", now - 1, now + 1, 2)
+    assert point["max"] == 512 and point["count"] == 1
+    with pytest.raises(KeyError):
+        history.query("Nope", now - 1, now + 1, 2)
+    with pytest.raises(ValueError):
+        history.query("Speed", now, now - 1, 1)
+    with pytest.raises(ValueError):
+        history.query("Speed", 0, now, 1)
+
+
+def test_disk_budget_drops_the_oldest_segments(tmp_path):
+    history = HistoryStore(str(tmp_path), segment_records=4,
+                           max_bytes=2 * 4 * RECORD.size)
+    now = time.time()
+    for i in range(12):
+        history.append("Speed", i, now - 12 + i)
+    assert segment_files(tmp_path) == ["00000002.seg", "00000003.seg"]
+    points = history.query("Speed", now - 20, now, 20)
+    assert (points[0]["min"], points[0]["count"]) == (4, 8)
+
+
+def test_history_survives_a_restart(tmp_path):
+    now = time.time()
+    history = HistoryStore(str(tmp_path), segment_records=4)
+    for i in range(6):
+        history.append("Speed", i, now - 6 + i)
+    history.flush()
+    reopened = HistoryStore(str(tmp_path), segment_records=4)
+    reopened.append("Speed", 6, now)
+    assert reopened.names() == ["Speed"]
+    [point] = reopened.query("Speed", now - 10, now + 1, 11)
+    assert (point["min"], point["max"], point["count"]) == (0, 6, 7)
+
+
+def test_queries_agree_without_numpy(tmp_path, monkeypatch):
+    history = HistoryStore(str(tmp_path), segment_records=16)
+    now = time.time()
+    for i in range(40):
+        history.append("Speed", (i * 37) % 101 - 50, now - 40 + i)
+        history.append("Depth", i, now - 40 + i)
+    expected = history.query("Speed", now - 40, now, 7)
+    monkeypatch.setattr(historyStore, "np", None)
+    assert history.query("Speed", now - 40, now, 7) == expected
+
+
+def test_history_skips_values_outside_int32(tmp_path):
+    history = HistoryStore(str(tmp_path), segment_records=64)
+    now = time.time()
+    history.append("Speed", 2**31, now)
+    history.append("Speed", -2**31 - 1, now)
+    history.append("Speed", 7, now)
+    assert history.out_of_range == 2
+    [point] = history.query("Speed", now - 1, now + 1, 2)
+    assert (point["min"], point["max"], point["count"]) == (7, 7, 1)
+
+
+def test_history_expires_the_active_segment(tmp_path):
+    history = HistoryStore(str(tmp_path), segment_records=64, max_age=10)
+    now = time.time()
+    history.append("Speed", 1, now - 100)
+    history.append("Speed", 2, now)
+    # The old record was alone in a segment that has now been dropped.
+    assert len(history.segments) == 1
+    points = history.query("Speed", now - 200, now + 1, 300)
+    assert [p["count"] for p in points] == [1]
+
+
+def test_history_api(tmp_path, api):
+    panel = PanelEngine("/dev/null", 9600, history=HistoryStore(str(tmp_path)))
+    client = api({"default": panel})
+    start = time.time() - 1
+    for value in (3, 9, 6):
+        panel.handle_line(f"U,Speed,{value}")
+    assert client.get("/history").get_json() == {"series": ["Speed"]}
+    body = client.get(f"/history/Speed?from={start}&to={start + 60}&step=60").get_json()
+    [point] = body["points"]
+    assert (point["min"], point["max"], point["mean"]) == (3, 9, 6.0)
+    assert client.get("/history/Nope").status_code == 404
+    assert client.get("/history/Speed?step=soon").status_code == 400
+    assert client.get(f"/history/Speed?from={start}&to={start + 60}&step=0.001"
+                      ).status_code == 400
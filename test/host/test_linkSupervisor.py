@@ -0,0 +1,61 @@
+import time
+
+from panelEngine import PanelEngine, dispatch_line
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_a_failing_line_does_not_stop_the_reader():
+    engine = PanelEngine("/dev/null", 9600)
+
+    def broken(line):
+        raise RuntimeError("boom")
+
+    engine.handle_line = broken
+    dispatch_line(engine, "A,Speed")
+    assert "RuntimeError: boom" in engine.log_store.since()[-1]["line"]
+
+
+def test_reconnect_resyncs_and_replays_held_writes(board, engine, api):
+    panel = engine()
+    client = api({"default": panel})
+    panel.send_command("add:param,Speed,0,100,5")
+    assert wait_for(lambda: "Speed" in panel.snapshot_parameters())
+    assert client.get("/latency").status_code == 200
+
+    board.stop()  # unplugged
+    assert wait_for(lambda: panel.holding)
+    panel.send_command("add:param,Depth,0,9,3")
+    assert list(panel.held) == ["add:param,Depth,0,9,3"]
+    # The failed reader is kept, but it no longer reads anything.
+    latency = client.get("/latency")
+    assert latency.status_code == 503 and latency.get_json()["mode"] == "event"
+    link = client.get("/link").get_json()
+    assert link["state"] != "connected" and link["held_writes"] == 1
+
+    replacement = board()  # plugged back in, with an empty store
+    supervisor = panel.supervisor
+    assert wait_for(lambda: supervisor.state == "connected" and supervisor.reconnects == 1)
+    assert not panel.held
+    # The resync emptied the cache; the replayed add is on the new board.
+    assert wait_for(lambda: set(panel.snapshot_parameters()) == {"Depth"})
+    assert replacement.params.find("Depth") == ["Depth", 0, 9, 3]
+    assert client.get("/latency").status_code == 200
+
+
+def test_writes_fail_fast_once_the_held_queue_is_full(board, engine):
+    panel = engine()
+    board.stop()
+    assert wait_for(lambda: panel.holding)
+    for i in range(PanelEngine.MAX_HELD_WRITES):
+        panel.write(f"update:paramsCurval,Speed,{i}")
+    panel.send_command("update:paramsCurval,Speed,999")
+    assert len(panel.held) == PanelEngine.MAX_HELD_WRITES
+    assert "Error sending command" in panel.log_store.since()[-1]["line"]
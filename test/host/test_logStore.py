@@ -0,0 +1,32 @@
+from panelEngine import LogStore, PanelEngine
+
+
+def test_log_store_is_bounded_and_resumable():
+    log = LogStore(capacity=3)
+    for i in range(5):
+        log.append("info", f"line {i}")
+    assert [r["seq"] for r in log.since()] == [3, 4, 5]
+    assert [r["line"] for r in log.since(3)] == ["line 3", "line 4"]
+    assert [r["seq"] for r in log.since(2, limit=1)] == [3]
+    assert log.since(5) == []
+    # Sequence numbers keep counting across a clear.
+    log.clear()
+    log.append("in", "A,Speed")
+    assert [r["seq"] for r in log.since(5)] == [6]
+    assert LogStore.render(log.since()[0]) == "Received: A,Speed"
+
+
+def test_log_api_pages_with_a_cursor(api):
+    engine = PanelEngine("test", 9600)
+    client = api({"default": engine})
+    for i in range(5):
+        engine.log(f"step {i}", direction="out")
+    first = client.get("/log?limit=2").get_json()
+    assert [e["line"] for e in first["entries"]] == ["step 0", "step 1"]
+    assert first["log"] == "Sending: step 0\nSending: step 1\n"
+    rest = client.get(f"/log?since={first['next']}").get_json()
+    assert [e["line"] for e in rest["entries"]] == ["step 2", "step 3", "step 4"]
+    idle = client.get(f"/log?since={rest['next']}").get_json()
+    assert idle["entries"] == [] and idle["next"] == rest["next"]
+    assert client.get("/log?limit=0").status_code == 400
+    assert client.get("/log?since=x").status_code == 400
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from panelEngine import PanelEngine
+
+tk = pytest.importorskip("tkinter")
+
+
+@pytest.fixture
+def gui():
+    """The GUI on an engine that is never started; skipped without a display."""
+    from panelGui import ArduinoGUI
+    try:
+        gui = ArduinoGUI(PanelEngine("test", 9600))
+    except tk.TclError as e:
+        pytest.skip(f"Tk is not available: {e}")
+    gui.withdraw()
+    yield gui
+    gui.on_closing()
+
+
+def rows(gui):
+    return [tuple(str(v) for v in gui.tree.item(item, "values"))
+            for item in gui.tree.get_children()]
+
+
+def tree_syncs(gui):
+    return gui.engine.metrics.ui_update_seconds.snapshot()[2]
+
+
+def test_events_between_frames_cost_one_tree_sync(gui):
+    engine = gui.engine
+
+    def serial_thread():
+        engine.handle_line("A,Speed")
+        for value in range(100):
+            engine.handle_line(f"U,Speed,{value}")
+        engine.handle_line("S,software set to,Lathe")
+
+    reader = threading.Thread(target=serial_thread)
+    reader.start()
+    reader.join()
+    syncs = tree_syncs(gui)
+    gui.refresh()
+    assert tree_syncs(gui) == syncs + 1
+    assert rows(gui) == [("-", "Speed", "-", "-", "99")]
+    assert gui.current_software_label.cget("text") == "Lathe"
+
+
+def test_a_frame_without_events_touches_nothing(gui):
+    gui.engine.handle_line("A,Speed")
+    gui.refresh()
+    syncs = tree_syncs(gui)
+    gui.refresh()
+    assert tree_syncs(gui) == syncs
+
+
+def test_falling_behind_drops_events_but_not_values(gui):
+    engine = gui.engine
+    engine.handle_line("A,Speed")
+    for value in range(1000):
+        engine.handle_line(f"U,Speed,{value}")
+    gui.refresh()
+    assert engine.metrics.ui_dropped.value > 0
+    # The tree is synced from the store, so the newest value still shows.
+    assert rows(gui) == [("-", "Speed", "-", "-", "999")]
+
+
+def test_tree_updates_rows_in_place(gui):
+    engine = gui.engine
+    for line in ("L,0,a,0,10,1", "L,1,b,0,10,2", "L,2,c,0,10,3"):
+        engine.handle_line(line)
+    gui.update_parameter_list()
+    items = gui.tree.get_children()
+    assert len(items) == 3 and int(gui.tree["height"]) == 3
+
+    engine.handle_line("U,b,7")
+    gui.update_parameter_list()
+    # Same row items; only b's values changed.
+    assert gui.tree.get_children() == items
+    assert rows(gui) == [("0", "a", "0", "10", "1"), ("1", "b", "0", "10", "7"),
+                         ("2", "c", "0", "10", "3")]
+
+    engine.parameters.remove("a")
+    gui.update_parameter_list()
+    assert gui.tree.get_children() == items[1:] and int(gui.tree["height"]) == 2
+
+
+def test_clearing_empties_the_tree(gui):
+    gui.engine.handle_line("A,Speed")
+    gui.update_parameter_list()
+    gui.clear_parameters()
+    assert gui.tree.get_children() == () and int(gui.tree["height"]) == 1
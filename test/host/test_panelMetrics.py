@@ -0,0 +1,72 @@
+import threading
+import time
+
+from panelMetrics import Exposition, Histogram, SamplingProfiler, label_text
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.001, 0.01))
+    for seconds in (0.0005, 0.001, 0.005, 1.0):
+        histogram.observe(seconds)
+    buckets, total, count = histogram.snapshot()
+    assert buckets == [(0.001, 2), (0.01, 3), (float("inf"), 4)]
+    assert (round(total, 4), count) == (1.0065, 4)
+
+
+def test_exposition_text():
+    exposition = Exposition()
+    exposition.sample("panel_link_up", "gauge", "Link state.", 1, device='a"b')
+    exposition.histogram("panel_x_seconds", "X.", Histogram(buckets=(0.5,)), device="a")
+    assert exposition.render().splitlines() == [
+        "# HELP panel_link_up Link state.",
+        "# TYPE panel_link_up gauge",
+        'panel_link_up{device="a\\"b"} 1',
+        "# HELP panel_x_seconds X.",
+        "# TYPE panel_x_seconds histogram",
+        'panel_x_seconds_bucket{device="a",le="0.5"} 0',
+        'panel_x_seconds_bucket{device="a",le="+Inf"} 0',
+        'panel_x_seconds_sum{device="a"} 0.0',
+        'panel_x_seconds_count{device="a"} 0',
+    ]
+    assert label_text({}) == ""
+
+
+def test_metrics_count_the_link(engine, api):
+    panel = engine()
+    client = api({"default": panel})
+    client.post("/command?wait=1", json={"command": "get:paramCurval,Nope"})
+    client.post("/command", json={"command": "bogus"})
+    deadline = time.monotonic() + 2
+    while panel.metrics.firmware_errors.value < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'panel_link_up{device="default"} 1' in text
+    assert 'panel_firmware_errors_total{device="default"} 1' in text
+    assert 'panel_line_handling_seconds_count{device="default",prefix="G"}' in text
+    assert ('panel_http_request_seconds_count{route="/command",method="POST",status="502"}'
+            in text)
+    lines_out = [line for line in text.splitlines()
+                 if line.startswith('panel_serial_lines_total{device="default",direction="out"}')]
+    assert int(lines_out[0].split()[1]) >= 2
+
+
+def test_profiler_samples_the_target_thread():
+    stop = threading.Event()
+
+    def busy_loop_for_profiler():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_loop_for_profiler)
+    worker.start()
+    profiler = SamplingProfiler(lambda: {"worker": worker}, interval=0.001)
+    try:
+        profiler.start()
+        time.sleep(0.2)
+        profiler.stop()
+    finally:
+        stop.set()
+        worker.join()
+    assert profiler.status()["samples"] > 0
+    folded = profiler.folded()
+    assert folded.startswith("worker;") and "busy_loop_for_profiler" in folded
@@ -0,0 +1,173 @@
+import random
+import threading
+
+import pytest
+
+from firmwareEmulator import ParameterSlots
+from panelEngine import pipeline_commands
+from panelProfiles import (MAX_PARAMS, ProfileStore, Slot, apply_profile, next_slot,
+                           plan_profile, profile_differences, profile_parameters)
+
+
+def board(*slots):
+    return list(slots) + [None] * (MAX_PARAMS - len(slots))
+
+
+FULL = board(*(Slot(name, 0, 10, i) for i, name in enumerate("abcde")))
+
+
+def run_plan(slots, head, plan):
+    """Apply a plan's commands to the firmware's circular store."""
+    store = ParameterSlots()
+    for i, slot in enumerate(slots):
+        if slot is not None:
+            store.params[i] = [slot.name, slot.min, slot.max, slot.current]
+    store.count = sum(slot is not None for slot in slots)
+    store.head = head
+    for cmd in plan["commands"]:
+        verb, _, args = cmd.partition(",")
+        if verb == "add:param":
+            name, low, high, current = args.split(",")
+            store.add(name, int(low), int(high), int(current))
+        else:
+            name, value = args.split(",")
+            store.update(name, int(value))
+    return [Slot(*store.params[i]) if i < store.count else None for i in range(MAX_PARAMS)]
+
+
+def test_matching_board_needs_nothing():
+    plan = plan_profile(FULL, 0, [FULL[1], FULL[3]])
+    assert plan["commands"] == [] and plan["conflicts"] == []
+
+
+def test_changed_value_is_one_update():
+    plan = plan_profile(FULL, 0, [FULL[0]._replace(current=9)])
+    assert plan["commands"] == ["update:paramsCurval,a,9"]
+
+
+def test_add_into_full_store_re_adds_the_kept_parameter_it_overwrites():
+    # The next add lands on slot 2, which holds "c", a profile parameter.
+    profile = [FULL[2], Slot("x", 0, 1, 1)]
+    plan = plan_profile(FULL, 2, profile)
+    assert plan["commands"] == ["add:param,x,0,1,1", "add:param,c,0,10,2"]
+    assert plan["evicted"] == ["d"]
+    assert profile_differences(run_plan(FULL, 2, plan), profile) == {}
+
+
+def test_entirely_new_profile_replaces_the_whole_store():
+    profile = [Slot(name, 0, 5, 1) for name in "vwxyz"]
+    plan = plan_profile(FULL, 3, profile)
+    assert len(plan["commands"]) == MAX_PARAMS
+    assert sorted(plan["evicted"]) == list("abcde")
+    assert profile_differences(run_plan(FULL, 3, plan), profile) == {}
+
+
+def test_changed_bounds_with_free_slots_is_a_conflict():
+    slots = board(Slot("a", 0, 10, 1), Slot("b", 0, 10, 2))
+    plan = plan_profile(slots, 2, [Slot("a", 0, 20, 1)])
+    assert plan["conflicts"] == ["a"]
+
+
+def test_plans_reach_the_profile_on_random_boards():
+    rng = random.Random(7)
+    names = "abcdefg"
+    for _ in range(500):
+        count = rng.randint(0, MAX_PARAMS)
+        slots = board(*(Slot(rng.choice(names), 0, rng.choice((5, 10)), rng.randint(0, 5))
+                        for _ in range(count)))
+        head = count % MAX_PARAMS if count < MAX_PARAMS else rng.randrange(MAX_PARAMS)
+        profile = [Slot(name, 0, rng.choice((5, 10)), rng.randint(0, 5))
+                   for name in rng.sample(names, rng.randint(1, MAX_PARAMS))]
+        plan = plan_profile(slots, head, profile)
+        left = profile_differences(run_plan(slots, head, plan), profile)
+        assert set(left) <= set(plan["conflicts"]), (slots, head, profile, plan)
+
+
+def test_next_slot():
+    assert next_slot(board(FULL[0]), None) == 1
+    assert next_slot(FULL, "c") == 3
+    assert next_slot(FULL, "e") == 0
+    assert next_slot(FULL, None) is None
+
+
+def test_profile_validation():
+    with pytest.raises(ValueError):
+        profile_parameters([{"name": "a,b", "min": 0, "max": 1, "current": 0}])
+    with pytest.raises(ValueError):
+        profile_parameters([{"name": "a", "min": 2, "max": 1, "current": 0}])
+    with pytest.raises(ValueError):
+        profile_parameters([{"name": n, "min": 0, "max": 1, "current": 0} for n in "abcdef"])
+    # Names are cut to the firmware's 14 characters; values clamped to bounds.
+    [p] = profile_parameters([{"name": "A" * 20, "min": 0, "max": 5, "current": 9}])
+    assert p == Slot("A" * 14, 0, 5, 5)
+
+
+def test_profile_store(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles"))
+    assert store.names() == []
+    store.save("job-1", [{"name": "Speed", "min": 0, "max": 9, "current": 3}])
+    assert store.names() == ["job-1"]
+    assert store.load("job-1")["parameters"] == [
+        {"name": "Speed", "min": 0, "max": 9, "current": 3}]
+    with pytest.raises(ValueError):
+        store.save("../escape", [])
+    store.delete("job-1")
+    with pytest.raises(KeyError):
+        store.load("job-1")
+
+
+def test_apply_profile_against_emulator(engine):
+    panel = engine()
+    # Paced by pipeline_commands, so the board's 64-byte RX buffer keeps up.
+    pipeline_commands(panel.command_tracker, panel.send_command,
+                      [f"add:param,{name},0,10,1" for name in "abcde"],
+                      cost=panel.wire_cost)
+    profile = {"name": "job", "parameters": [
+        {"name": "c", "min": 0, "max": 10, "current": 7},
+        {"name": "x", "min": 0, "max": 3, "current": 2}]}
+    report = apply_profile(panel, profile)
+    assert report["verified"] and report["confirmed"]
+    # The next add lands on slot 0 ("a"), so only x is added and c updated.
+    assert report["commands"] == ["add:param,x,0,3,2", "update:paramsCurval,c,7"]
+    again = apply_profile(panel, profile)
+    assert again["commands"] == [] and again["verified"]
+
+
+def test_concurrent_sweeps_take_turns(engine):
+    panel = engine()
+    pipeline_commands(panel.command_tracker, panel.send_command,
+                      [f"add:param,{name},0,10,1" for name in "abcde"],
+                      cost=panel.wire_cost)
+    results = []
+
+    def sweep():
+        results.append(panel.sweep_board())
+
+    threads = [threading.Thread(target=sweep) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 4
+    for listed in results:
+        assert [message.name for message in listed] == list("abcde")
+
+
+def test_profile_routes(engine, api):
+    panel = engine()
+    client = api({"default": panel})
+    pipeline_commands(panel.command_tracker, panel.send_command,
+                      ["add:param,Speed,0,100,5", "add:param,Depth,0,9,3"],
+                      cost=panel.wire_cost)
+    saved = client.post("/profiles/job/snapshot")
+    assert saved.status_code == 200
+    assert client.get("/profiles").get_json() == {"profiles": ["job"]}
+    client.put("/parameter/Speed?wait=1", json={"new_value": 50})
+    diff = client.get("/profiles/job/diff").get_json()
+    assert diff["commands"] == ["update:paramsCurval,Speed,5"]
+    applied = client.post("/profiles/job/apply")
+    assert applied.status_code == 200 and applied.get_json()["verified"]
+    assert client.get("/profiles/job/diff").get_json()["commands"] == []
+    assert client.get("/profiles/nope/diff").status_code == 404
+    assert client.put("/profiles/bad", json={}).status_code == 400
+    assert client.delete("/profiles/job").status_code == 200
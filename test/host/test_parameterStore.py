@@ -0,0 +1,63 @@
+import json
+
+from panelEngine import PanelEngine, ParameterStore
+
+
+def test_version_moves_only_on_change():
+    store = ParameterStore()
+    assert store.update("Speed", current=5) is True
+    version = store.version
+    assert store.update("Speed", current=5) is False
+    assert store.version == version
+    assert store.update("Speed", current=6, min=0) is True
+    assert store.version == version + 1
+    assert store.get("Speed") == (version + 1, {"index": None, "min": 0,
+                                                "max": None, "current": 6})
+    assert store.remove("Nope") is False
+    store.clear()
+    assert store.snapshot() == (version + 2, {})
+    store.clear()
+    assert store.version == version + 2
+
+
+def test_json_is_rebuilt_only_when_the_version_moves():
+    store = ParameterStore()
+    store.update("Speed", current=5)
+    version, body = store.to_json()
+    assert json.loads(body) == {"Speed": {"index": None, "min": None,
+                                          "max": None, "current": 5}}
+    store.update("Speed", current=5)
+    assert store.to_json()[1] is body
+    store.update("Speed", current=6)
+    assert store.to_json() == (version + 1, body.replace("5", "6"))
+
+
+def test_parameters_answer_304_until_something_changes(api):
+    panel = PanelEngine("/dev/null", 9600)
+    client = api({"default": panel})
+    panel.handle_line("L,0,Speed,0,100,5")
+    first = client.get("/parameters")
+    assert first.status_code == 200 and first.get_json()["Speed"]["current"] == 5
+    etag = first.headers["ETag"]
+    again = client.get("/parameters", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    # An unchanged value does not invalidate clients' copies.
+    panel.handle_line("U,Speed,5")
+    assert client.get("/parameters", headers={"If-None-Match": etag}).status_code == 304
+    panel.handle_line("U,Speed,6")
+    changed = client.get("/parameters", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+
+def test_one_parameter_has_its_own_etag(api):
+    panel = PanelEngine("/dev/null", 9600)
+    client = api({"default": panel})
+    panel.handle_line("L,0,Speed,0,100,5")
+    panel.handle_line("L,1,Depth,0,9,3")
+    speed = client.get("/parameter/Speed")
+    assert speed.get_json() == {"Speed": {"index": 0, "min": 0, "max": 100, "current": 5}}
+    panel.handle_line("U,Depth,4")
+    # Only Speed's own changes count.
+    assert client.get("/parameter/Speed",
+                      headers={"If-None-Match": speed.headers["ETag"]}).status_code == 304
+    assert client.get("/parameter/Nope").status_code == 404
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from panelEngine import PinChannel, pin_command
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_pin_names():
+    assert pin_command("a0") == ("A0", "read:analog,0")
+    assert pin_command("D13") == ("D13", "read:digital,13")
+    assert pin_command("D07") == ("D7", "read:digital,7")
+    for pin in ("A6", "D1", "D14", "X2", "A", "A-1"):
+        with pytest.raises(ValueError):
+            pin_command(pin)
+
+
+def test_ring_buffer_keeps_the_newest_samples():
+    channel = PinChannel("A0", "read:analog,0", 10, capacity=3, cost=14)
+    for value in range(5):
+        channel.add_sample(time.perf_counter(), value)
+    assert [s["value"] for s in channel.since()] == [2, 3, 4]
+    assert [s["value"] for s in channel.since(limit=1)] == [4]
+    assert channel.since(time.time() + 1) == []
+    stats = channel.stats()
+    assert (stats["samples"], stats["buffered"], stats["capacity"]) == (5, 3, 3)
+
+
+def test_sampler_reads_the_board(engine, api):
+    panel = engine()
+    client = api({"default": panel})
+    assert client.put("/sampler/A0", json={"rate_hz": 50, "capacity": 10}).status_code == 200
+    assert client.put("/sampler/D2", json={"rate_hz": 20}).status_code == 200
+    sampler = panel.pin_sampler
+    assert wait_for(lambda: sampler.channel("A0").count >= 20)
+    body = client.get("/sampler/A0/samples?limit=5").get_json()
+    assert len(body["samples"]) == 5 and all(0 <= s["value"] <= 1023 for s in body["samples"])
+    assert body["stats"]["buffered"] == 10
+    # The button pin is pulled up.
+    assert {s["value"] for s in sampler.channel("D2").since()} == {1}
+    stats = client.get("/sampler").get_json()
+    assert stats["in_flight_bytes"] <= stats["window_bytes"]
+    assert client.delete("/sampler/A0").status_code == 200
+    assert client.get("/sampler/A0/samples").status_code == 404
+    assert client.put("/sampler/A9", json={"rate_hz": 5}).status_code == 400
+    assert client.put("/sampler/A1", json={"rate_hz": 0}).status_code == 400
+
+
+def test_requests_are_charged_their_framed_size(engine):
+    panel = engine(binary_baud=57600)
+    assert panel.codec is not None
+    channel = panel.pin_sampler.add("A0", 50, capacity=10)
+    # Shared with the update throttler and /batch, so one window fits all.
+    assert channel.cost == panel.wire_cost("read:analog,0") < len("read:analog,0") + 1
+    assert wait_for(lambda: channel.count >= 10)
+    demand = panel.pin_sampler.stats()["demand_bytes_per_s"]
+    assert demand == pytest.approx(channel.cost * 50)
@@ -0,0 +1,53 @@
+import threading
+
+from panelEngine import CommandTracker, pipeline_commands
+
+
+def test_window_caps_unanswered_bytes():
+    tracker = CommandTracker()
+    peak = []
+
+    def send(cmd):
+        # The board answers a little later, like the real one.
+        peak.append(sum(len(p.command) + 1 for p in list(tracker.pending)))
+        name = cmd.split(",")[1]
+        threading.Timer(0.01, tracker.resolve, [f"G,{name},{name[1:]}"]).start()
+
+    commands = [f"get:paramCurval,p{i}" for i in range(20)]
+    results = pipeline_commands(tracker, send, commands, window_bytes=64)
+    assert [r["value"] for r in results] == list(range(20))
+    assert max(peak) <= 64
+
+
+def test_pipeline_forgets_timed_out_commands():
+    tracker = CommandTracker()
+    results = pipeline_commands(tracker, lambda cmd: None,
+                                [f"get:paramCurval,p{i}" for i in range(8)], timeout=0.05,
+                                window_bytes=40)
+    assert {r["status"] for r in results} == {"Timeout"}
+    assert not tracker.pending
+
+
+def test_batch_fills_the_board_without_overruns(board, engine, api):
+    emulator = board()
+    client = api({"default": engine()})
+    operations = ([{"op": "add", "name": f"P{i}", "min": 0, "max": 100, "current": i}
+                   for i in range(5)]
+                  + [{"op": "update", "name": f"P{i}", "new_value": 50 + i} for i in range(5)]
+                  + [{"op": "get", "name": "P4"}, {"op": "get", "name": "Nope"}]
+                  + [{"op": "set_software", "software_name": "Lathe"}])
+    response = client.post("/batch", json={"operations": operations})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [r["status"] for r in results] == ["Confirmed"] * 11 + ["Error", "Confirmed"]
+    assert results[10]["reply"] == "G,P4,54"
+    assert emulator.rx_overruns == 0
+
+
+def test_batch_rejects_bad_operations(engine, api):
+    client = api({"default": engine()})
+    assert client.post("/batch", json={"operations": []}).status_code == 400
+    response = client.post("/batch", json=[{"op": "add", "name": "Speed"}])
+    assert response.status_code == 400
+    assert response.get_json()["error"] == \
+        "Invalid operation: add needs name, min, max and current"
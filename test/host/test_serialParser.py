@@ -0,0 +1,57 @@
+import pytest
+
+from serialParser import (BoardError, FramingChanged, ParameterAdded, ParameterListed,
+                          ParameterNotFound, ParameterSelected, ParameterValue, PinReading,
+                          SoftwareSet, Unrecognized, parse_buffer, parse_line)
+
+
+@pytest.mark.parametrize("line, message", [
+    ("A,Speed", ParameterAdded("Speed")),
+    ("A,3,512", PinReading("analog", 3, 512)),
+    ("D,2,1", PinReading("digital", 2, 1)),
+    ("U,Speed,-5", ParameterValue("U", "Speed", -5)),
+    ("G,Speed,100", ParameterValue("G", "Speed", 100)),
+    ("G,Nope,ERROR", ParameterNotFound("G", "Nope")),
+    ("S,0,Speed,8", ParameterSelected(0, "Speed", 8)),
+    ("S,software set to,Lathe", SoftwareSet("Lathe")),
+    ("S, Software Set To , Lathe ", SoftwareSet("Lathe")),
+    ("L,1,Depth,0,9,3", ParameterListed(1, "Depth", 0, 9, 3)),
+    ("ERR,Unknown command", BoardError("Unknown command")),
+    ("B,57600", FramingChanged("binary", 57600)),
+    ("T", FramingChanged("text", None)),
+])
+def test_each_message_type(line, message):
+    parsed = parse_line(line)
+    assert parsed == message and type(parsed) is type(message)
+
+
+def test_names_are_never_numbers():
+    # Digits-only names are still names; the A forms differ in field count.
+    assert parse_line("A,123") == ParameterAdded("123")
+    assert parse_line("U,007,5") == ParameterValue("U", "007", 5)
+    assert parse_line("L,0,12,0,9,1").name == "12"
+    # The value is the last field, so a name may hold commas.
+    assert parse_line("U,a,b,5") == ParameterValue("U", "a,b", 5)
+
+
+@pytest.mark.parametrize("line", ["", "Lathe", "U,Speed,fast", "D,x,1", "X,1", "L,0,a,0,9"])
+def test_anything_else_is_unrecognized(line):
+    assert parse_line(line) == Unrecognized(line)
+
+
+def test_events():
+    assert parse_line("U,Speed,5").event() == {
+        "type": "parameter", "source": "U", "name": "Speed", "current": 5}
+    assert parse_line("D,2,0").event() == {
+        "type": "pin", "kind": "digital", "pin": 2, "value": 0}
+    assert parse_line("A,1,7").event() == {
+        "type": "pin", "kind": "analog", "index": 1, "value": 7}
+    for line in ("G,Nope,ERROR", "ERR,x", "T", "junk"):
+        assert parse_line(line).event() is None
+
+
+def test_buffers_parse_in_one_call():
+    assert parse_buffer(b"A,Speed\r\n\r\nU,Speed,7\nD,2,1") == [
+        ParameterAdded("Speed"), ParameterValue("U", "Speed", 7),
+        PinReading("digital", 2, 1)]
+    assert parse_buffer("G,a,1\n") == [ParameterValue("G", "a", 1)]
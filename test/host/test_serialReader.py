@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from panelEngine import LineLatency, LineSplitter, pipeline_commands
+
+
+def test_splitter_keeps_partial_lines():
+    splitter = LineSplitter()
+    assert splitter.feed(b"A,Spe") == []
+    assert splitter.feed(b"ed\nU,Speed,") == [b"A,Speed"]
+    assert splitter.feed(b"7\nG,a,1\nG,b,2\n") == [b"U,Speed,7", b"G,a,1", b"G,b,2"]
+    assert splitter.pending == b""
+
+
+def test_splitter_drops_runaway_garbage():
+    splitter = LineSplitter(max_pending=16)
+    assert splitter.feed(b"x" * 20) == []
+    assert splitter.feed(b"yz\nA,Speed\n") == [b"yz", b"A,Speed"]
+
+
+def test_latency_summary():
+    latency = LineLatency(maxlen=3)
+    assert latency.summary()["count"] == 0
+    for seconds in (0.004, 0.001, 0.002, 0.003):
+        latency.record(seconds)
+    # Only the newest maxlen samples count.
+    summary = latency.summary()
+    assert (summary["count"], summary["p50_ms"], summary["max_ms"]) == (3, 2.0, 3.0)
+
+
+@pytest.mark.parametrize("mode", ["event", "poll"])
+def test_reader_delivers_every_line(engine, mode):
+    panel = engine(reader_mode=mode)
+    names = [f"P{i}" for i in range(5)]
+    results = pipeline_commands(panel.command_tracker, panel.send_command,
+                                [f"add:param,{name},0,100,{i}" for i, name in enumerate(names)])
+    assert [r["status"] for r in results] == ["Confirmed"] * 5
+    # The listing arrives as one burst, several lines per read.
+    panel.send_command("get:AlladdedParams")
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if all(panel.snapshot_parameters().get(n, {}).get("index") is not None for n in names):
+            break
+        time.sleep(0.05)
+    assert [panel.snapshot_parameters()[n]["index"] for n in names] == list(range(5))
+    reader = panel.serial_reader
+    assert reader.mode == mode and reader.latency.summary()["count"] >= 10
+
+
+def test_event_reader_answers_faster_than_the_poll_interval(engine):
+    panel = engine(reader_mode="event")
+    tracker = panel.command_tracker
+    for _ in range(5):
+        pending = tracker.expect("get:paramCurval,Nope")
+        panel.send_command("get:paramCurval,Nope")
+        pending.future.exception(timeout=2)
+    # The poll loop checks every 100 ms; the event reader wakes on arrival.
+    assert panel.serial_reader.latency.summary()["max_ms"] < 50
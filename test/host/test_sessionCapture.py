@@ -0,0 +1,69 @@
+import gzip
+
+import pytest
+
+from panelEngine import PanelEngine
+from sessionCapture import ReplayDriver, SessionCapture, load_capture
+
+SESSION = [("o", "add:param,Speed,0,100,5"), ("i", "A,Speed")] + [
+    ("i", f"U,Speed,{value}") for value in range(200)]
+
+
+def write_capture(path):
+    capture = SessionCapture(str(path), port="/dev/ttyUSB0", baud=9600)
+    for direction, line in SESSION:
+        capture.record(direction, line)
+    capture.close()
+    return capture
+
+
+@pytest.mark.parametrize("name", ["session.txt", "session.txt.gz"])
+def test_capture_round_trip(tmp_path, name):
+    capture = write_capture(tmp_path / name)
+    assert capture.count == len(SESSION)
+    header, records = load_capture(str(tmp_path / name))
+    assert header["port"] == "/dev/ttyUSB0" and header["baud"] == 9600
+    assert [(d, line) for _, d, line in records] == SESSION
+    times = [at for at, _, _ in records]
+    assert times == sorted(times)
+
+
+def test_truncated_gz_loads_what_was_flushed(tmp_path):
+    path = tmp_path / "session.txt.gz"
+    write_capture(path)
+    data = path.read_bytes()
+    # A process killed mid-write leaves a gzip stream with no end marker,
+    # possibly cut inside a record.
+    path.write_bytes(data[:len(data) * 2 // 3])
+    _, records = load_capture(str(path))
+    assert records
+    assert [(d, line) for _, d, line in records] == SESSION[:len(records)]
+
+
+def test_truncated_text_drops_the_partial_record(tmp_path):
+    path = tmp_path / "session.txt"
+    write_capture(path)
+    path.write_bytes(path.read_bytes()[:-3])
+    _, records = load_capture(str(path))
+    assert [(d, line) for _, d, line in records] == SESSION[:-1]
+
+
+def test_other_files_are_refused(tmp_path):
+    path = tmp_path / "other.txt.gz"
+    with gzip.open(path, "wt") as f:
+        f.write("time,value\n")
+    with pytest.raises(ValueError):
+        load_capture(str(path))
+
+
+def test_replay_feeds_an_unstarted_engine(tmp_path):
+    write_capture(tmp_path / "session.txt")
+    _, records = load_capture(str(tmp_path / "session.txt"))
+    engine = PanelEngine("/dev/null", 9600)
+    replay = ReplayDriver(engine, records, speed=None)
+    replay.start()
+    replay.join(timeout=10.0)
+    report = replay.report()
+    assert (report["lines_in"], report["lines_out"]) == (len(SESSION) - 1, 1)
+    assert report["unrecognized"] == 0
+    assert engine.snapshot_parameters()["Speed"]["current"] == 199
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from panelEngine import UpdateThrottler, pipeline_commands
+
+
+def drained(throttler, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while throttler.stats()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # The last slot is popped just before it is written.
+    time.sleep(0.05)
+    return not throttler.stats()["pending"]
+
+
+def test_newest_value_wins():
+    sent = []
+    throttler = UpdateThrottler(sent.append, 115200, log=lambda message: None)
+    assert throttler.submit("Speed", 1) is False
+    assert throttler.submit("Depth", 1) is False
+    assert throttler.submit("Speed", 2) is True
+    assert throttler.submit("Speed", 3) is True
+    throttler.start()
+    assert drained(throttler)
+    throttler.stop()
+    # Speed keeps its place in line but carries the newest value.
+    assert sent == ["update:paramsCurval,Speed,3", "update:paramsCurval,Depth,1"]
+    stats = throttler.stats()
+    assert (stats["submitted"], stats["sent"], stats["coalesced"]) == (4, 2, 2)
+
+
+def test_writes_are_paced_to_the_link():
+    sent = []
+    throttler = UpdateThrottler(sent.append, 9600, log=lambda message: None)
+    for i in range(10):
+        throttler.submit(f"P{i}", 100)
+    started = time.perf_counter()
+    throttler.start()
+    assert drained(throttler)
+    throttler.stop()
+    # 10 x 27 bytes at 480 B/s, less the 64-byte burst.
+    assert len(sent) == 10
+    assert time.perf_counter() - started > (270 - 64) / 480 * 0.8
+
+
+def test_supersede_drops_the_queued_value():
+    sent = []
+    throttler = UpdateThrottler(sent.append, 115200, log=lambda message: None)
+    throttler.submit("Speed", 1)
+    assert throttler.supersede("Speed") is True
+    assert throttler.supersede("Speed") is False
+    throttler.start()
+    time.sleep(0.05)
+    throttler.stop()
+    assert sent == [] and throttler.stats()["coalesced"] == 1
+
+
+def test_failed_updates_are_dropped():
+    logged = []
+
+    def send(cmd):
+        raise OSError("port closed")
+
+    throttler = UpdateThrottler(send, 115200, log=logged.append)
+    throttler.submit("Speed", 1)
+    throttler.start()
+    assert drained(throttler)
+    throttler.stop()
+    assert logged == ["Dropped update update:paramsCurval,Speed,1: port closed"]
+    assert throttler.stats()["dropped"] == 1
+
+
+def test_stop_drops_queued_updates():
+    sent = []
+    release = threading.Event()
+
+    def send(cmd):
+        release.wait(5)
+        sent.append(cmd)
+
+    throttler = UpdateThrottler(send, 115200, log=lambda message: None)
+    throttler.submit("Speed", 1)
+    throttler.start()
+    time.sleep(0.05)
+    throttler.submit("Depth", 2)  # queued behind the blocked write
+    throttler.stop()
+    release.set()
+    throttler.join(timeout=1)
+    assert sent == ["update:paramsCurval,Speed,1"]
+    stats = throttler.stats()
+    assert (stats["dropped"], stats["pending"]) == (1, 0)
+
+
+def test_board_converges_to_the_last_put(engine, api):
+    panel = engine()
+    client = api({"default": panel})
+    pipeline_commands(panel.command_tracker, panel.send_command,
+                      ["add:param,Speed,0,100,0"])
+    replies = [client.put("/parameter/Speed", json={"new_value": value}).get_json()
+               for value in range(1, 31)]
+    assert all(r["status"] == "Command queued" for r in replies)
+    assert drained(panel.update_throttler)
+    result = client.post("/command?wait=1", json={"command": "get:paramCurval,Speed"})
+    assert result.get_json()["reply"] == "G,Speed,30"
+    stats = client.get("/updates/stats").get_json()
+    assert stats["submitted"] == 30
+    assert stats["sent"] + stats["coalesced"] == 30
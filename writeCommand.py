@@ -1,407 +1,48 @@
-import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
-import serial
+import argparse
+import asyncio
+import json
+import os
+import sys
 import threading
 import time
-from flask import Flask, request, jsonify
-
-# Global variable to hold the GUI instance for API access.
-gui_instance = None
-
-
-class SerialReader(threading.Thread):
-    def __init__(self, ser, app):
-        super().__init__()
-        self.ser = ser
-        self.app = app  # reference to the main GUI app (to update UI)
-        self.running = True
-        self.daemon = True  # exit when main program closes
-
-    def run(self):
-        while self.running:
-            if self.ser.in_waiting:
-                try:
-                    line = self.ser.readline().decode("utf-8", errors="ignore").strip()
-                    if line:
-                        self.app.process_serial_line(line)
-                except Exception as e:
-                    self.app.log_message(f"Serial read error: {e}")
-            time.sleep(0.1)
-
-    def stop(self):
-        self.running = False
-
-
-class ArduinoGUI(tk.Tk):
-    def __init__(self, serial_port, baud_rate):
-        super().__init__()
-        self.title("Arduino Parameter Control GUI")
-        self.geometry("900x700")
-        self.protocol("WM_DELETE_WINDOW", self.on_closing)
-
-        # Instance variable to store parameters.
-        # Keys are parameter names; values are dicts with keys: index, min, max, current.
-        self.parameters = {}
-
-        # Open serial connection.
-        try:
-            self.ser = serial.Serial(serial_port, baud_rate, timeout=1)
-        except Exception as e:
-            messagebox.showerror("Serial Connection Error",
-                                 f"Could not open {serial_port}: {e}")
-            self.destroy()
-            return
-
-        # Allow Arduino to reset.
-        time.sleep(2)
-
-        # Initialize software name variable.
-        self.software_name = "Unknown"
-
-        # Create UI elements.
-        self.create_widgets()
-
-        # Start serial reader thread.
-        self.serial_reader = SerialReader(self.ser, self)
-        self.serial_reader.start()
-
-    def create_widgets(self):
-        # Top frame: Connection Status
-        top_frame = ttk.Frame(self, padding=10)
-        top_frame.pack(fill=tk.X)
-        self.connection_label = ttk.Label(
-            top_frame, text=f"Connected to {self.ser.port} at {self.ser.baudrate}")
-        self.connection_label.pack(side=tk.LEFT)
-
-        # Dedicated bar for reading pins.
-        read_pin_frame = ttk.Frame(self, padding=(10, 5))
-        read_pin_frame.pack(fill=tk.X)
-        ttk.Label(read_pin_frame, text="Pin Type:").grid(
-            row=0, column=0, padx=5, pady=5, sticky=tk.W)
-        self.pin_type = tk.StringVar(value="Digital")
-        digital_rb = ttk.Radiobutton(
-            read_pin_frame, text="Digital", variable=self.pin_type, value="Digital", command=self.update_pin_options)
-        analog_rb = ttk.Radiobutton(
-            read_pin_frame, text="Analog", variable=self.pin_type, value="Analog", command=self.update_pin_options)
-        digital_rb.grid(row=0, column=1, padx=5, pady=5)
-        analog_rb.grid(row=0, column=2, padx=5, pady=5)
-
-        ttk.Label(read_pin_frame, text="Select Pin:").grid(
-            row=0, column=3, padx=5, pady=5, sticky=tk.W)
-        self.pin_select = ttk.Combobox(read_pin_frame, state="readonly")
-        self.pin_select.grid(row=0, column=4, padx=5, pady=5)
-        self.update_pin_options()  # Populate with default (Digital) options
-
-        read_btn = ttk.Button(
-            read_pin_frame, text="Read Pin", command=self.read_pin)
-        read_btn.grid(row=0, column=5, padx=5, pady=5)
-
-        ttk.Label(read_pin_frame, text="Reading Result:").grid(
-            row=0, column=6, padx=5, pady=5, sticky=tk.W)
-        self.pin_result_label = ttk.Label(read_pin_frame, text="N/A")
-        self.pin_result_label.grid(row=0, column=7, padx=5, pady=5)
-
-        # Main PanedWindow: Left for parameters, right for tabs.
-        main_pane = ttk.Panedwindow(self, orient=tk.HORIZONTAL)
-        main_pane.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
-
-        # Left Frame: Parameter List inside a labeled frame.
-        left_frame = ttk.Labelframe(
-            main_pane, text="Parameters", padding=10, width=300)
-        left_frame.pack_propagate(False)
-        self.tree = ttk.Treeview(left_frame, columns=(
-            "Index", "Name", "Min", "Max", "Current"), show="headings")
-        for col, width in zip(("Index", "Name", "Min", "Max", "Current"), (50, 100, 60, 60, 60)):
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=width, anchor=tk.CENTER)
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        clear_params_btn = ttk.Button(
-            left_frame, text="Clear Parameter List", command=self.clear_parameters)
-        clear_params_btn.pack(pady=5)
-        main_pane.add(left_frame, weight=1)
-
-        # Right Frame: Notebook for various tabs.
-        right_frame = ttk.Frame(main_pane, padding=10)
-        main_pane.add(right_frame, weight=3)
-
-        self.notebook = ttk.Notebook(right_frame)
-        self.notebook.pack(fill=tk.BOTH, expand=True)
-
-        # Tab 1: Add Parameter
-        add_tab = ttk.Frame(self.notebook, padding=10)
-        self.notebook.add(add_tab, text="Add Parameter")
-        ttk.Label(add_tab, text="Name:").grid(
-            row=0, column=0, sticky=tk.W, padx=5, pady=5)
-        self.add_name = ttk.Entry(add_tab)
-        self.add_name.grid(row=0, column=1, padx=5, pady=5)
-        ttk.Label(add_tab, text="Min:").grid(
-            row=1, column=0, sticky=tk.W, padx=5, pady=5)
-        self.add_min = ttk.Entry(add_tab)
-        self.add_min.grid(row=1, column=1, padx=5, pady=5)
-        ttk.Label(add_tab, text="Max:").grid(
-            row=2, column=0, sticky=tk.W, padx=5, pady=5)
-        self.add_max = ttk.Entry(add_tab)
-        self.add_max.grid(row=2, column=1, padx=5, pady=5)
-        ttk.Label(add_tab, text="Current:").grid(
-            row=3, column=0, sticky=tk.W, padx=5, pady=5)
-        self.add_current = ttk.Entry(add_tab)
-        self.add_current.grid(row=3, column=1, padx=5, pady=5)
-        add_btn = ttk.Button(add_tab, text="Add Parameter",
-                             command=self.add_parameter)
-        add_btn.grid(row=4, column=0, columnspan=2, pady=10)
-
-        # Tab 2: Update Parameter
-        update_tab = ttk.Frame(self.notebook, padding=10)
-        self.notebook.add(update_tab, text="Update Parameter")
-        ttk.Label(update_tab, text="Name:").grid(
-            row=0, column=0, sticky=tk.W, padx=5, pady=5)
-        self.update_name = ttk.Entry(update_tab)
-        self.update_name.grid(row=0, column=1, padx=5, pady=5)
-        ttk.Label(update_tab, text="New Value:").grid(
-            row=1, column=0, sticky=tk.W, padx=5, pady=5)
-        self.update_value = ttk.Entry(update_tab)
-        self.update_value.grid(row=1, column=1, padx=5, pady=5)
-        update_btn = ttk.Button(
-            update_tab, text="Update Value", command=self.update_parameter)
-        update_btn.grid(row=2, column=0, columnspan=2, pady=10)
-
-        # Tab 3: Get Parameter
-        get_tab = ttk.Frame(self.notebook, padding=10)
-        self.notebook.add(get_tab, text="Get Parameter")
-        ttk.Label(get_tab, text="Name:").grid(
-            row=0, column=0, sticky=tk.W, padx=5, pady=5)
-        self.get_name = ttk.Entry(get_tab)
-        self.get_name.grid(row=0, column=1, padx=5, pady=5)
-        get_btn = ttk.Button(
-            get_tab, text="Get Current Value", command=self.get_parameter)
-        get_btn.grid(row=1, column=0, columnspan=2, pady=10)
-
-        # Tab 4: Manual Command
-        manual_tab = ttk.Frame(self.notebook, padding=10)
-        self.notebook.add(manual_tab, text="Manual Command")
-        ttk.Label(manual_tab, text="Command:").grid(
-            row=0, column=0, sticky=tk.W, padx=5, pady=5)
-        self.manual_cmd = ttk.Entry(manual_tab, width=40)
-        self.manual_cmd.grid(row=0, column=1, padx=5, pady=5)
-        manual_btn = ttk.Button(manual_tab, text="Send",
-                                command=self.send_manual_command)
-        manual_btn.grid(row=1, column=0, columnspan=2, pady=10)
-        refresh_btn = ttk.Button(
-            manual_tab, text="Refresh Parameter List", command=self.refresh_parameters)
-        refresh_btn.grid(row=2, column=0, columnspan=2, pady=10)
-
-        # Tab 5: Software Settings
-        software_tab = ttk.Frame(self.notebook, padding=10)
-        self.notebook.add(software_tab, text="Software")
-        ttk.Label(software_tab, text="Software Name:").grid(
-            row=0, column=0, sticky=tk.W, padx=5, pady=5)
-        self.software_entry = ttk.Entry(software_tab)
-        self.software_entry.grid(row=0, column=1, padx=5, pady=5)
-        set_software_btn = ttk.Button(
-            software_tab, text="Set Software", command=self.set_software)
-        set_software_btn.grid(row=1, column=0, columnspan=2, pady=10)
-        ttk.Label(software_tab, text="Current Software Name:").grid(
-            row=2, column=0, sticky=tk.W, padx=5, pady=5)
-        self.current_software_label = ttk.Label(
-            software_tab, text=self.software_name)
-        self.current_software_label.grid(row=2, column=1, padx=5, pady=5)
-
-        # Bottom Frame: Log Window in a labeled frame.
-        log_frame = ttk.Labelframe(self, text="Log", padding=10)
-        log_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
-        self.log_text = scrolledtext.ScrolledText(
-            log_frame, wrap=tk.WORD, height=10)
-        self.log_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        clear_log_btn = ttk.Button(
-            log_frame, text="Clear Log", command=self.clear_log)
-        clear_log_btn.pack(pady=5)
-
-    def update_pin_options(self):
-        """Update the combobox values based on selected pin type."""
-        if self.pin_type.get() == "Digital":
-            # For Arduino Uno, digital pins (excluding 0 and 1 used for Serial) can be 2-13.
-            self.pin_select['values'] = [str(i) for i in range(2, 14)]
-            self.pin_select.current(0)
-        else:
-            # For analog, show A0-A5.
-            self.pin_select['values'] = [f"A{i}" for i in range(6)]
-            self.pin_select.current(0)
-
-    def read_pin(self):
-        pin_type = self.pin_type.get()
-        pin_value = self.pin_select.get().strip()
-        if pin_type == "Digital":
-            # Send command: read:digital,<pin>
-            cmd = f"read:digital,{pin_value}"
-        else:
-            # For analog, convert "A0" -> index 0, etc.
-            try:
-                index = int(pin_value[1:])
-            except Exception as e:
-                self.log_message("Invalid analog pin selection.")
-                return
-            cmd = f"read:analog,{index}"
-        self.send_command(cmd)
-
-    def add_parameter(self):
-        name = self.add_name.get().strip()
-        min_val = self.add_min.get().strip()
-        max_val = self.add_max.get().strip()
-        cur_val = self.add_current.get().strip()
-        if not name or not min_val or not max_val or not cur_val:
-            self.log_message("All fields are required for adding a parameter.")
-            return
-        cmd = f"add:param,{name},{min_val},{max_val},{cur_val}"
-        self.send_command(cmd)
-
-    def update_parameter(self):
-        name = self.update_name.get().strip()
-        new_val = self.update_value.get().strip()
-        if not name or not new_val:
-            self.log_message("Name and new value are required for update.")
-            return
-        cmd = f"update:paramsCurval,{name},{new_val}"
-        self.send_command(cmd)
-
-    def get_parameter(self):
-        name = self.get_name.get().strip()
-        if not name:
-            self.log_message("Please enter a parameter name.")
-            return
-        cmd = f"get:paramCurval,{name}"
-        self.send_command(cmd)
-
-    def send_manual_command(self):
-        cmd = self.manual_cmd.get().strip()
-        if not cmd:
-            self.log_message("Please enter a command.")
-            return
-        self.send_command(cmd)
-
-    def refresh_parameters(self):
-        self.send_command("get:AlladdedParams")
-
-    def set_software(self):
-        name = self.software_entry.get().strip()
-        if not name:
-            self.log_message("Please enter a software name.")
-            return
-        cmd = f"set:software,{name}"
-        self.send_command(cmd)
-
-    def send_command(self, cmd):
-        self.log_message("Sending: " + cmd)
-        try:
-            self.ser.write((cmd + "\n").encode("utf-8"))
-        except Exception as e:
-            self.log_message("Error sending command: " + str(e))
-
-    def thread_safe_send_command(self, cmd):
-        """Schedule a command to be sent from the Tkinter main thread."""
-        self.after(0, lambda: self.send_command(cmd))
-
-    def process_serial_line(self, line):
-        """Parse a CSV message from Arduino and update UI and parameter store."""
-        self.log_message("Received: " + line)
-        parts = line.split(',')
-        if not parts:
-            return
-
-        prefix = parts[0]
-        # Check for digital read result: D,<pin>,<value>
-        if prefix == "D" and len(parts) == 3 and parts[1].strip().isdigit():
-            pin = parts[1].strip()
-            value = parts[2].strip()
-            self.pin_result_label.config(text=f"Digital Pin {pin}: {value}")
-        # Check for analog read result: A,<index>,<value>
-        elif prefix == "A" and len(parts) == 3 and parts[1].strip().isdigit():
-            index = parts[1].strip()
-            value = parts[2].strip()
-            self.pin_result_label.config(text=f"Analog Pin A{index}: {value}")
-        # Parameter addition message.
-        elif prefix == "A":
-            if len(parts) >= 2:
-                name = parts[1]
-                self.parameters[name] = {
-                    "index": None, "min": None, "max": None, "current": None}
-                self.log_message(f"Parameter added: {name}")
-        elif prefix == "U" and len(parts) >= 3:
-            name = parts[1]
-            new_val = parts[2]
-            if name in self.parameters:
-                self.parameters[name]["current"] = new_val
-            else:
-                self.parameters[name] = {
-                    "index": None, "min": None, "max": None, "current": new_val}
-            self.log_message(f"Parameter {name} updated to {new_val}")
-        elif prefix == "S":
-            if len(parts) == 3 and parts[1].strip().lower() == "software set to":
-                self.software_name = parts[2].strip()
-                self.current_software_label.config(text=self.software_name)
-                self.log_message(
-                    f"Software name updated to: {self.software_name}")
-            elif len(parts) >= 4:
-                index = parts[1]
-                name = parts[2]
-                current = parts[3]
-                self.parameters[name] = {
-                    "index": index, "min": None, "max": None, "current": current}
-                self.log_message(
-                    f"Switched to parameter {name} (index {index})")
-        elif prefix == "G" and len(parts) >= 3:
-            name = parts[1]
-            value = parts[2]
-            self.parameters[name] = {"index": None,
-                                     "min": None, "max": None, "current": value}
-            self.log_message(f"Parameter {name} current value: {value}")
-        elif prefix == "L" and len(parts) >= 6:
-            index = parts[1]
-            name = parts[2]
-            min_val = parts[3]
-            max_val = parts[4]
-            current = parts[5]
-            self.parameters[name] = {
-                "index": index, "min": min_val, "max": max_val, "current": current}
-            self.log_message(
-                f"List: {name} -> min:{min_val}, max:{max_val}, current:{current}")
-        else:
-            self.log_message("Unrecognized message: " + line)
-        self.update_parameter_list()
-
-    def update_parameter_list(self):
-        """Clear and repopulate the Treeview with current parameter data and adjust its height."""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        for name, info in self.parameters.items():
-            idx = info.get("index") if info.get("index") is not None else "-"
-            min_val = info.get("min") if info.get("min") is not None else "-"
-            max_val = info.get("max") if info.get("max") is not None else "-"
-            curr = info.get("current") if info.get(
-                "current") is not None else "-"
-            self.tree.insert("", tk.END, values=(
-                idx, name, min_val, max_val, curr))
-        # Update Treeview height so that every row is visible.
-        num_rows = len(self.tree.get_children())
-        self.tree["height"] = num_rows if num_rows > 0 else 1
-
-    def clear_parameters(self):
-        self.parameters.clear()
-        self.update_parameter_list()
-        self.log_message("Parameter list cleared.")
-
-    def log_message(self, msg):
-        self.log_text.insert(tk.END, msg + "\n")
-        self.log_text.see(tk.END)
-
-    def clear_log(self):
-        self.log_text.delete("1.0", tk.END)
-
-    def on_closing(self):
-        if hasattr(self, 'serial_reader'):
-            self.serial_reader.stop()
-        if hasattr(self, 'ser'):
-            self.ser.close()
-        self.destroy()
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from flask import Flask, Response, abort, g, jsonify, make_response, request
+
+from asyncServer import AsyncApiServer
+from binaryFraming import BAUD_RATES
+from historyStore import HistoryStore
+from panelEngine import (DeviceRegistry, LinkDown, LogStore, PanelEngine, command_result,
+                         pipeline_commands)
+from panelMetrics import Exposition, RouteMetrics, SamplingProfiler, engine_metrics
+from panelProfiles import (ProfileStore, apply_profile, describe_plan, diff_profile,
+                           plan_profile, profile_differences, snapshot_board)
+from sessionCapture import SessionCapture
+
+# Global registry of device engines for API access.
+registry = None
+
+# Saved parameter profiles, shared by every device.
+profiles = ProfileStore("profiles")
+
+# The Tk main thread, when the GUI is running.
+ui_thread = None
+
+
+def profiled_threads():
+    """Threads the sampling profiler watches: every serial reader and the UI."""
+    threads = {f"reader:{device_id}": engine.serial_reader
+               for device_id, engine in (registry.engines.items() if registry else ())
+               if engine.serial_reader is not None}
+    if ui_thread is not None:
+        threads["ui"] = ui_thread
+    return threads
+
+
+route_metrics = RouteMetrics()
+profiler = SamplingProfiler(profiled_threads)
+
 
 # ----------------- Flask JSON API Backend -----------------
 
@@ -409,38 +50,172 @@ class ArduinoGUI(tk.Tk):
 app_api = Flask(__name__)
 
 
-@app_api.route("/parameters", methods=["GET"])
+def device_route(rule, **options):
+    """Register a per-device view at rule and at /devices/<device_id>rule.
+
+    The un-prefixed form addresses the default (first) device.
+    """
+    def decorator(view):
+        app_api.add_url_rule(rule, view_func=view, **options)
+        app_api.add_url_rule("/devices/<device_id>" + rule, view_func=view, **options)
+        return view
+    return decorator
+
+
+@app_api.url_value_preprocessor
+def pull_device_id(endpoint, values):
+    g.device_id = values.pop("device_id", None) if values else None
+
+
+@app_api.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app_api.after_request
+def observe_request(response):
+    # Streaming responses (/events) are timed up to their first byte.
+    start = g.get("request_start")
+    if start is not None:
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        route_metrics.observe(rule, request.method, str(response.status_code),
+                              time.perf_counter() - start)
+    return response
+
+
+def current_engine():
+    """The engine addressed by the current request; aborts if there is none."""
+    device_id = g.get("device_id")
+    engine = registry.get(device_id) if registry else None
+    if engine is None:
+        if device_id is None:
+            abort(make_response(jsonify({"error": "Device not available"}), 500))
+        abort(make_response(jsonify({"error": f"Unknown device: {device_id}"}), 404))
+    return engine
+
+
+# HTTP status for each command_result() outcome.
+RESULT_STATUS = {"Confirmed": 200, "Error": 502, "Timeout": 504}
+
+
+def wants_wait():
+    return request.args.get("wait", "").lower() in ("1", "true", "yes")
+
+
+def timeout_arg():
+    """The ?timeout_ms= query argument in seconds; raises ValueError if malformed."""
+    return int(request.args.get("timeout_ms", 2000)) / 1000
+
+
+def unsendable(engine, commands):
+    """Why one of commands cannot go out on engine's link, or None if all can.
+
+    With binary framing a command whose frame would be too long is refused
+    here, instead of failing in the writer while its caller waits out the
+    timeout.
+    """
+    for cmd in commands:
+        try:
+            engine.wire_cost(cmd)
+        except ValueError as e:
+            return f"Cannot send {cmd}: {e}"
+    return None
+
+
+def send_api_command(cmd):
+    """Send cmd; with ?wait=true, block until the Arduino replies or timeout_ms passes."""
+    engine = current_engine()
+    error = unsendable(engine, [cmd])
+    if error:
+        return jsonify({"error": error}), 400
+    if not wants_wait():
+        engine.send_command(cmd)
+        return jsonify({"status": "Command sent", "command": cmd}), 200
+    try:
+        timeout = timeout_arg()
+    except ValueError:
+        return jsonify({"error": "timeout_ms must be an integer"}), 400
+    pending = engine.command_tracker.expect(cmd)
+    if pending is None:
+        return jsonify({"error": "Command has no reply to wait for", "command": cmd}), 400
+    engine.send_command(cmd)
+    result = command_result(engine.command_tracker, pending, timeout)
+    return jsonify(result), RESULT_STATUS[result["status"]]
+
+
+def batch_command(op):
+    """Build the serial command for one /batch operation; raises ValueError."""
+    kind = op.get("op")
+    if kind == "add":
+        fields = [op.get(k) for k in ("name", "min", "max", "current")]
+        if None in fields:
+            raise ValueError("add needs name, min, max and current")
+        return "add:param,{},{},{},{}".format(*fields)
+    if kind == "update":
+        if op.get("name") is None or "new_value" not in op:
+            raise ValueError("update needs name and new_value")
+        new_value = op["new_value"]
+        if isinstance(new_value, bool):
+            new_value = 1 if new_value else 0
+        return f"update:paramsCurval,{op['name']},{new_value}"
+    if kind == "get":
+        if op.get("name") is None:
+            raise ValueError("get needs name")
+        return f"get:paramCurval,{op['name']}"
+    if kind == "set_software":
+        if not op.get("software_name"):
+            raise ValueError("set_software needs software_name")
+        return f"set:software,{op['software_name']}"
+    raise ValueError(f"Unknown op: {kind}")
+
+
+def batch_commands(data):
+    """Build the commands for a {"operations": [...]} payload (or a bare list)."""
+    operations = data.get("operations") if isinstance(data, dict) else data
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("missing operations list")
+    return [batch_command(op) for op in operations]
+
+
+def run_batch(engine, commands, timeout):
+    start = time.perf_counter()
+    results = pipeline_commands(engine.command_tracker, engine.send_command,
+                                commands, timeout, cost=engine.wire_cost)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return {"results": results, "elapsed_ms": round(elapsed_ms, 3)}
+
+
+def json_with_etag(body, version):
+    """Serve a JSON body tagged with version; 304 if the client already has it."""
+    etag = f"v{version}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    return response
+
+
+@device_route("/parameters", methods=["GET"])
 def api_get_parameters():
-    global gui_instance
-    if gui_instance:
-        params = {}
-        for name, param in gui_instance.parameters.items():
-            new_param = param.copy()
-            try:
-                # Try to convert current value to int.
-                new_param['current'] = int(new_param['current'])
-            except (ValueError, TypeError):
-                # If conversion fails, leave the value as is.
-                pass
-            params[name] = new_param
-        return jsonify(params)
-    return jsonify({"error": "GUI not available"}), 500
-
-
-@app_api.route("/parameter/<name>", methods=["GET"])
+    engine = current_engine()
+    # Serialized once per store version, not once per request.
+    version, body = engine.parameters.to_json()
+    return json_with_etag(body, version)
+
+
+@device_route("/parameter/<name>", methods=["GET"])
 def api_get_parameter(name):
-    global gui_instance
-    if gui_instance:
-        param = gui_instance.parameters.get(name)
-        if param is not None:
-            return jsonify({name: param})
-        return jsonify({"error": "Parameter not found"}), 404
-    return jsonify({"error": "GUI not available"}), 500
+    engine = current_engine()
+    found = engine.parameters.get(name)
+    if found is not None:
+        version, param = found
+        return json_with_etag(json.dumps({name: param}), version)
+    return jsonify({"error": "Parameter not found"}), 404
 
 
-@app_api.route("/parameters", methods=["POST"])
+@device_route("/parameters", methods=["POST"])
 def api_add_parameter():
-    global gui_instance
     data = request.get_json()
     if not data:
         return jsonify({"error": "No JSON data provided"}), 400
@@ -452,13 +227,12 @@ def api_add_parameter():
     if name is None or min_val is None or max_val is None or current is None:
         return jsonify({"error": "Missing parameter fields"}), 400
     cmd = f"add:param,{name},{min_val},{max_val},{current}"
-    gui_instance.thread_safe_send_command(cmd)
-    return jsonify({"status": "Command sent", "command": cmd}), 200
+    return send_api_command(cmd)
 
 
-@app_api.route("/parameter/<name>", methods=["PUT"])
+@device_route("/parameter/<name>", methods=["PUT"])
 def api_update_parameter(name):
-    global gui_instance
+    engine = current_engine()
     data = request.get_json()
     print(f"Received data: {data}")  # Log received data to console
     if not data:
@@ -471,26 +245,32 @@ def api_update_parameter(name):
     if isinstance(new_value, bool):
         new_value = 1 if new_value else 0
     cmd = f"update:paramsCurval,{name},{new_value}"
-    gui_instance.thread_safe_send_command(cmd)
-    return jsonify({"status": "Command sent", "command": cmd}), 200
-
-
-@app_api.route("/command", methods=["POST"])
+    if wants_wait():
+        # An older value still queued must not follow this one to the board.
+        engine.update_throttler.supersede(name)
+        return send_api_command(cmd)
+    error = unsendable(engine, [cmd])
+    if error:
+        return jsonify({"error": error}), 400
+    # Without wait, only the newest value per parameter is sent.
+    coalesced = engine.update_throttler.submit(name, new_value)
+    return jsonify({"status": "Command queued", "command": cmd,
+                    "coalesced": coalesced}), 200
+
+
+@device_route("/command", methods=["POST"])
 def api_send_command():
-    global gui_instance
     data = request.get_json()
     if not data:
         return jsonify({"error": "No JSON data provided"}), 400
     command = data.get("command")
     if not command:
         return jsonify({"error": "Missing command field"}), 400
-    gui_instance.thread_safe_send_command(command)
-    return jsonify({"status": "Command sent", "command": command}), 200
+    return send_api_command(command)
 
 
-@app_api.route("/software", methods=["POST"])
+@device_route("/software", methods=["POST"])
 def api_set_software():
-    global gui_instance
     data = request.get_json()
     if not data:
         return jsonify({"error": "No JSON data provided"}), 400
@@ -498,32 +278,561 @@ def api_set_software():
     if not software_name:
         return jsonify({"error": "Missing software_name field"}), 400
     cmd = f"set:software,{software_name}"
-    gui_instance.thread_safe_send_command(cmd)
-    return jsonify({"status": "Command sent", "command": cmd}), 200
+    return send_api_command(cmd)
 
 
-@app_api.route("/log", methods=["GET"])
+@device_route("/log", methods=["GET"])
 def api_get_log():
-    global gui_instance
-    if gui_instance:
-        log_content = gui_instance.log_text.get("1.0", tk.END)
-        return jsonify({"log": log_content})
-    return jsonify({"error": "GUI not available"}), 500
+    """Return log records newer than ?since=<seq>, at most ?limit=N of them."""
+    engine = current_engine()
+    try:
+        since = int(request.args.get("since", 0))
+        limit = int(request.args.get("limit", 1000))
+    except ValueError:
+        return jsonify({"error": "since and limit must be integers"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    entries = engine.log_store.since(since, limit)
+    next_seq = entries[-1]["seq"] if entries else since
+    log_content = "".join(LogStore.render(e) + "\n" for e in entries)
+    return jsonify({"entries": entries, "next": next_seq, "log": log_content})
+
+
+@device_route("/batch", methods=["POST"])
+def api_batch():
+    """Run a list of add/update/get/set_software operations in one pipelined pass."""
+    engine = current_engine()
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No JSON data provided"}), 400
+    try:
+        timeout = timeout_arg()
+        commands = batch_commands(data)
+    except (ValueError, AttributeError) as e:
+        return jsonify({"error": f"Invalid operation: {e}"}), 400
+    error = unsendable(engine, commands)
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(run_batch(engine, commands, timeout)), 200
+
+
+def last_event_id(value):
+    """The seq in a Last-Event-ID header, or None if absent or malformed."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def sse_frames(events, dropped):
+    """Server-Sent Events text for one batch taken from a subscription."""
+    if dropped:
+        yield f"event: dropped\ndata: {json.dumps({'count': dropped})}\n\n"
+    if not events:
+        # Comment line; lets the server notice closed connections.
+        yield ": keep-alive\n\n"
+    for event in events:
+        yield (f"id: {event['seq']}\nevent: {event['type']}\n"
+               f"data: {json.dumps(event)}\n\n")
+
+
+@device_route("/events", methods=["GET"])
+def api_events():
+    """Server-Sent Events stream of parameter, pin and software changes."""
+    engine = current_engine()
+    broker = engine.event_broker
+    sub = broker.subscribe(last_seq=last_event_id(request.headers.get("Last-Event-ID")))
+
+    def stream():
+        try:
+            yield "retry: 1000\n\n"
+            while True:
+                yield from sse_frames(*sub.get(timeout=15))
+        finally:
+            broker.unsubscribe(sub)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
+
+
+EVENTS_PATH = r"(?:/devices/(?P<device_id>[^/]+))?/events"
+
+
+async def stream_events(request, response, device_id=None):
+    """/events on the async server's loop: no thread is held per client.
+
+    Unknown devices are left to the Flask route, which reports the error.
+    """
+    start = time.perf_counter()
+    engine = registry.get(unquote(device_id) if device_id else None) if registry else None
+    if engine is None:
+        return False
+    broker = engine.event_broker
+    sub = broker.subscribe(asyncio.get_running_loop(),
+                           last_event_id(request.headers.get("last-event-id")))
+    try:
+        await response.start([("Content-Type", "text/event-stream; charset=utf-8"),
+                              ("Cache-Control", "no-cache")])
+        rule = "/devices/<device_id>/events" if device_id else "/events"
+        route_metrics.observe(rule, "GET", "200", time.perf_counter() - start)
+        await response.send("retry: 1000\n\n")
+        while True:
+            events, dropped = await sub.get(timeout=15)
+            await response.send("".join(sse_frames(events, dropped)))
+    finally:
+        broker.unsubscribe(sub)
+
+
+@device_route("/updates/stats", methods=["GET"])
+def api_get_update_stats():
+    """Counters for the coalescing parameter-update throttler."""
+    engine = current_engine()
+    return jsonify(engine.update_throttler.stats())
+
+
+@device_route("/latency", methods=["GET"])
+def api_get_latency():
+    """Per-line arrival-to-dispatch timing of the serial reader."""
+    engine = current_engine()
+    reader = engine.serial_reader
+    # The last reader is kept after a failure; link_up says whether it still reads.
+    if reader is None or not engine.link_up:
+        # Not opened yet, or the link is down and being reopened.
+        return jsonify({"error": "Serial link is not open", "mode": engine.reader_mode}), 503
+    stats = reader.latency.summary()
+    stats["mode"] = reader.mode
+    return jsonify(stats)
+
+
+@device_route("/link", methods=["GET"])
+def api_get_link():
+    """State of the serial link and its reconnect supervisor."""
+    engine = current_engine()
+    if engine.supervisor is None:
+        return jsonify({"state": "stopped", "held_writes": len(engine.held)})
+    return jsonify(engine.supervisor.stats())
+
+
+@device_route("/sampler", methods=["GET"])
+def api_get_sampler():
+    """Registered pins with their achieved rate and jitter."""
+    engine = current_engine()
+    return jsonify(engine.pin_sampler.stats())
+
+
+@device_route("/sampler/<pin>", methods=["PUT"])
+def api_add_sampled_pin(pin):
+    """Sample pin (A0-A5, D2-D13) continuously at rate_hz."""
+    engine = current_engine()
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No JSON data provided"}), 400
+    if "rate_hz" not in data:
+        return jsonify({"error": "Missing rate_hz field"}), 400
+    try:
+        channel = engine.pin_sampler.add(pin, float(data["rate_hz"]),
+                                         int(data.get("capacity", 1000)))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(channel.stats()), 200
+
+
+@device_route("/sampler/<pin>", methods=["DELETE"])
+def api_remove_sampled_pin(pin):
+    engine = current_engine()
+    try:
+        channel = engine.pin_sampler.remove(pin)
+    except (KeyError, ValueError):
+        return jsonify({"error": f"Pin {pin} is not being sampled"}), 404
+    return jsonify(channel.stats()), 200
+
+
+@device_route("/sampler/<pin>/samples", methods=["GET"])
+def api_get_samples(pin):
+    """Buffered readings of pin newer than ?since=<unix s>, at most ?limit=N."""
+    engine = current_engine()
+    try:
+        since = float(request.args.get("since", 0))
+        limit = int(request.args.get("limit", 1000))
+    except ValueError:
+        return jsonify({"error": "since and limit must be numbers"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    try:
+        channel = engine.pin_sampler.channel(pin)
+    except (KeyError, ValueError):
+        return jsonify({"error": f"Pin {pin} is not being sampled"}), 404
+    return jsonify({"pin": channel.pin, "samples": channel.since(since, limit),
+                    "stats": channel.stats()})
+
+
+@device_route("/history", methods=["GET"])
+def api_get_history_series():
+    """Names of every recorded parameter and pin series."""
+    engine = current_engine()
+    if engine.history is None:
+        return jsonify({"error": "History recording is disabled"}), 404
+    return jsonify({"series": engine.history.names()})
+
+
+@device_route("/history/<name>", methods=["GET"])
+def api_get_history(name):
+    """Min/max/mean of a series over ?from=&to= (Unix seconds) in ?step= second buckets."""
+    engine = current_engine()
+    if engine.history is None:
+        return jsonify({"error": "History recording is disabled"}), 404
+    try:
+        end = float(request.args.get("to", time.time()))
+        start = float(request.args.get("from", end - 3600))
+        step = float(request.args.get("step", (end - start) / 500))
+    except ValueError:
+        return jsonify({"error": "from, to and step must be numbers"}), 400
+    try:
+        points = engine.history.query(name, start, end, step)
+    except KeyError:
+        return jsonify({"error": "No history for " + name}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"name": name, "from": start, "to": end, "step": step,
+                    "points": points})
+
+
+@app_api.route("/profiles", methods=["GET"])
+def api_get_profiles():
+    """Names of the saved parameter profiles (shared by every device)."""
+    return jsonify({"profiles": profiles.names()})
+
+
+def load_profile(name):
+    """The saved profile called name; aborts with 404 or 400."""
+    try:
+        return profiles.load(name)
+    except KeyError:
+        abort(make_response(jsonify({"error": f"No profile named {name}"}), 404))
+    except ValueError as e:
+        abort(make_response(jsonify({"error": str(e)}), 400))
+
+
+@app_api.route("/profiles/<name>", methods=["GET"])
+def api_get_saved_profile(name):
+    return jsonify(load_profile(name))
+
+
+@app_api.route("/profiles/<name>", methods=["PUT"])
+def api_save_profile(name):
+    """Save the given "parameters" as a profile."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or "parameters" not in data:
+        return jsonify({"error": "Missing parameters field (POST "
+                                 f"/profiles/{name}/snapshot saves a device's)"}), 400
+    try:
+        profile = profiles.save(name, data["parameters"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(profile), 200
+
+
+@app_api.route("/profiles/<name>", methods=["DELETE"])
+def api_delete_profile(name):
+    try:
+        profiles.delete(name)
+    except KeyError:
+        return jsonify({"error": f"No profile named {name}"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"status": "Deleted", "name": name}), 200
+
+
+@device_route("/profiles/<name>/snapshot", methods=["POST"])
+def api_snapshot_profile(name):
+    """Save the device's current parameters as a profile."""
+    engine = current_engine()
+    try:
+        timeout = timeout_arg()
+        profile = profiles.save(name, snapshot_board(engine, timeout))
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 504
+    except LinkDown as e:
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(profile), 200
+
+
+@device_route("/profiles/<name>/diff", methods=["GET"])
+def api_diff_profile(name):
+    """The commands applying a profile would send, without sending them."""
+    engine = current_engine()
+    profile = load_profile(name)
+    try:
+        slots, head, parameters = diff_profile(engine, profile, timeout_arg())
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 504
+    except LinkDown as e:
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    plan = plan_profile(slots, 0 if head is None else head, parameters)
+    return jsonify({"profile": name, "next_slot": head,
+                    "differences": profile_differences(slots, parameters),
+                    **describe_plan(plan)})
+
+
+@device_route("/profiles/<name>/apply", methods=["POST"])
+def api_apply_profile(name):
+    """Send only the adds and updates that bring the board to a profile."""
+    engine = current_engine()
+    profile = load_profile(name)
+    try:
+        report = apply_profile(engine, profile, timeout_arg())
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 504
+    except LinkDown as e:
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(report), 200 if report.get("verified", report["confirmed"]) else 502
+
+
+@app_api.route("/devices", methods=["GET"])
+def api_get_devices():
+    """Every device served by this process, with its port and status."""
+    if not registry:
+        return jsonify({"error": "Device not available"}), 500
+    return jsonify(registry.describe())
+
+
+@app_api.route("/fanout", methods=["POST"])
+def api_fanout():
+    """Run the same batch of operations on several devices in parallel."""
+    data = request.get_json()
+    if not data or not isinstance(data, dict):
+        return jsonify({"error": "No JSON data provided"}), 400
+    try:
+        device_ids = registry.resolve(data.get("devices"), data.get("group"))
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 404
+    try:
+        timeout = timeout_arg()
+        commands = batch_commands(data)
+    except (ValueError, AttributeError) as e:
+        return jsonify({"error": f"Invalid operation: {e}"}), 400
+    for device_id in device_ids:
+        error = unsendable(registry.get(device_id), commands)
+        if error:
+            return jsonify({"error": f"{device_id}: {error}"}), 400
+    # Each device has its own link, so they can all be driven at once.
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, len(device_ids))) as pool:
+        outcomes = pool.map(lambda d: run_batch(registry.get(d), commands, timeout),
+                            device_ids)
+        devices = dict(zip(device_ids, outcomes))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return jsonify({"devices": devices, "elapsed_ms": round(elapsed_ms, 3)}), 200
+
+
+@app_api.route("/metrics", methods=["GET"])
+def api_metrics():
+    """Prometheus text exposition of link, parser, UI and HTTP metrics."""
+    exposition = Exposition()
+    for device_id, engine in (registry.engines.items() if registry else ()):
+        engine_metrics(exposition, device_id, engine)
+    route_metrics.expose(exposition)
+    return Response(exposition.render(),
+                    mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app_api.route("/profiler", methods=["GET"])
+def api_get_profile():
+    """Collapsed stacks sampled so far (flamegraph.pl / speedscope input)."""
+    return Response(profiler.folded(), mimetype="text/plain")
+
+
+@app_api.route("/profiler", methods=["POST"])
+def api_toggle_profiler():
+    """Start ({"enabled": true, "interval_ms": 5}) or stop the sampling profiler."""
+    data = request.get_json()
+    if not data or "enabled" not in data:
+        return jsonify({"error": "Missing enabled field"}), 400
+    if data["enabled"]:
+        try:
+            interval_ms = float(data.get("interval_ms", 5))
+        except (TypeError, ValueError):
+            return jsonify({"error": "interval_ms must be a number"}), 400
+        if interval_ms <= 0:
+            return jsonify({"error": "interval_ms must be positive"}), 400
+        profiler.start(interval_ms / 1000)
+    else:
+        profiler.stop()
+    return jsonify(profiler.status()), 200
 
 # ----------------- End of Flask API -----------------
 
 
-if __name__ == "__main__":
-    serial_port = "/dev/ttyUSB0"
-    baud_rate = 9600
-    gui_instance = ArduinoGUI(serial_port, baud_rate)
-
-    def run_api():
-        # Run Flask app in a separate thread (disable reloader to prevent duplicate threads).
-        app_api.run(host="0.0.0.0", port=5000, debug=False, use_reloader=False)
+def run_api(host, port):
+    # Disable the reloader to prevent duplicate threads.
+    app_api.run(host=host, port=port, debug=False, use_reloader=False)
+
+
+def start_async_api(host, port):
+    """Serve the API from an asyncio loop on its own thread; returns the loop.
+
+    Engines in the "asyncio" reader mode run their serial link on the same
+    loop. Raises OSError if the address cannot be bound.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="api-loop", daemon=True).start()
+    server = AsyncApiServer(app_api, host, port)
+    server.stream(EVENTS_PATH)(stream_events)
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+    return loop
+
+
+def parse_device(spec):
+    """Parse ID=PORT[@BAUD] from --device."""
+    device_id, sep, port = spec.partition("=")
+    if not sep or not device_id or not port:
+        raise argparse.ArgumentTypeError(f"expected ID=PORT[@BAUD], got {spec!r}")
+    port, _, baud = port.partition("@")
+    try:
+        return device_id, port, int(baud) if baud else None
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid baud rate in {spec!r}")
+
+
+def parse_group(spec):
+    """Parse NAME=ID,ID,... from --group."""
+    name, sep, ids = spec.partition("=")
+    if not sep or not name or not ids:
+        raise argparse.ArgumentTypeError(f"expected NAME=ID,ID,..., got {spec!r}")
+    return name, ids.split(",")
+
+
+def main():
+    global registry, ui_thread, profiles
+    parser = argparse.ArgumentParser(
+        description="Arduino control panel: Tk GUI and REST API.")
+    parser.add_argument("--port", default="/dev/ttyUSB0",
+                        help="serial port (default: %(default)s)")
+    parser.add_argument("--baud", type=int, default=9600,
+                        help="baud rate (default: %(default)s)")
+    parser.add_argument("--device", action="append", type=parse_device, default=[],
+                        metavar="ID=PORT[@BAUD]",
+                        help="serve a panel under /devices/ID; repeat for several "
+                             "(replaces --port)")
+    parser.add_argument("--group", action="append", type=parse_group, default=[],
+                        metavar="NAME=ID,ID,...",
+                        help="name a group of devices for POST /fanout")
+    parser.add_argument("--server", choices=("async", "flask"), default="async",
+                        help='"async" serves the API from an asyncio loop with keep-alive; '
+                             '"flask" is the Flask development server')
+    parser.add_argument("--reader-mode", choices=("asyncio", "event", "poll"),
+                        help='"asyncio" runs the serial link on the API loop (default with '
+                             'the async server on Linux/macOS); "event" wakes a reader '
+                             'thread on incoming bytes; "poll" is the legacy 100 ms loop')
+    parser.add_argument("--binary-baud", type=int, choices=BAUD_RATES, metavar="BAUD",
+                        help="negotiate compact binary frames with CRC at this baud rate "
+                             "(one of %(choices)s; default: text CSV)")
+    parser.add_argument("--no-low-latency", dest="low_latency", action="store_false",
+                        help="leave the USB-serial driver's latency timer untouched")
+    parser.add_argument("--history-dir", metavar="DIR",
+                        help="record parameter values and pin readings under DIR "
+                             "(one subdirectory per device)")
+    parser.add_argument("--history-days", type=float, default=28,
+                        help="drop history older than this (default: %(default)s)")
+    parser.add_argument("--history-max-mb", type=int, default=1024,
+                        help="disk budget per device for history (default: %(default)s)")
+    parser.add_argument("--capture-dir", metavar="DIR",
+                        help="record every serial line in and out to DIR/<device>-<time>.cap.gz "
+                             "for offline replay (benchmarks/bench_replay.py)")
+    parser.add_argument("--profile-dir", metavar="DIR", default="profiles",
+                        help="where parameter profiles are saved (default: %(default)s)")
+    parser.add_argument("--api-host", default="0.0.0.0")
+    parser.add_argument("--api-port", type=int, default=5000)
+    parser.add_argument("--headless", action="store_true",
+                        help="run only the serial engines and REST API, without Tk")
+    args = parser.parse_args()
+    if args.reader_mode is None:
+        args.reader_mode = ("asyncio" if args.server == "async" and os.name == "posix"
+                            else "event")
+    elif args.reader_mode == "asyncio" and (args.server != "async" or os.name != "posix"):
+        parser.error('--reader-mode asyncio needs --server async on Linux or macOS')
+
+    registry = DeviceRegistry()
+    profiles = ProfileStore(args.profile_dir)
+    devices = args.device or [("default", args.port, None)]
+    try:
+        for device_id, port, baud in devices:
+            history = None
+            if args.history_dir:
+                history = HistoryStore(
+                    os.path.join(args.history_dir, device_id),
+                    max_bytes=args.history_max_mb * 1024 * 1024,
+                    max_age=args.history_days * 86400)
+            engine = PanelEngine(
+                port, baud or args.baud, reader_mode=args.reader_mode,
+                low_latency=args.low_latency, history=history,
+                binary_baud=args.binary_baud)
+            if args.capture_dir:
+                os.makedirs(args.capture_dir, exist_ok=True)
+                engine.capture = SessionCapture(
+                    os.path.join(args.capture_dir,
+                                 f"{device_id}-{time.strftime('%Y%m%d-%H%M%S')}.cap.gz"),
+                    port=port, baud=engine.baud_rate)
+            registry.add(device_id, engine)
+        for name, device_ids in args.group:
+            registry.add_group(name, device_ids)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.server == "async":
+        try:
+            loop = start_async_api(args.api_host, args.api_port)
+        except OSError as e:
+            sys.exit(f"Could not serve the API on {args.api_host}:{args.api_port}: {e}")
+        for engine in registry.engines.values():
+            engine.loop = loop
+
+    if args.headless:
+        errors = registry.start_all(retry=True)
+        for device_id, e in errors.items():
+            print(f"Could not open {registry.get(device_id).serial_port} "
+                  f"for device {device_id}: {e}", file=sys.stderr)
+        if len(errors) == len(registry.engines):
+            sys.exit(1)
+        try:
+            if args.server == "async":
+                threading.Event().wait()
+            else:
+                run_api(args.api_host, args.api_port)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            registry.stop_all()
+        return
+
+    # tkinter is only needed (and only imported) for the desktop front end,
+    # which shows the default device.
+    from panelGui import ArduinoGUI
+    gui = ArduinoGUI(registry.get(), profiles)
+    ui_thread = threading.current_thread()
+    if not gui.connect():
+        return
+    errors = registry.start_all(list(registry.engines)[1:], retry=True)
+    for device_id, e in errors.items():
+        gui.log_message(f"Could not open {registry.get(device_id).serial_port} "
+                        f"for device {device_id}: {e}")
+
+    if args.server == "flask":
+        # Run Flask app in a separate thread.
+        flask_thread = threading.Thread(
+            target=run_api, args=(args.api_host, args.api_port))
+        flask_thread.daemon = True
+        flask_thread.start()
+
+    gui.mainloop()
+    registry.stop_all()
 
-    flask_thread = threading.Thread(target=run_api)
-    flask_thread.daemon = True
-    flask_thread.start()
 
-    gui_instance.mainloop()
+if __name__ == "__main__":
+    main()